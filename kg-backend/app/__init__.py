@@ -1,12 +1,42 @@
+import logging
+
 from flask import Flask
 from flask_cors import CORS
-from .routes import bp
+from .routes import bp, driver, GRAPH_VERSION, SNAPSHOTS
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_schema_on_startup():
+    """
+    启动时只幂等地建约束和索引（几条 IF NOT EXISTS），不扫全图：
+    存量节点补 :Entity label 由导入脚本或 python -m app.neo4j_driver --schema-only 执行
+    """
+    try:
+        driver.ensure_schema(backfill=False)
+    except Exception as e:
+        # 数据库暂时不可用，或多个 worker 同时建同一个索引时照常启动，下一次导入同样会执行
+        logger.warning("schema bootstrap on startup failed: %s", e)
+
+
+def warm_snapshots_on_startup():
+    """
+    在后台开始构建 focus 视图的快照和布局，第一个 /graph/init 请求不必等它
+    """
+    try:
+        SNAPSHOTS.warm(GRAPH_VERSION.current())
+    except Exception as e:
+        # 拿不到图版本时跳过，第一次请求会再触发构建
+        logger.warning("snapshot warm-up on startup failed: %s", e)
 
 
 def create_app():
     app = Flask(__name__)
     app.config["JSON_AS_ASCII"] = False
 
+    ensure_schema_on_startup()
+    warm_snapshots_on_startup()
+
     app.register_blueprint(bp)
     CORS(app, resources={r"/api/*": {"origins": "*"}})
 
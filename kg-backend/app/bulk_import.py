@@ -0,0 +1,209 @@
+import os
+import csv
+import heapq
+import tempfile
+import logging
+import argparse
+from itertools import groupby
+from operator import itemgetter
+from tqdm.auto import tqdm
+from .constants import ATTRIBUTE_RELATIONS, ENTITY_LABEL
+from .triple_reader import iter_triples
+
+logger = logging.getLogger(__name__)
+
+# neo4j-admin 的数组 / 多 label 分隔符；用 Unit Separator，避免和属性值里的 ; | 冲突
+ARRAY_DELIMITER = "\x1f"
+ARRAY_DELIMITER_ARG = "U+001F"
+
+
+# 外部排序每攒满多少条记录就排好序写出一个临时 run 文件（内存上限）
+SPILL_CHUNK = 500_000
+
+
+class _ExternalSorter:
+    """
+    外部排序：记录（字符串元组）攒满 chunk 条就排序后写成临时 run 文件，
+    最后多路归并，内存里只保留一个 chunk
+    """
+
+    def __init__(self, tmp_dir, chunk=SPILL_CHUNK):
+        self._tmp_dir = tmp_dir
+        self._chunk = chunk
+        self._buffer = []
+        self._runs = []
+
+    def add(self, record):
+        self._buffer.append(record)
+        if len(self._buffer) >= self._chunk:
+            self._spill()
+
+    def _spill(self):
+        self._buffer.sort()
+        path = os.path.join(self._tmp_dir, f"run_{id(self)}_{len(self._runs)}.csv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            csv.writer(f).writerows(self._buffer)
+        self._runs.append(path)
+        self._buffer = []
+
+    def sorted(self):
+        """
+        按升序依次产出全部记录（重复记录原样保留，相邻出现）
+        """
+        if not self._runs:
+            self._buffer.sort()
+            yield from map(tuple, self._buffer)
+            return
+        if self._buffer:
+            self._spill()
+        files = [open(p, encoding="utf-8", newline="") for p in self._runs]
+        try:
+            yield from heapq.merge(*(map(tuple, csv.reader(f)) for f in files))
+        finally:
+            for f in files:
+                f.close()
+
+
+def export_bulk_csv(paths, out_dir, chunk=SPILL_CHUNK):
+    """
+    把三元组 JSON 转成 neo4j-admin database import 格式的 CSV：
+    - nodes_<Label>.csv：每个 label 一个文件，name 作为 ID（每个 label 独立 ID 空间），
+      ATTRIBUTE_RELATIONS 的 tail 折叠成节点上的 string[] 属性（去重、保持出现顺序）
+    - rels_<HeadLabel>_<TailLabel>.csv：去重后的关系
+    三元组逐条流式读取，节点记录和关系都经外部排序（临时文件）归并去重，
+    内存只占 chunk 条记录加上单个节点的属性，不随语料增长
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    # label -> 出现过的属性名（属性名种类很少）
+    prop_keys = {}
+    stats = {"triples": 0, "relationships": 0, "duplicates": 0, "nodes": {}}
+
+    with tempfile.TemporaryDirectory(prefix=".spill-", dir=out_dir) as tmp_dir:
+        # (label, name, 序号, 属性名, 属性值)；只出现过名字的节点属性名为空
+        node_records = _ExternalSorter(tmp_dir, chunk)
+        # (head_label, tail_label, head, tail, relation)
+        rel_records = _ExternalSorter(tmp_dir, chunk)
+
+        for path in paths:
+            for triple in tqdm(iter_triples(path), desc=os.path.basename(path)):
+                seq = f"{stats['triples']:012d}"
+                stats["triples"] += 1
+                head = triple["head"]
+                tail = triple["tail"]
+                relation = triple["relation"]
+                head_label = triple["head_type"]
+                tail_label = triple["tail_type"]
+
+                # ===== 情况 1：tail 是属性 =====
+                if tail_label in ATTRIBUTE_RELATIONS:
+                    prop_keys.setdefault(head_label, set()).add(relation)
+                    node_records.add((head_label, head, seq, relation, tail))
+                    continue
+
+                # ===== 情况 2：tail 是实体 =====
+                node_records.add((head_label, head, seq, "", ""))
+                node_records.add((tail_label, tail, seq, "", ""))
+                rel_records.add((head_label, tail_label, head, tail, relation))
+
+        _write_nodes(node_records.sorted(), prop_keys, out_dir, stats["nodes"])
+        _write_relationships(rel_records.sorted(), out_dir, stats)
+
+    logger.info("bulk export: %s", stats)
+    return stats
+
+
+def _write_nodes(records, prop_keys, out_dir, counts):
+    """
+    按 (label, name, 序号) 有序的节点记录 → 每个 label 一个 nodes_<Label>.csv
+    """
+    for label, by_label in groupby(records, key=itemgetter(0)):
+        keys = sorted(prop_keys.get(label, ()))
+        path = os.path.join(out_dir, f"nodes_{label}.csv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                [f"name:ID({label})", ":LABEL"] + [f"{k}:string[]" for k in keys]
+            )
+            labels = ARRAY_DELIMITER.join([label, ENTITY_LABEL])
+            count = 0
+            for name, rows in groupby(by_label, key=itemgetter(1)):
+                props = {}
+                for _, _, _, relation, value in rows:
+                    if relation:
+                        values = props.setdefault(relation, [])
+                        if value not in values:
+                            values.append(value)
+                writer.writerow(
+                    [name, labels]
+                    + [
+                        ARRAY_DELIMITER.join(
+                            v.replace(ARRAY_DELIMITER, " ") for v in props.get(k, [])
+                        )
+                        for k in keys
+                    ]
+                )
+                count += 1
+        counts[label] = count
+
+
+def _write_relationships(records, out_dir, stats):
+    """
+    有序的关系记录 → 每对 (head_label, tail_label) 一个 rels_ 文件，相邻重复的只写一次
+    """
+    for (head_label, tail_label), rows in groupby(records, key=itemgetter(0, 1)):
+        path = os.path.join(out_dir, f"rels_{head_label}_{tail_label}.csv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                [f":START_ID({head_label})", f":END_ID({tail_label})", ":TYPE"]
+            )
+            previous = None
+            for row in rows:
+                if row == previous:
+                    stats["duplicates"] += 1
+                    continue
+                previous = row
+                writer.writerow(row[2:])
+                stats["relationships"] += 1
+
+
+def build_import_command(out_dir, database="neo4j"):
+    """
+    拼出对应的 neo4j-admin 命令（需在 Neo4j 停机状态下执行）
+    """
+    files = sorted(os.listdir(out_dir))
+    args = [
+        "neo4j-admin database import full",
+        "--overwrite-destination",
+        f"--array-delimiter={ARRAY_DELIMITER_ARG}",
+        "--multiline-fields=true",
+    ]
+    args += [
+        f"--nodes={os.path.join(out_dir, f)}" for f in files if f.startswith("nodes_")
+    ]
+    args += [
+        f"--relationships={os.path.join(out_dir, f)}"
+        for f in files
+        if f.startswith("rels_")
+    ]
+    args.append(database)
+    return " \\\n  ".join(args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="三元组 JSON → neo4j-admin 离线导入 CSV"
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="triples_anime.json / triples_role.json"
+    )
+    parser.add_argument("--out", default="import", help="CSV 输出目录")
+    parser.add_argument("--database", default="neo4j")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    export_bulk_csv(args.paths, args.out)
+    print(build_import_command(args.out, args.database))
+    # 导入完成、重启 Neo4j 后再执行 Neo4jDriver().ensure_schema() 建约束和索引
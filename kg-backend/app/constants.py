@@ -14,6 +14,23 @@ RELATION_RELATIONS = {
     "Location",
 }
 
+# 所有实体节点共享的附加 label，用于无 label 的 {name:$name} 查找走索引
+ENTITY_LABEL = "Entity"
+
+# 导入后分析步骤写回实体节点的派生属性（中心性、聚类、相似角色），不属于三元组数据
+DERIVED_PROPERTIES = {
+    "degree",
+    "pagerank",
+    "label_rank",
+    "cluster",
+    "similar_ids",
+    "similar_scores",
+    "similar_reasons",
+}
+
+# 存放图版本号等元数据的节点 label（不属于实体，查询图谱时需排除）
+GRAPH_META_LABEL = "_GraphMeta"
+
 DEFAULT_GRAPH = {
     "nodes": [
         {
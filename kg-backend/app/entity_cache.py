@@ -0,0 +1,98 @@
+import time
+import threading
+from collections import OrderedDict
+
+from .constants import RELATION_RELATIONS
+
+# 最多缓存多少个实体（LRU 淘汰），以及单条的存活时间（秒）
+ENTITY_CACHE_SIZE = 10000
+ENTITY_CACHE_TTL = 300
+
+# 批量取详情时一次最多多少个名字
+MAX_MULTI_GET = 500
+
+
+class EntityDetailCache:
+    """
+    (label, name) → 实体详情 的读穿透缓存，挡在 Neo4jDriver 的实体读取前面：
+    - 条数超过上限按 LRU 淘汰，单条超过 TTL 重新读取
+    - 图版本变大时整体清空，导入后不会读到旧属性；带着更旧版本号的请求
+      （别的线程 / 进程还没看到新版本）直接读库，不清空也不写入缓存
+    - 查不到的实体也缓存（值为 None），不存在的名字不会反复打到 Neo4j
+    - 批量读取时未命中的名字合并成一次查询
+    """
+
+    def __init__(self, driver, maxsize=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL):
+        self._driver = driver
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries = OrderedDict()  # (label, name) -> (expires_at, detail)
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, version, label, name):
+        return self.get_many(version, label, [name])[name]
+
+    def get_many(self, version, label, names):
+        """
+        返回 {name: detail 或 None}；label 不是实体类型时抛 ValueError
+        """
+        if label not in RELATION_RELATIONS:
+            raise ValueError(f"未知的实体类型: {label}")
+
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and version < self._version:
+                missing = list(dict.fromkeys(names))
+                self.misses += len(missing)
+                names = []
+            elif version != self._version:
+                self._entries.clear()
+                self._version = version
+            for name in dict.fromkeys(names):
+                key = (label, name)
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    found[name] = entry[1]
+                    self.hits += 1
+                else:
+                    missing.append(name)
+                    self.misses += 1
+
+        if not missing:
+            return found
+
+        loaded = self._driver.get_entities(label, missing)
+        with self._lock:
+            # 读取期间图版本变了：结果照常返回，但不写进已清空的新版本缓存
+            keep = self._version == version
+            expires_at = time.monotonic() + self._ttl
+            for name in missing:
+                detail = loaded.get(name)
+                found[name] = detail
+                if keep:
+                    self._entries[(label, name)] = (expires_at, detail)
+                    self._entries.move_to_end((label, name))
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return found
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "version": self._version,
+                "size": len(self._entries),
+                "maxsize": self._maxsize,
+                "ttl": self._ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+            }
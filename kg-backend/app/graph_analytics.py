@@ -0,0 +1,212 @@
+import time
+import logging
+import argparse
+
+import numpy as np
+import scipy.sparse as sp
+
+from .constants import ENTITY_LABEL
+from .graph_clusters import assign_clusters, summarize_clusters, write_clusters
+from .recommend import run_recommend
+
+logger = logging.getLogger(__name__)
+
+PAGERANK_DAMPING = 0.85
+PAGERANK_TOL = 1e-8
+PAGERANK_MAX_ITER = 100
+
+# 写回节点属性时每个事务的行数
+WRITE_BATCH_SIZE = 5000
+
+
+def fetch_topology(driver):
+    """
+    从 Neo4j 拉取实体节点 (id, label, name) 和全部边 (source_id, target_id)
+    """
+    with driver.driver.session() as session:
+        node_ids, labels, names = [], [], []
+        for r in session.run(
+            f"""
+            MATCH (n:{ENTITY_LABEL})
+            RETURN id(n) AS id, n.name AS name,
+                   [l IN labels(n) WHERE l <> $entity_label][0] AS label
+            """,
+            entity_label=ENTITY_LABEL,
+        ):
+            node_ids.append(r["id"])
+            labels.append(r["label"])
+            names.append(r["name"])
+
+        src, dst = [], []
+        for r in session.run(
+            f"""
+            MATCH (a:{ENTITY_LABEL})-[]->(b:{ENTITY_LABEL})
+            RETURN id(a) AS source, id(b) AS target
+            """
+        ):
+            src.append(r["source"])
+            dst.append(r["target"])
+
+    return (
+        np.asarray(node_ids, dtype=np.int64),
+        labels,
+        names,
+        np.asarray(src, dtype=np.int64),
+        np.asarray(dst, dtype=np.int64),
+    )
+
+
+def index_edges(node_ids, src, dst):
+    """
+    边端点的 Neo4j id → 节点数组下标，丢掉端点不在节点集合里的边
+    """
+    if len(node_ids) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+
+    order = np.argsort(node_ids)
+    sorted_ids = node_ids[order]
+
+    def _index(ids):
+        pos = np.searchsorted(sorted_ids, ids)
+        pos = np.clip(pos, 0, len(sorted_ids) - 1)
+        ok = sorted_ids[pos] == ids
+        return order[pos], ok
+
+    s, ok_s = _index(src)
+    t, ok_t = _index(dst)
+    keep = ok_s & ok_t
+    return s[keep], t[keep]
+
+
+def build_adjacency(n, s, t):
+    """
+    无向 CSR 邻接矩阵（多重边计数保留，和 count(r) 一致）
+    """
+    data = np.ones(len(s) * 2, dtype=np.float64)
+    rows = np.concatenate([s, t])
+    cols = np.concatenate([t, s])
+    return sp.csr_matrix((data, (rows, cols)), shape=(n, n))
+
+
+def pagerank(
+    adj, damping=PAGERANK_DAMPING, tol=PAGERANK_TOL, max_iter=PAGERANK_MAX_ITER
+):
+    """
+    幂迭代 PageRank；悬挂节点的分数均匀分给所有节点
+    """
+    n = adj.shape[0]
+    if n == 0:
+        return np.zeros(0)
+
+    out_weight = np.asarray(adj.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inv_out = np.zeros(n)
+    inv_out[~dangling] = 1.0 / out_weight[~dangling]
+    # 行归一化后转置：r_new = d * P^T r
+    transition = (sp.diags(inv_out) @ adj).T.tocsr()
+
+    r = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        r_new = damping * (transition @ r)
+        r_new += (damping * r[dangling].sum() + 1.0 - damping) / n
+        if np.abs(r_new - r).sum() < tol:
+            r = r_new
+            break
+        r = r_new
+    return r
+
+
+def label_ranks(labels, scores):
+    """
+    每个 label 内按分数降序的名次（从 1 开始）
+    """
+    labels = np.asarray([l or "" for l in labels])
+    ranks = np.zeros(len(scores), dtype=np.int64)
+    for label in np.unique(labels):
+        idx = np.flatnonzero(labels == label)
+        order = idx[np.argsort(-scores[idx], kind="stable")]
+        ranks[order] = np.arange(1, len(order) + 1)
+    return ranks
+
+
+def compute_centrality(labels, adj):
+    degree = np.asarray(adj.sum(axis=1)).ravel().astype(np.int64)
+    pr = pagerank(adj)
+    return {
+        "degree": degree,
+        "pagerank": pr,
+        "label_rank": label_ranks(labels, pr),
+    }
+
+
+def write_centrality(driver, node_ids, scores, batch_size=WRITE_BATCH_SIZE):
+    cypher = """
+    UNWIND $rows AS row
+    MATCH (n) WHERE id(n) = row.id
+    SET n.degree = row.degree, n.pagerank = row.pagerank, n.label_rank = row.label_rank
+    """
+    rows = [
+        {
+            "id": int(nid),
+            "degree": int(scores["degree"][i]),
+            "pagerank": float(scores["pagerank"][i]),
+            "label_rank": int(scores["label_rank"][i]),
+        }
+        for i, nid in enumerate(node_ids)
+    ]
+    with driver.driver.session() as session:
+        for i in range(0, len(rows), batch_size):
+            session.execute_write(
+                lambda tx, chunk: tx.run(cypher, rows=chunk).consume(),
+                rows[i : i + batch_size],
+            )
+
+
+def run_analytics(driver):
+    """
+    导入后的分析步骤：
+    - 计算 degree / PageRank / 同 label 名次，写回为带索引的节点属性，
+      /graph/init 的 focus 视图、搜索和 QA 锚点消歧都直接按这些属性排序
+    - 以作品为中心聚类，写回 n.cluster 和聚类总览，供分层浏览接口直接读取
+    - 预计算角色之间的相似度，每个角色的 top-k 写回节点，/recommend 直接查表
+    """
+    start = time.perf_counter()
+    node_ids, labels, names, src, dst = fetch_topology(driver)
+    s, t = index_edges(node_ids, src, dst)
+    adj = build_adjacency(len(node_ids), s, t)
+
+    scores = compute_centrality(labels, adj)
+    write_centrality(driver, node_ids, scores)
+
+    cluster = assign_clusters(labels, adj)
+    overview = summarize_clusters(node_ids, labels, names, scores, cluster, s, t)
+    write_clusters(driver, node_ids, cluster, overview, WRITE_BATCH_SIZE)
+
+    recommend = run_recommend(driver)
+
+    report = {
+        "nodes": len(node_ids),
+        "edges": len(s),
+        "clusters": len(overview["clusters"]),
+        "unclustered": int((cluster < 0).sum()),
+        "similar_pairs": recommend["pairs"],
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    logger.info("graph analytics: %s", report)
+    return report
+
+
+if __name__ == "__main__":
+    from .neo4j_driver import Neo4jDriver
+
+    parser = argparse.ArgumentParser(description="计算节点中心性并写回 Neo4j")
+    parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    driver = Neo4jDriver()
+    driver.ensure_schema()
+    run_analytics(driver)
+    driver.bump_graph_version()
+    driver.close()
@@ -0,0 +1,235 @@
+import json
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+
+from .constants import ENTITY_LABEL, GRAPH_META_LABEL
+
+# 作品即聚类中心
+CLUSTER_LABEL = "Work"
+
+# 非作品节点经过几轮邻居投票归入聚类：角色 → 作品一轮，声优 / 团体 → 角色再一轮
+PROPAGATION_ROUNDS = 3
+
+# 存放聚类总览的元数据节点 key
+CLUSTER_META_KEY = "clusters"
+
+
+def assign_clusters(labels, adj, rounds=PROPAGATION_ROUNDS):
+    """
+    每个 Work 自成一类；其余节点按已归类邻居的边数投票，取票数最多的作品，
+    逐轮向外扩散。返回每个节点所属作品的下标（-1 表示与任何作品都不连通）
+    """
+    n = adj.shape[0]
+    cluster = np.full(n, -1, dtype=np.int64)
+    seeds = np.flatnonzero(np.asarray([l == CLUSTER_LABEL for l in labels], dtype=bool))
+    cluster[seeds] = seeds
+
+    for _ in range(rounds):
+        assigned = np.flatnonzero(cluster >= 0)
+        # 已归类节点的 one-hot（列 = 作品节点下标）
+        onehot = sp.csr_matrix(
+            (np.ones(len(assigned)), (assigned, cluster[assigned])), shape=(n, n)
+        )
+        votes = (adj @ onehot).tocsr()
+
+        pending = np.flatnonzero((cluster < 0) & (votes.getnnz(axis=1) > 0))
+        if len(pending) == 0:
+            break
+        best = np.asarray(votes[pending].argmax(axis=1)).ravel()
+        cluster[pending] = best
+
+    return cluster
+
+
+def summarize_clusters(node_ids, labels, names, scores, cluster, src_idx, dst_idx):
+    """
+    聚类总览：每个作品的成员数（按 label 分）和作品间的边权（跨类边条数，无向合并）
+    """
+    labels = np.asarray([l or "" for l in labels])
+    works = np.flatnonzero(cluster == np.arange(len(cluster)))
+
+    counts = {}
+    for label in np.unique(labels):
+        members = cluster[(labels == label) & (cluster >= 0)]
+        counts[label] = np.bincount(members, minlength=len(cluster))
+
+    clusters = []
+    for w in works:
+        by_label = {
+            label: int(c[w])
+            for label, c in counts.items()
+            if c[w] and label != CLUSTER_LABEL
+        }
+        clusters.append(
+            {
+                "id": int(node_ids[w]),
+                "name": names[w],
+                "size": sum(by_label.values()),
+                "counts": by_label,
+                "pagerank": float(scores["pagerank"][w]),
+            }
+        )
+    clusters.sort(key=lambda c: (c["size"], c["pagerank"]), reverse=True)
+
+    cs, ct = cluster[src_idx], cluster[dst_idx]
+    cross = (cs >= 0) & (ct >= 0) & (cs != ct)
+    a = np.minimum(cs[cross], ct[cross])
+    b = np.maximum(cs[cross], ct[cross])
+    pairs, weights = np.unique(np.stack([a, b], axis=1), axis=0, return_counts=True)
+    links = [
+        {
+            "source": int(node_ids[s]),
+            "target": int(node_ids[t]),
+            "weight": int(w),
+        }
+        for (s, t), w in zip(pairs, weights)
+    ]
+    links.sort(key=lambda l: l["weight"], reverse=True)
+
+    return {"clusters": clusters, "links": links}
+
+
+def write_clusters(driver, node_ids, cluster, overview, batch_size):
+    """
+    把所属作品的节点 id 写到 n.cluster（带索引），总览序列化后存到元数据节点
+    """
+    rows = [
+        {"id": int(nid), "cluster": int(node_ids[c]) if c >= 0 else None}
+        for nid, c in zip(node_ids, cluster)
+    ]
+    cypher = """
+    UNWIND $rows AS row
+    MATCH (n) WHERE id(n) = row.id
+    SET n.cluster = row.cluster
+    """
+    with driver.driver.session() as session:
+        for i in range(0, len(rows), batch_size):
+            session.execute_write(
+                lambda tx, chunk: tx.run(cypher, rows=chunk).consume(),
+                rows[i : i + batch_size],
+            )
+        session.run(
+            f"""
+            MERGE (m:{GRAPH_META_LABEL} {{key: $key}})
+            SET m.overview = $overview, m.updated_at = timestamp()
+            """,
+            key=CLUSTER_META_KEY,
+            overview=json.dumps(overview, ensure_ascii=False, separators=(",", ":")),
+        ).consume()
+
+
+def load_cluster_overview(driver):
+    """
+    读取预计算好的聚类总览；还没跑过分析步骤时返回空总览
+    """
+    with driver.driver.session() as session:
+        record = session.run(
+            f"MATCH (m:{GRAPH_META_LABEL} {{key: $key}}) RETURN m.overview AS overview",
+            key=CLUSTER_META_KEY,
+        ).single()
+    if record is None or record["overview"] is None:
+        return {"clusters": [], "links": []}
+    return json.loads(record["overview"])
+
+
+def query_cluster_members(driver, cluster_id, offset, limit, label=None):
+    """
+    某个作品聚类下的成员（不含作品本身），按 PageRank 分页；
+    同时返回这一页成员之间、以及它们与作品节点之间的边
+    """
+    with driver.driver.session() as session:
+        records = list(
+            session.run(
+                f"""
+                MATCH (n:{ENTITY_LABEL})
+                WHERE n.cluster = $cluster AND id(n) <> $cluster
+                  AND ($label IS NULL OR $label IN labels(n))
+                RETURN id(n) AS id, n.name AS name,
+                       [l IN labels(n) WHERE l <> $entity_label][0] AS label,
+                       properties(n) AS props
+                ORDER BY coalesce(n.pagerank, 0) DESC, id(n)
+                SKIP $offset
+                LIMIT $limit
+                """,
+                cluster=cluster_id,
+                label=label,
+                offset=offset,
+                limit=limit,
+                entity_label=ENTITY_LABEL,
+            )
+        )
+        node_records = [(r["id"], r["name"], r["label"], r["props"]) for r in records]
+
+        edge_records = []
+        if node_records:
+            ids = [rec[0] for rec in node_records] + [cluster_id]
+            edge_records = [
+                (r["source"], r["target"], r["type"], r["props"])
+                for r in session.run(
+                    """
+                    MATCH (a)-[r]->(b)
+                    WHERE id(a) IN $ids AND id(b) IN $ids
+                    RETURN id(a) AS source, id(b) AS target, type(r) AS type, properties(r) AS props
+                    """,
+                    ids=ids,
+                )
+            ]
+
+    return node_records, edge_records
+
+
+class ClusterOverview:
+    """
+    某个图版本下的聚类总览，附带按作品 id 的索引
+    """
+
+    def __init__(self, version, overview):
+        self.version = version
+        self.clusters = overview["clusters"]
+        self.links = overview["links"]
+        self.by_id = {c["id"]: c for c in self.clusters}
+        self.etag = f"g{version}-clusters"
+
+    def top(self, limit, min_weight=1):
+        """
+        成员最多的前 limit 个作品，以及它们之间权重不低于 min_weight 的边
+        """
+        clusters = self.clusters[:limit]
+        ids = {c["id"] for c in clusters}
+        links = [
+            l
+            for l in self.links
+            if l["weight"] >= min_weight and l["source"] in ids and l["target"] in ids
+        ]
+        return {
+            "version": self.version,
+            "total": len(self.clusters),
+            "clusters": clusters,
+            "links": links,
+        }
+
+
+class ClusterOverviewCache:
+    """
+    聚类总览按图版本只从 Neo4j 读一次
+    """
+
+    def __init__(self, driver):
+        self._driver = driver
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def get(self, version):
+        entry = self._entry
+        if entry is not None and entry.version == version:
+            return entry
+
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry.version == version:
+                return entry
+            entry = ClusterOverview(version, load_cluster_overview(self._driver))
+            self._entry = entry
+            return entry
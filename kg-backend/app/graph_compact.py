@@ -0,0 +1,157 @@
+import json
+import struct
+
+import numpy as np
+
+# Accept 头里带上这个类型即返回列式二进制
+COMPACT_MIMETYPE = "application/vnd.kg.graph+columnar"
+
+MAGIC = b"KGC1"
+
+
+def _pad(buf, align):
+    return buf + b"\x00" * (-len(buf) % align)
+
+
+def encode_compact(payload):
+    """
+    把 {"nodes": [...], "links": [...]} 编成列式二进制（小端）：
+
+        magic "KGC1" | uint32 header_len | header JSON | 补齐到 8 字节
+        int64  node_id[N]        Neo4j 节点 id，用于按需拉详情
+        int32  node_label[N]     指向 header.labels
+        int32  edge_source[M]    指向节点下标（0..N-1）
+        int32  edge_target[M]
+        int32  edge_type[M]      指向 header.rel_types
+        float32 node_x[N]        header.layout 为真时才有：预计算的布局坐标
+        float32 node_y[N]
+        uint32 name_offset[N+1]  名字字符串表的字节偏移
+        bytes  names             UTF-8 拼接的名字
+
+    节点属性不在这里下发，前端需要时走 /api/node/<id> 拉取
+    """
+    nodes = payload["nodes"]
+    links = payload["links"]
+
+    labels, label2idx = [], {}
+    rel_types, type2idx = [], {}
+    id2idx = {}
+
+    node_ids = np.empty(len(nodes), dtype="<i8")
+    node_label = np.empty(len(nodes), dtype="<i4")
+    name_bytes = []
+    layout = bool(nodes) and all("x" in node for node in nodes)
+    node_x = np.empty(len(nodes) if layout else 0, dtype="<f4")
+    node_y = np.empty(len(nodes) if layout else 0, dtype="<f4")
+    for i, node in enumerate(nodes):
+        id2idx[node["id"]] = i
+        node_ids[i] = node["id"]
+        label = node["group"]
+        if label not in label2idx:
+            label2idx[label] = len(labels)
+            labels.append(label)
+        node_label[i] = label2idx[label]
+        name_bytes.append((node["name"] or "").encode("utf-8"))
+        if layout:
+            node_x[i] = node["x"]
+            node_y[i] = node["y"]
+
+    edges = [l for l in links if l["source"] in id2idx and l["target"] in id2idx]
+    edge_source = np.empty(len(edges), dtype="<i4")
+    edge_target = np.empty(len(edges), dtype="<i4")
+    edge_type = np.empty(len(edges), dtype="<i4")
+    for i, link in enumerate(edges):
+        edge_source[i] = id2idx[link["source"]]
+        edge_target[i] = id2idx[link["target"]]
+        rel_type = link["type"]
+        if rel_type not in type2idx:
+            type2idx[rel_type] = len(rel_types)
+            rel_types.append(rel_type)
+        edge_type[i] = type2idx[rel_type]
+
+    name_offset = np.zeros(len(nodes) + 1, dtype="<u4")
+    if name_bytes:
+        np.cumsum([len(b) for b in name_bytes], out=name_offset[1:])
+
+    header = json.dumps(
+        {
+            "n_nodes": len(nodes),
+            "n_edges": len(edges),
+            "labels": labels,
+            "rel_types": rel_types,
+            "layout": layout,
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+    buf = MAGIC + struct.pack("<I", len(header)) + header
+    buf = _pad(buf, 8)
+    return b"".join(
+        [
+            buf,
+            node_ids.tobytes(),
+            node_label.tobytes(),
+            edge_source.tobytes(),
+            edge_target.tobytes(),
+            edge_type.tobytes(),
+            node_x.tobytes(),
+            node_y.tobytes(),
+            name_offset.tobytes(),
+            b"".join(name_bytes),
+        ]
+    )
+
+
+def decode_compact(data):
+    """
+    解码（调试 / 测试用），返回与 encode_compact 输入同形的精简 payload
+    """
+    if data[:4] != MAGIC:
+        raise ValueError("not a compact graph payload")
+    (header_len,) = struct.unpack_from("<I", data, 4)
+    header = json.loads(data[8 : 8 + header_len].decode("utf-8"))
+    offset = 8 + header_len
+    offset += -offset % 8
+
+    n, m = header["n_nodes"], header["n_edges"]
+
+    def _take(dtype, count):
+        nonlocal offset
+        arr = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += arr.nbytes
+        return arr
+
+    node_ids = _take("<i8", n)
+    node_label = _take("<i4", n)
+    edge_source = _take("<i4", m)
+    edge_target = _take("<i4", m)
+    edge_type = _take("<i4", m)
+    n_xy = n if header.get("layout") else 0
+    node_x = _take("<f4", n_xy)
+    node_y = _take("<f4", n_xy)
+    name_offset = _take("<u4", n + 1)
+    names = data[offset:]
+
+    nodes = [
+        {
+            "id": int(node_ids[i]),
+            "name": names[name_offset[i] : name_offset[i + 1]].decode("utf-8"),
+            "group": header["labels"][node_label[i]],
+        }
+        for i in range(n)
+    ]
+    for i in range(n_xy):
+        nodes[i]["x"] = float(node_x[i])
+        nodes[i]["y"] = float(node_y[i])
+
+    return {
+        "nodes": nodes,
+        "links": [
+            {
+                "source": int(node_ids[edge_source[i]]),
+                "target": int(node_ids[edge_target[i]]),
+                "type": header["rel_types"][edge_type[i]],
+            }
+            for i in range(m)
+        ],
+    }
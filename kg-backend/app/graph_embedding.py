@@ -0,0 +1,361 @@
+import os
+import json
+import time
+import shutil
+import logging
+import argparse
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+
+from .constants import ENTITY_LABEL
+from .graph_analytics import fetch_topology, index_edges
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_DIR = "app/artifacts/embeddings"
+# 指向当前版本子目录的指针文件，原子替换
+CURRENT_FILE = "CURRENT"
+
+EMBEDDING_DIM = 64
+# 随机化 SVD 的过采样列数和幂迭代轮数
+OVERSAMPLE = 16
+POWER_ITERATIONS = 4
+
+# 这些标签类属性（节点上的数组）作为伪节点并入图：
+# 萌点 / 题材相同的实体即使不在同一作品里也会靠近
+TAG_PROPERTIES = ("CharacterTag", "WorkCategory")
+
+# 节点数不超过这个值时暴力扫描，否则建 IVF（k-means 倒排）索引
+BRUTE_FORCE_LIMIT = 50000
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 50000
+# 查询时默认探查多少个倒排列表
+DEFAULT_NPROBE = 8
+
+
+def fetch_tags(driver, node_ids):
+    """
+    (节点下标, 标签) 对：TAG_PROPERTIES 里的数组属性展开
+    """
+    id2row = {nid: i for i, nid in enumerate(node_ids.tolist())}
+    rows, tags = [], []
+    with driver.driver.session() as session:
+        for r in session.run(
+            f"""
+            MATCH (n:{ENTITY_LABEL})
+            WHERE any(p IN $props WHERE n[p] IS NOT NULL)
+            RETURN id(n) AS id, [p IN $props | n[p]] AS values
+            """,
+            props=list(TAG_PROPERTIES),
+        ):
+            row = id2row.get(r["id"])
+            if row is None:
+                continue
+            for prop, value in zip(TAG_PROPERTIES, r["values"]):
+                if isinstance(value, str):
+                    value = [value]
+                for tag in value or []:
+                    rows.append(row)
+                    tags.append(f"{prop}:{tag}")
+    return np.asarray(rows, dtype=np.int64), tags
+
+
+def augmented_adjacency(n, s, t, tag_rows, tags):
+    """
+    实体邻接 + 实体-标签二部边，标签按出现次数各占一个伪节点（排在实体之后）；
+    返回对称的 (n + 标签数) 方阵，多重边合并为 1
+    """
+    if len(tag_rows):
+        _, tag_col = np.unique(np.asarray(tags, dtype=str), return_inverse=True)
+        n_tags = int(tag_col.max()) + 1
+    else:
+        tag_col, n_tags = np.zeros(0, dtype=np.int64), 0
+    size = n + n_tags
+    rows = np.concatenate([s, t, tag_rows, n + tag_col])
+    cols = np.concatenate([t, s, n + tag_col, tag_rows])
+    adj = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(size, size))
+    adj.data[:] = 1.0
+    adj.setdiag(0)
+    adj.eliminate_zeros()
+    return adj
+
+
+def spectral_embedding(adj, dim=EMBEDDING_DIM, seed=0):
+    """
+    谱嵌入：归一化邻接 M = D^-1/2 A D^-1/2 的前 dim 个特征向量（随机化子空间迭代），
+    取 U * sqrt(λ)，行 L2 归一化后点积即余弦。
+    迭代在 (I + M) / 2 上做，谱落在 [0, 1]，收敛到代数最大的特征值，
+    不会被实体-标签二部结构带来的负特征值抢走
+    """
+    size = adj.shape[0]
+    degree = np.asarray(adj.sum(axis=1)).ravel()
+    inv_sqrt = 1.0 / np.sqrt(np.maximum(degree, 1.0))
+    m = (sp.diags(inv_sqrt) @ adj @ sp.diags(inv_sqrt)).tocsr()
+    m = ((m + sp.identity(size, format="csr")) * 0.5).tocsr()
+
+    k = min(dim + OVERSAMPLE, size)
+    rng = np.random.default_rng(seed)
+    q, _ = np.linalg.qr(m @ rng.standard_normal((size, k)))
+    for _ in range(POWER_ITERATIONS):
+        q, _ = np.linalg.qr(m @ q)
+    # M 对称：Q^T M Q 的特征分解给出 M 的近似特征对
+    small = q.T @ (m @ q)
+    values, vectors = np.linalg.eigh((small + small.T) / 2)
+    order = np.argsort(-values)[:dim]
+    u = q @ vectors[:, order]
+    emb = u * np.sqrt(np.maximum(values[order], 0.0))
+
+    if emb.shape[1] < dim:
+        emb = np.hstack([emb, np.zeros((size, dim - emb.shape[1]))])
+    norm = np.linalg.norm(emb, axis=1, keepdims=True)
+    return (emb / np.where(norm > 0, norm, 1.0)).astype(np.float32)
+
+
+def _assign(vectors, centroids, chunk=65536):
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk):
+        out[start : start + chunk] = np.argmax(
+            vectors[start : start + chunk] @ centroids.T, axis=1
+        )
+    return out
+
+
+def train_ivf(vectors, seed=0):
+    """
+    球面 k-means（余弦）：nlist ≈ 4 sqrt(n)，在采样上迭代；返回 (质心, 每行所属列表)
+    """
+    n = len(vectors)
+    nlist = max(1, int(4 * np.sqrt(n)))
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(n, min(n, KMEANS_SAMPLE), replace=False)]
+    centroids = sample[rng.choice(len(sample), min(nlist, len(sample)), replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        assign = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        norm = np.linalg.norm(sums, axis=1, keepdims=True)
+        # 空簇保留原质心
+        centroids = np.where(norm > 0, sums / np.where(norm > 0, norm, 1.0), centroids)
+    return centroids.astype(np.float32), _assign(vectors, centroids)
+
+
+def write_embedding_index(out_dir, version, node_ids, labels, names, vectors):
+    """
+    写入 out_dir/v{version}/ 后原子替换 CURRENT 指针：
+        vectors.npy   float32 (n, dim)，行按 IVF 列表排好，查询时只读连续区间
+        ids.npy       每行的节点 id；label_codes.npy 每行的 label 编号
+        ivf_*.npy     质心和各列表在行里的起止（小图没有）
+        meta.json     版本、维度、label 表、名字
+    只保留当前和上一个版本
+    """
+    start = time.perf_counter()
+    n = len(node_ids)
+    if n > BRUTE_FORCE_LIMIT:
+        centroids, assign = train_ivf(vectors)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+    else:
+        centroids, order, offsets = None, np.arange(n), None
+
+    label_list = sorted({l or "" for l in labels})
+    code = {l: i for i, l in enumerate(label_list)}
+    label_codes = np.asarray([code[l or ""] for l in labels], dtype=np.int16)
+
+    target = os.path.join(out_dir, f"v{version}")
+    tmp = f"{target}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "vectors.npy"), vectors[order])
+    np.save(os.path.join(tmp, "ids.npy"), np.asarray(node_ids, dtype=np.int64)[order])
+    np.save(os.path.join(tmp, "label_codes.npy"), label_codes[order])
+    if centroids is not None:
+        np.save(os.path.join(tmp, "ivf_centroids.npy"), centroids)
+        np.save(os.path.join(tmp, "ivf_offsets.npy"), offsets.astype(np.int64))
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": version,
+                "dim": int(vectors.shape[1]),
+                "labels": label_list,
+                "names": [names[i] for i in order.tolist()],
+                "ivf": centroids is not None,
+            },
+            f,
+            ensure_ascii=False,
+        )
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+
+    pointer = os.path.join(out_dir, f"{CURRENT_FILE}.tmp-{os.getpid()}")
+    with open(pointer, "w") as f:
+        f.write(f"v{version}")
+    os.replace(pointer, os.path.join(out_dir, CURRENT_FILE))
+
+    keep = {f"v{version}", f"v{version - 1}"}
+    for entry in os.listdir(out_dir):
+        if entry.startswith("v") and entry not in keep and ".tmp-" not in entry:
+            shutil.rmtree(os.path.join(out_dir, entry), ignore_errors=True)
+
+    logger.info(
+        "embedding index v%s: %d rows, ivf=%s, %.2fs",
+        version,
+        n,
+        centroids is not None,
+        time.perf_counter() - start,
+    )
+
+
+def build_embeddings(driver, out_dir=DEFAULT_EMBEDDING_DIR, dim=EMBEDDING_DIM):
+    """
+    离线任务：拉拓扑和标签 → 谱嵌入 → 写索引文件
+    """
+    start = time.perf_counter()
+    version = driver.get_graph_version()
+    node_ids, labels, names, src, dst = fetch_topology(driver)
+    s, t = index_edges(node_ids, src, dst)
+    tag_rows, tags = fetch_tags(driver, node_ids)
+
+    adj = augmented_adjacency(len(node_ids), s, t, tag_rows, tags)
+    vectors = spectral_embedding(adj, dim)[: len(node_ids)]
+    os.makedirs(out_dir, exist_ok=True)
+    write_embedding_index(out_dir, version, node_ids, labels, names, vectors)
+
+    report = {
+        "version": version,
+        "nodes": len(node_ids),
+        "tags": adj.shape[0] - len(node_ids),
+        "dim": dim,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    logger.info("graph embedding: %s", report)
+    return report
+
+
+class EmbeddingIndex:
+    """
+    只读的嵌入索引：向量以 mmap 方式打开，启动时不读入内存，由页缓存按需换入
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.version = meta["version"]
+        self.dim = meta["dim"]
+        self.labels = meta["labels"]
+        self.names = meta["names"]
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.label_codes = np.load(os.path.join(path, "label_codes.npy"))
+        self.centroids = self.offsets = None
+        if meta["ivf"]:
+            self.centroids = np.load(os.path.join(path, "ivf_centroids.npy"))
+            self.offsets = np.load(os.path.join(path, "ivf_offsets.npy"))
+        self._id_order = np.argsort(self.ids)
+
+    def row_of(self, node_id):
+        pos = np.searchsorted(self.ids, node_id, sorter=self._id_order)
+        if pos < len(self.ids):
+            row = int(self._id_order[pos])
+            if self.ids[row] == node_id:
+                return row
+        return None
+
+    def _candidate_rows(self, query, nprobe):
+        if self.centroids is None:
+            return None
+        lists = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.concatenate(
+            [np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists]
+        )
+
+    def similar(self, node_id, limit=10, labels=None, nprobe=DEFAULT_NPROBE):
+        """
+        与 node_id 余弦最相近的 limit 个节点 [(row, score)]；labels 限定类型。
+        IVF 下结果不足时把 nprobe 翻倍重查，直到覆盖全部列表
+        """
+        row = self.row_of(node_id)
+        if row is None:
+            return None
+        query = np.asarray(self.vectors[row], dtype=np.float32)
+        codes = None
+        if labels:
+            codes = [i for i, l in enumerate(self.labels) if l in labels]
+
+        while True:
+            rows = self._candidate_rows(query, nprobe)
+            if rows is None:
+                scores = self.vectors @ query
+                rows = np.arange(len(scores))
+            else:
+                scores = self.vectors[rows] @ query
+            keep = rows != row
+            if codes is not None:
+                keep &= np.isin(self.label_codes[rows], codes)
+            rows, scores = rows[keep], scores[keep]
+            exhausted = self.centroids is None or nprobe >= len(self.centroids)
+            if len(rows) >= limit or exhausted:
+                break
+            nprobe *= 2
+
+        if len(rows) > limit:
+            part = np.argpartition(-scores, limit)[:limit]
+            rows, scores = rows[part], scores[part]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(rows[i]), float(scores[i])) for i in order]
+
+    def describe(self, row):
+        return {
+            "id": int(self.ids[row]),
+            "name": self.names[row],
+            "label": self.labels[self.label_codes[row]],
+        }
+
+
+class EmbeddingIndexCache:
+    """
+    跟随 CURRENT 指针打开最新的嵌入索引；离线任务写完新版本后，
+    下一次请求发现指针变化即切换（旧 mmap 由引用计数自然释放）
+    """
+
+    def __init__(self, out_dir=DEFAULT_EMBEDDING_DIR):
+        self._dir = out_dir
+        self._index = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        pointer = os.path.join(self._dir, CURRENT_FILE)
+        try:
+            stamp = os.stat(pointer).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if stamp == self._stamp:
+            return self._index
+
+        with self._lock:
+            if stamp != self._stamp:
+                try:
+                    with open(pointer) as f:
+                        path = os.path.join(self._dir, f.read().strip())
+                    self._index = EmbeddingIndex(path)
+                except Exception as e:
+                    logger.warning("embedding index open failed: %s", e)
+                self._stamp = stamp
+            return self._index
+
+
+if __name__ == "__main__":
+    from .neo4j_driver import Neo4jDriver
+
+    parser = argparse.ArgumentParser(description="训练图结构嵌入并写出近邻索引")
+    parser.add_argument("--out", default=DEFAULT_EMBEDDING_DIR)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    driver = Neo4jDriver()
+    build_embeddings(driver, args.out, args.dim)
+    driver.close()
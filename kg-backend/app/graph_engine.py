@@ -0,0 +1,597 @@
+import time
+import heapq
+import logging
+
+import numpy as np
+
+from .constants import ENTITY_LABEL
+from .graph_version import VersionedBuild
+
+logger = logging.getLogger(__name__)
+
+# 与原 allShortestPaths((a)-[*..5]-(b)) 保持一致的默认跳数上限
+MAX_HOPS = 5
+# 同长度最短路径最多枚举多少条（allShortestPaths 在枢纽节点上会爆炸）
+MAX_PATHS = 100
+
+# 信息量路径搜索的默认参数：
+# 进入节点 v 的代价为 1 + HUB_PENALTY * log(1 + degree(v))，度数越高的中转点越“贵”
+HUB_PENALTY = 1.0
+# 单次搜索最多发现多少个节点
+MAX_FRONTIER = 20000
+# 整个 top-k 搜索的时间预算（秒），超时返回已找到的路径
+PATH_BUDGET = 0.2
+
+
+class GraphEngine:
+    """
+    进程内的只读拓扑副本：实体节点 + 关系，存成无向 CSR 数组。
+    路径搜索完全在内存里做，Neo4j 只负责最后补节点 / 关系的属性
+
+        node_ids[N]      Neo4j 节点 id（升序，下标即内部编号）
+        indptr[N+1]      CSR 行指针
+        neighbors[2M]    邻居内部编号
+        edge_of[2M]      对应的边下标（指向 rel_ids / rel_src / rel_dst / rel_type）
+    """
+
+    def __init__(
+        self, version, node_ids, rel_ids, rel_src, rel_dst, rel_type, types, names=None
+    ):
+        self.version = version
+        self.node_ids = node_ids
+        self.rel_ids = rel_ids
+        self.rel_type = rel_type
+        self.types = types
+        # 节点名（与 node_ids 对齐），批量路径接口不回 Neo4j 就能给出路径上的名字
+        self.names = names
+
+        n = len(node_ids)
+        rel_src = np.asarray(rel_src, dtype=np.int64)
+        rel_dst = np.asarray(rel_dst, dtype=np.int64)
+        self.rel_src = rel_src
+        self.rel_dst = rel_dst
+        ends = np.concatenate([rel_src, rel_dst])
+        others = np.concatenate([rel_dst, rel_src])
+        edges = np.concatenate([np.arange(len(rel_ids))] * 2)
+        order = np.argsort(ends, kind="stable")
+        self.neighbors = others[order]
+        self.edge_of = edges[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ends, minlength=n), out=self.indptr[1:])
+        self.degree = np.diff(self.indptr)
+        self.log_degree = np.log1p(self.degree)
+
+    @property
+    def n_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def n_edges(self):
+        return len(self.rel_ids)
+
+    def index_of(self, node_id):
+        """
+        Neo4j 节点 id → 内部编号；不在图里返回 None
+        """
+        pos = int(np.searchsorted(self.node_ids, node_id))
+        if pos < len(self.node_ids) and self.node_ids[pos] == node_id:
+            return pos
+        return None
+
+    def names_of(self, node_ids):
+        if self.names is None:
+            return [None] * len(node_ids)
+        return [self.names[i] for i in np.searchsorted(self.node_ids, node_ids)]
+
+    def _expand(self, frontier, edge_mask=None):
+        """
+        一次性展开整层 frontier：返回 (父节点, 邻居, 边下标) 三个等长数组
+        """
+        starts = self.indptr[frontier]
+        counts = self.indptr[frontier + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        slots = np.arange(total) + offsets
+        parents = np.repeat(frontier, counts)
+        nbrs = self.neighbors[slots]
+        edges = self.edge_of[slots]
+        if edge_mask is not None:
+            keep = edge_mask[edges]
+            parents, nbrs, edges = parents[keep], nbrs[keep], edges[keep]
+        return parents, nbrs, edges
+
+    def _bidirectional_bfs(self, s, t, max_hops, banned_nodes=None, banned_edges=None):
+        """
+        双向 BFS，每次扩展较小的一侧 frontier，枢纽节点只会被展开一次。
+        返回 (dist_s, dist_t, s 侧最外层节点, 最短长度)；不可达时长度为 None
+        """
+        n = self.n_nodes
+        dist = [np.full(n, -1, dtype=np.int32), np.full(n, -1, dtype=np.int32)]
+        dist[0][s] = 0
+        dist[1][t] = 0
+        if s == t:
+            return dist[0], dist[1], np.array([s]), 0
+
+        edge_mask = None
+        if banned_edges is not None and len(banned_edges):
+            edge_mask = np.ones(self.n_edges, dtype=bool)
+            edge_mask[banned_edges] = False
+        node_ok = None
+        if banned_nodes is not None and len(banned_nodes):
+            node_ok = np.ones(n, dtype=bool)
+            node_ok[banned_nodes] = False
+
+        frontier = [np.array([s], dtype=np.int64), np.array([t], dtype=np.int64)]
+        depth = [0, 0]
+        while depth[0] + depth[1] < max_hops:
+            # 按展开成本（frontier 上的度数和）挑一侧
+            cost = [int(self.degree[f].sum()) for f in frontier]
+            side = 0 if cost[0] <= cost[1] else 1
+            if cost[side] == 0:
+                return dist[0], dist[1], frontier[0], None
+
+            _, nbrs, _ = self._expand(frontier[side], edge_mask)
+            nbrs = np.unique(nbrs)
+            nbrs = nbrs[dist[side][nbrs] < 0]
+            if node_ok is not None:
+                nbrs = nbrs[node_ok[nbrs]]
+            depth[side] += 1
+            dist[side][nbrs] = depth[side]
+            frontier[side] = nbrs
+
+            met = nbrs[dist[1 - side][nbrs] >= 0]
+            if len(met):
+                length = depth[side] + int(dist[1 - side][met].min())
+                return dist[0], dist[1], frontier[0], length
+            if len(nbrs) == 0:
+                return dist[0], dist[1], frontier[0], None
+
+        return dist[0], dist[1], frontier[0], None
+
+    def _walk(self, start, dist, edge_mask=None):
+        """
+        从 start 沿 dist 递减方向走回 BFS 源点，枚举所有最短前缀（生成器）。
+        产出 (节点列表, 边列表)，均从 start 开始
+        """
+        d = int(dist[start])
+        if d == 0:
+            yield [start], []
+            return
+        _, nbrs, edges = self._expand(np.array([start]), edge_mask)
+        back = dist[nbrs] == d - 1
+        for u, e in zip(nbrs[back].tolist(), edges[back].tolist()):
+            for nodes, rels in self._walk(u, dist, edge_mask):
+                yield [start] + nodes, [e] + rels
+
+    def shortest_paths(self, source_id, target_id, max_hops=MAX_HOPS, limit=MAX_PATHS):
+        """
+        源、目标之间所有长度最短的路径（最多 limit 条）。
+        每条路径为 (节点 Neo4j id 列表, 关系 Neo4j id 列表)
+        """
+        s, t = self.index_of(source_id), self.index_of(target_id)
+        if s is None or t is None:
+            return []
+        return [
+            self._to_ids(nodes, rels)
+            for nodes, rels in self._enumerate(s, t, max_hops, limit)
+        ]
+
+    def _enumerate(self, s, t, max_hops, limit, banned_nodes=None, banned_edges=None):
+        dist_s, dist_t, outer, length = self._bidirectional_bfs(
+            s, t, max_hops, banned_nodes, banned_edges
+        )
+        if length is None:
+            return []
+        if length == 0:
+            return [([s], [])]
+
+        edge_mask = None
+        if banned_edges is not None and len(banned_edges):
+            edge_mask = np.ones(self.n_edges, dtype=bool)
+            edge_mask[banned_edges] = False
+
+        # 每条最短路径都恰好经过 s 侧最外层的一个节点（汇合点），它到 t 的距离为 L - ds
+        ds = int(dist_s[outer[0]])
+        meet = outer[dist_t[outer] == length - ds]
+
+        paths = []
+        for v in meet.tolist():
+            for head_nodes, head_rels in self._walk(v, dist_s, edge_mask):
+                for tail_nodes, tail_rels in self._walk(v, dist_t, edge_mask):
+                    paths.append(
+                        (head_nodes[::-1] + tail_nodes[1:], head_rels[::-1] + tail_rels)
+                    )
+                    if len(paths) >= limit:
+                        return paths
+        return paths
+
+    def shortest_path(self, source_id, target_id, max_hops=MAX_HOPS):
+        paths = self.shortest_paths(source_id, target_id, max_hops, limit=1)
+        return paths[0] if paths else None
+
+    def k_shortest_paths(self, source_id, target_id, k, max_hops=MAX_HOPS):
+        """
+        Yen 算法：前 k 条无环路径（按长度升序），每次偏离搜索仍走双向 BFS
+        """
+        return list(self.iter_k_shortest_paths(source_id, target_id, k, max_hops))
+
+    def iter_k_shortest_paths(self, source_id, target_id, k, max_hops=MAX_HOPS):
+        """
+        同 k_shortest_paths，但每确定一条路径就立即产出（流式输出用）
+        """
+        s, t = self.index_of(source_id), self.index_of(target_id)
+        if s is None or t is None:
+            return
+
+        first = self._enumerate(s, t, max_hops, 1)
+        if not first:
+            return
+        found = [first[0]]
+        yield self._to_ids(*first[0])
+        candidates = []
+        seen = {tuple(first[0][1])}
+
+        while len(found) < k:
+            prev_nodes, prev_rels = found[-1]
+            for i in range(len(prev_nodes) - 1):
+                spur = prev_nodes[i]
+                root_nodes, root_rels = prev_nodes[: i + 1], prev_rels[:i]
+                banned_edges = [
+                    rels[i]
+                    for nodes, rels in found
+                    if len(rels) > i and nodes[: i + 1] == root_nodes
+                ]
+                banned_nodes = root_nodes[:-1]
+                spur_paths = self._enumerate(
+                    spur,
+                    t,
+                    max_hops - i,
+                    1,
+                    banned_nodes=np.asarray(banned_nodes, dtype=np.int64),
+                    banned_edges=np.asarray(banned_edges, dtype=np.int64),
+                )
+                for nodes, rels in spur_paths:
+                    path = (root_nodes[:-1] + nodes, root_rels + rels)
+                    key = tuple(path[1])
+                    if key not in seen:
+                        seen.add(key)
+                        candidates.append(path)
+            if not candidates:
+                break
+            candidates.sort(key=lambda p: len(p[1]))
+            found.append(candidates.pop(0))
+            yield self._to_ids(*found[-1])
+
+    def type_mask(self, allow_types=None, deny_types=None):
+        """
+        关系类型白 / 黑名单 → 边上的布尔掩码；都为空时返回 None（不过滤）
+        """
+        if not allow_types and not deny_types:
+            return None
+        type2idx = {t: i for i, t in enumerate(self.types)}
+        ok = np.ones(len(self.types), dtype=bool)
+        if allow_types:
+            ok[:] = False
+            ok[[type2idx[t] for t in allow_types if t in type2idx]] = True
+        if deny_types:
+            ok[[type2idx[t] for t in deny_types if t in type2idx]] = False
+        return ok[self.rel_type]
+
+    def _hops_to(self, t, max_hops, edge_ok=None, max_degree=None):
+        """
+        按层 BFS 求各节点到 t 的跳数（max_hops 以外记 -1），作为剩余跳数的下界：
+        既用来剪掉注定超出跳数上限的标签，也作为 A* 的启发值（每跳代价至少为 1）。
+        度数超过 max_degree 的节点不能做中转，BFS 也不从它们继续展开
+        """
+        dist = np.full(self.n_nodes, -1, dtype=np.int64)
+        dist[t] = 0
+        frontier = np.array([t], dtype=np.int64)
+        for depth in range(1, max_hops + 1):
+            if depth > 1 and max_degree is not None:
+                frontier = frontier[self.degree[frontier] <= max_degree]
+            _, nbrs, _ = self._expand(frontier, edge_ok)
+            nbrs = np.unique(nbrs)
+            nbrs = nbrs[dist[nbrs] < 0]
+            if len(nbrs) == 0:
+                break
+            dist[nbrs] = depth
+            frontier = nbrs
+        return dist
+
+    def _cheapest_path(
+        self,
+        s,
+        t,
+        max_hops,
+        hub_penalty,
+        edge_ok,
+        max_degree,
+        max_frontier,
+        deadline,
+        banned_nodes=frozenset(),
+        banned_edges=frozenset(),
+        hops_to_t=None,
+    ):
+        """
+        以节点代价做 Dijkstra：中转点度数越高代价越大，度数超过 max_degree 的节点
+        不作为中转点展开；发现的节点数超过 max_frontier 后不再扩大搜索范围。
+        有跳数上限，所以按 (节点, 跳数) 保留标签：一条便宜但很长的前缀不能挡住
+        另一条贵一些、跳数更少的路线。标签只有在同一节点存在跳数不多于它、
+        代价也不高于它的标签时才被剪掉。
+        hops_to_t 为 _hops_to 的结果：已走跳数 + 剩余跳数下界超过上限的标签直接丢弃，
+        并以剩余跳数下界作为 A* 启发值
+        返回 (节点列表, 边列表, 代价)，找不到或超时返回 None
+        """
+        if hops_to_t is None:
+            hops_to_t = self._hops_to(t, max_hops, edge_ok, max_degree)
+        if not 0 <= hops_to_t[s] <= max_hops:
+            return None
+
+        inf = float("inf")
+        # best[v][h]：恰好 h 跳到达 v 的最小代价
+        best = {s: [0.0] + [inf] * max_hops}
+        prev = {}
+        heap = [(float(hops_to_t[s]), 0.0, 0, s)]
+
+        while heap:
+            if time.perf_counter() > deadline:
+                return None
+            _, d, h, u = heapq.heappop(heap)
+            row = best[u]
+            if row[h] < d or any(c <= d for c in row[:h]):
+                continue
+
+            if u == t:
+                nodes, rels = [t], []
+                while h:
+                    u, e = prev[(u, h)]
+                    h -= 1
+                    nodes.append(u)
+                    rels.append(e)
+                return nodes[::-1], rels[::-1], d
+
+            if h >= max_hops:
+                continue
+            if u != s and max_degree is not None and self.degree[u] > max_degree:
+                continue
+
+            nh = h + 1
+            lo, hi = self.indptr[u], self.indptr[u + 1]
+            nbrs = self.neighbors[lo:hi]
+            edges = self.edge_of[lo:hi]
+            remain = hops_to_t[nbrs]
+            keep = (remain >= 0) & (remain <= max_hops - nh)
+            if edge_ok is not None:
+                keep &= edge_ok[edges]
+            nbrs, edges, remain = nbrs[keep], edges[keep], remain[keep]
+            costs = d + 1.0 + hub_penalty * self.log_degree[nbrs]
+
+            full = len(best) >= max_frontier
+            for v, e, nd, r in zip(
+                nbrs.tolist(), edges.tolist(), costs.tolist(), remain.tolist()
+            ):
+                if v in banned_nodes or e in banned_edges:
+                    continue
+                vrow = best.get(v)
+                if vrow is None:
+                    if full and v != t:
+                        continue
+                    vrow = best[v] = [inf] * (max_hops + 1)
+                elif any(c <= nd for c in vrow[: nh + 1]):
+                    continue
+                vrow[nh] = nd
+                prev[(v, nh)] = (u, e)
+                heapq.heappush(heap, (nd + r, nd, nh, v))
+
+        return None
+
+    def informative_paths(
+        self,
+        source_id,
+        target_id,
+        k=1,
+        max_hops=MAX_HOPS,
+        allow_types=None,
+        deny_types=None,
+        hub_penalty=HUB_PENALTY,
+        max_degree=None,
+        max_frontier=MAX_FRONTIER,
+        budget=PATH_BUDGET,
+    ):
+        """
+        避开枢纽节点的 top-k 路径（Yen 算法 + 节点代价 Dijkstra）：
+        - allow_types / deny_types：只走 / 不走这些关系类型
+        - hub_penalty：中转点的度数惩罚系数，0 即退化为按跳数
+        - max_degree：度数超过它的节点不作为中转点
+        - max_frontier：单次搜索发现节点数上限
+        - budget：总时间预算（秒），超时返回已找到的路径
+        返回 ([(节点 Neo4j id 列表, 关系 Neo4j id 列表, 代价)], 是否因预算截断)
+        """
+        s, t = self.index_of(source_id), self.index_of(target_id)
+        if s is None or t is None:
+            return [], False
+
+        deadline = time.perf_counter() + budget
+        edge_ok = self.type_mask(allow_types, deny_types)
+        # 终点固定，各次 spur 搜索共用同一份到终点的跳数下界
+        hops_to_t = self._hops_to(t, max_hops, edge_ok, max_degree)
+
+        def search(src, hop_budget, banned_nodes=frozenset(), banned_edges=frozenset()):
+            return self._cheapest_path(
+                src,
+                t,
+                hop_budget,
+                hub_penalty,
+                edge_ok,
+                max_degree,
+                max_frontier,
+                deadline,
+                banned_nodes,
+                banned_edges,
+                hops_to_t,
+            )
+
+        first = search(s, max_hops)
+        if first is None:
+            return [], time.perf_counter() > deadline
+
+        found = [first]
+        seen = {tuple(first[1])}
+        candidates = []
+        while len(found) < k:
+            prev_nodes, prev_rels, _ = found[-1]
+            for i in range(len(prev_nodes) - 1):
+                if time.perf_counter() > deadline:
+                    break
+                root_nodes, root_rels = prev_nodes[: i + 1], prev_rels[:i]
+                banned_edges = {
+                    rels[i]
+                    for nodes, rels, _ in found
+                    if len(rels) > i and nodes[: i + 1] == root_nodes
+                }
+                spur = search(
+                    root_nodes[-1],
+                    max_hops - i,
+                    frozenset(root_nodes[:-1]),
+                    frozenset(banned_edges),
+                )
+                if spur is None:
+                    continue
+                nodes = root_nodes[:-1] + spur[0]
+                rels = root_rels + spur[1]
+                if tuple(rels) in seen:
+                    continue
+                seen.add(tuple(rels))
+                cost = float(
+                    len(nodes) - 1 + hub_penalty * self.log_degree[nodes[1:]].sum()
+                )
+                heapq.heappush(candidates, (cost, len(seen), nodes, rels))
+            if not candidates or time.perf_counter() > deadline:
+                break
+            cost, _, nodes, rels = heapq.heappop(candidates)
+            found.append((nodes, rels, cost))
+
+        truncated = len(found) < k and time.perf_counter() > deadline
+        return [
+            (*self._to_ids(nodes, rels), round(cost, 4)) for nodes, rels, cost in found
+        ], truncated
+
+    def _to_ids(self, nodes, rels):
+        return (
+            [int(x) for x in self.node_ids[nodes]],
+            [int(x) for x in self.rel_ids[rels]] if rels else [],
+        )
+
+
+def _read_topology(tx):
+    """
+    节点和关系在同一个读事务里读出，两次查询看到的是同一份数据
+    """
+    node_ids, names = [], []
+    for r in tx.run(f"MATCH (n:{ENTITY_LABEL}) RETURN id(n) AS id, n.name AS name"):
+        node_ids.append(r["id"])
+        names.append(r["name"])
+    rel_ids, src, dst, rel_type = [], [], [], []
+    types, type2idx = [], {}
+    for r in tx.run(
+        f"""
+        MATCH (a:{ENTITY_LABEL})-[r]->(b:{ENTITY_LABEL})
+        RETURN id(r) AS id, id(a) AS source, id(b) AS target, type(r) AS type
+        """
+    ):
+        t = r["type"]
+        if t not in type2idx:
+            type2idx[t] = len(types)
+            types.append(t)
+        rel_ids.append(r["id"])
+        src.append(r["source"])
+        dst.append(r["target"])
+        rel_type.append(type2idx[t])
+    return node_ids, names, rel_ids, src, dst, rel_type, types
+
+
+def _positions(sorted_ids, ids):
+    """
+    ids 在有序数组 sorted_ids 中的下标，以及是否真的找到（searchsorted 找不到时给的是插入位置）
+    """
+    pos = np.searchsorted(sorted_ids, ids)
+    found = pos < len(sorted_ids)
+    found[found] = sorted_ids[pos[found]] == ids[found]
+    return pos, found
+
+
+def load_graph_engine(driver, version):
+    """
+    从 Neo4j 读出实体节点和实体间关系，构造 GraphEngine
+    """
+    start = time.perf_counter()
+    with driver.driver.session() as session:
+        node_ids, names, rel_ids, src, dst, rel_type, types = session.execute_read(
+            _read_topology
+        )
+
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+    order = np.argsort(node_ids)
+    node_ids = node_ids[order]
+    src_pos, src_ok = _positions(node_ids, np.asarray(src, dtype=np.int64))
+    dst_pos, dst_ok = _positions(node_ids, np.asarray(dst, dtype=np.int64))
+    # 端点不在节点数组里的边（理论上同一事务内不会出现）直接丢弃，不能映射到相邻下标
+    keep = src_ok & dst_ok
+    if not keep.all():
+        logger.warning(
+            "graph engine v%s: dropped %d edges with unknown endpoints",
+            version,
+            int((~keep).sum()),
+        )
+    engine = GraphEngine(
+        version,
+        node_ids,
+        np.asarray(rel_ids, dtype=np.int64)[keep],
+        src_pos[keep],
+        dst_pos[keep],
+        np.asarray(rel_type, dtype=np.int32)[keep],
+        types,
+        names=[names[i] for i in order],
+    )
+    logger.info(
+        "graph engine v%s: %d nodes, %d edges, %.2fs",
+        version,
+        engine.n_nodes,
+        engine.n_edges,
+        time.perf_counter() - start,
+    )
+    return engine
+
+
+def hydrate_paths(driver, paths):
+    """
+    路径只有 id，这里一次性从 Neo4j 取回涉及到的节点和关系（带属性）。
+    返回 (节点 id → Node, 关系 id → Relationship)
+    """
+    node_ids = sorted({nid for nodes, _ in paths for nid in nodes})
+    rel_ids = sorted({rid for _, rels in paths for rid in rels})
+    nodes, rels = {}, {}
+    with driver.driver.session() as session:
+        for r in session.run("MATCH (n) WHERE id(n) IN $ids RETURN n", ids=node_ids):
+            nodes[r["n"].id] = r["n"]
+        if rel_ids:
+            for r in session.run(
+                "UNWIND $ids AS rid MATCH ()-[r]->() WHERE id(r) = rid RETURN r",
+                ids=rel_ids,
+            ):
+                rels[r["r"].id] = r["r"]
+    return nodes, rels
+
+
+class GraphEngineCache(VersionedBuild):
+    """
+    按图版本维护 GraphEngine；构建失败时 get 返回 None，调用方回退到 Cypher
+    """
+
+    def __init__(self, driver):
+        super().__init__(
+            "graph engine", lambda version: load_graph_engine(driver, version)
+        )
@@ -0,0 +1,222 @@
+import time
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 节点数不超过这个值时精确计算两两斥力，否则按网格质心近似
+EXACT_REPULSION_LIMIT = 500
+REPULSION_CHUNK = 512
+# 网格每边最多多少格；每格目标节点数
+GRID_SIZE = 32
+CELL_TARGET = 32
+
+ITERATIONS = 120
+# 大图每轮更贵，迭代数减半
+LARGE_GRAPH_NODES = 20000
+LARGE_ITERATIONS = 60
+# 有上一版本坐标可以热启动时，只需少量迭代微调
+WARM_ITERATIONS = 30
+GRAVITY = 0.05
+
+# 超过这个节点数不做布局，节点不带 x / y，前端自行模拟
+LAYOUT_MAX_NODES = 100000
+
+# 下发给前端的坐标缩放（d3 力导图的大致像素尺度）
+OUTPUT_SCALE = 30.0
+
+
+def _hashed_positions(ids):
+    """
+    由节点 id 决定的伪随机初始坐标，同一节点每次起点相同，布局才稳定
+    """
+    ids = np.asarray(ids, dtype=np.uint64)
+    h1 = (ids * np.uint64(2654435761)) % np.uint64(1 << 32)
+    h2 = ((ids + np.uint64(0x9E3779B9)) * np.uint64(40503)) % np.uint64(1 << 32)
+    return np.stack([h1, h2], axis=1).astype(np.float64) / float(1 << 32) - 0.5
+
+
+def _pairwise_repulsion(x, y, k2, mass=None):
+    """
+    x / y 上两两之间的 FR 斥力 k^2 / d（方向 delta / d），mass 为各点权重
+    """
+    disp_x = np.empty_like(x)
+    disp_y = np.empty_like(y)
+    for start in range(0, len(x), REPULSION_CHUNK):
+        dx = x[start : start + REPULSION_CHUNK, None] - x[None, :]
+        dy = y[start : start + REPULSION_CHUNK, None] - y[None, :]
+        factor = k2 / np.maximum(dx * dx + dy * dy, 1e-4)
+        if mass is not None:
+            factor *= mass
+        disp_x[start : start + REPULSION_CHUNK] = (dx * factor).sum(axis=1)
+        disp_y[start : start + REPULSION_CHUNK] = (dy * factor).sum(axis=1)
+    return np.stack([disp_x, disp_y], axis=1)
+
+
+def _exact_repulsion(pos, k2):
+    return _pairwise_repulsion(pos[:, 0], pos[:, 1], k2)
+
+
+def _grid_repulsion(pos, k2):
+    """
+    大图近似：按坐标等频切成 g x g 个格子（先按 x 分条，条内按 y 分段），
+    每格节点数基本相同。同格节点之间精确计算（补齐成定长批量计算），
+    不同格之间只算格质心（按节点数加权）的斥力，同格节点共享这部分
+    """
+    n = len(pos)
+    g = int(min(GRID_SIZE, max(2, np.sqrt(n / CELL_TARGET))))
+    strip = np.empty(n, dtype=np.int64)
+    strip[np.argsort(pos[:, 0], kind="stable")] = np.arange(n) * g // n
+    order = np.lexsort((pos[:, 1], strip))
+    strip_sorted = strip[order]
+    strip_start = np.searchsorted(strip_sorted, np.arange(g))
+    strip_size = np.diff(np.append(strip_start, n))
+    rank = np.arange(n) - strip_start[strip_sorted]
+    cell_sorted = strip_sorted * g + rank * g // strip_size[strip_sorted]
+
+    n_cells = g * g
+    mass = np.bincount(cell_sorted, minlength=n_cells).astype(pos.dtype)
+    xs, ys = pos[order, 0], pos[order, 1]
+    occupied = mass > 0
+    cx = np.bincount(cell_sorted, weights=xs, minlength=n_cells)[occupied]
+    cy = np.bincount(cell_sorted, weights=ys, minlength=n_cells)[occupied]
+    m = mass[occupied]
+    cx /= m
+    cy /= m
+
+    # 格与格之间：质心两两斥力（自身那一格 delta 为 0，不贡献）
+    cell_disp = np.zeros((n_cells, 2), dtype=pos.dtype)
+    cell_disp[occupied] = _pairwise_repulsion(cx, cy, k2, mass=m)
+    disp_sorted = cell_disp[cell_sorted]
+
+    # 同格节点之间：按格子补齐成 (n_cells, width) 的批量两两计算，空位用掩码去掉
+    cell_start = np.searchsorted(cell_sorted, np.arange(n_cells))
+    slot = np.arange(n) - cell_start[cell_sorted]
+    width = int(slot.max()) + 1
+    bx = np.zeros((n_cells, width), dtype=pos.dtype)
+    by = np.zeros((n_cells, width), dtype=pos.dtype)
+    valid = np.zeros((n_cells, width), dtype=bool)
+    bx[cell_sorted, slot] = xs
+    by[cell_sorted, slot] = ys
+    valid[cell_sorted, slot] = True
+
+    dx = bx[:, :, None] - bx[:, None, :]
+    dy = by[:, :, None] - by[:, None, :]
+    factor = k2 / np.maximum(dx * dx + dy * dy, 1e-4)
+    factor *= valid[:, None, :]
+    disp_sorted[:, 0] += (dx * factor).sum(axis=2)[cell_sorted, slot]
+    disp_sorted[:, 1] += (dy * factor).sum(axis=2)[cell_sorted, slot]
+
+    disp = np.empty_like(pos)
+    disp[order] = disp_sorted
+    return disp
+
+
+def force_layout(ids, src, dst, init=None, iterations=None):
+    """
+    向量化的 Fruchterman-Reingold 布局：
+    - ids: 节点 id（决定初始坐标），src / dst: 边端点的节点下标
+    - init: 可选的 (n, 2) 初始坐标，NaN 行表示新节点，用 id 哈希补位
+    返回 (n, 2) 坐标
+    """
+    n = len(ids)
+    if n == 0:
+        return np.zeros((0, 2))
+
+    side = np.sqrt(n)
+    pos = _hashed_positions(ids) * side
+    warm = init is not None and not np.isnan(init).all()
+    if warm:
+        known = ~np.isnan(init).any(axis=1)
+        pos[known] = init[known]
+    if iterations is None:
+        if warm:
+            iterations = WARM_ITERATIONS
+        elif n > LARGE_GRAPH_NODES:
+            iterations = LARGE_ITERATIONS
+        else:
+            iterations = ITERATIONS
+
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    keep = src != dst
+    src, dst = src[keep], dst[keep]
+
+    k = 1.0
+    k2 = k * k
+    repulsion = _exact_repulsion if n <= EXACT_REPULSION_LIMIT else _grid_repulsion
+    t0 = (0.02 if warm else 0.1) * side
+
+    for i in range(iterations):
+        # 线性降温
+        temperature = t0 * (1.0 - i / iterations)
+        disp = repulsion(pos, k2)
+
+        # 引力 d^2 / k，沿边方向
+        delta = pos[src] - pos[dst]
+        dist = np.sqrt((delta**2).sum(axis=1)) + 1e-9
+        pull = delta * (dist / k)[:, None]
+        for axis in (0, 1):
+            disp[:, axis] -= np.bincount(src, weights=pull[:, axis], minlength=n)
+            disp[:, axis] += np.bincount(dst, weights=pull[:, axis], minlength=n)
+
+        # 向中心的弱引力，防止不连通分量飘远
+        disp -= GRAVITY * pos
+
+        length = np.sqrt((disp**2).sum(axis=1)) + 1e-9
+        step = np.minimum(length, temperature)
+        pos += disp * (step / length)[:, None]
+
+    return pos - pos.mean(axis=0)
+
+
+def apply_layout(payload, previous=None):
+    """
+    给 payload 的每个节点写上 x / y；previous 是上一版本同一视图的 payload，
+    存在时用其中同 id 节点的坐标热启动，版本之间的布局不会整体跳变
+    """
+    start = time.perf_counter()
+    nodes = payload["nodes"]
+    if len(nodes) > LAYOUT_MAX_NODES:
+        logger.info("layout skipped: %d nodes", len(nodes))
+        return payload
+
+    ids = np.asarray([node["id"] for node in nodes], dtype=np.int64)
+    id2idx = {nid: i for i, nid in enumerate(ids.tolist())}
+
+    src, dst = [], []
+    for link in payload["links"]:
+        s = id2idx.get(link["source"])
+        t = id2idx.get(link["target"])
+        if s is not None and t is not None:
+            src.append(s)
+            dst.append(t)
+
+    init = None
+    if previous is not None:
+        old = {
+            node["id"]: (node["x"], node["y"])
+            for node in previous["nodes"]
+            if "x" in node
+        }
+        if old:
+            init = np.full((len(nodes), 2), np.nan)
+            for i, nid in enumerate(ids.tolist()):
+                if nid in old:
+                    init[i] = old[nid]
+            init /= OUTPUT_SCALE
+
+    pos = force_layout(ids, src, dst, init=init) * OUTPUT_SCALE
+    for node, (x, y) in zip(nodes, pos.round(1).tolist()):
+        node["x"] = x
+        node["y"] = y
+
+    logger.info(
+        "layout: %d nodes, %d links, %.2fs (warm=%s)",
+        len(nodes),
+        len(src),
+        time.perf_counter() - start,
+        init is not None,
+    )
+    return payload
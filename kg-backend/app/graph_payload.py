@@ -0,0 +1,76 @@
+import json
+from .constants import ATTRIBUTE_RELATIONS, DERIVED_PROPERTIES
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+# 不下发给前端的节点属性：name 单独成字段；中心性、聚类、相似角色等派生属性
+# 只给后端排序 / 推荐用，不该出现在快照和悬浮卡片里
+HIDDEN_PROPERTIES = {"name", *DERIVED_PROPERTIES}
+
+
+def node_to_json(nid, name, label, props):
+    # 过滤掉 name 等内部属性，保留其它属性（包括 ATTRIBUTE_RELATIONS）
+    return {
+        "id": nid,
+        "name": name,
+        "group": label,
+        "properties": {k: v for k, v in props.items() if k not in HIDDEN_PROPERTIES},
+    }
+
+
+def build_graph_payload(node_records, edge_records):
+    """
+    组装前端力导图需要的 {"nodes": [...], "links": [...]}：
+    - node_records: 可迭代的 (id, name, label, props)
+    - edge_records: 可迭代的 (source, target, type, props)
+    节点按 id 建索引，节点、边各遍历一遍；属性边直接按 id 写回源节点
+    """
+    id2node = {}
+    for nid, name, label, props in node_records:
+        if nid not in id2node:
+            id2node[nid] = node_to_json(nid, name, label, props)
+
+    links = []
+    for source_id, target_id, rel_type, rel_props in edge_records:
+        if rel_type in ATTRIBUTE_RELATIONS:
+            node = id2node.get(source_id)
+            if node is not None:
+                node["properties"][rel_type] = rel_props.get("value", target_id)
+            continue
+
+        links.append(
+            {
+                "source": source_id,
+                "target": target_id,
+                "type": rel_type,
+                "properties": rel_props,
+            }
+        )
+
+    return {"nodes": list(id2node.values()), "links": links}
+
+
+def edge_to_event(source_id, target_id, rel_type, rel_props):
+    """
+    流式输出用：属性边变成对源节点的 property 补丁，其余为 link
+    """
+    if rel_type in ATTRIBUTE_RELATIONS:
+        return {
+            "kind": "property",
+            "id": source_id,
+            "key": rel_type,
+            "value": rel_props.get("value", target_id),
+        }
+    return {
+        "kind": "link",
+        "source": source_id,
+        "target": target_id,
+        "type": rel_type,
+        "properties": rel_props,
+    }
+
+
+def ndjson_line(obj):
+    return (json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n").encode(
+        "utf-8"
+    )
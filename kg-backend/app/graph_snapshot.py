@@ -0,0 +1,190 @@
+import json
+
+from .constants import ENTITY_LABEL
+from .graph_compact import encode_compact
+from .graph_layout import apply_layout
+from .graph_payload import build_graph_payload, node_to_json, edge_to_event, ndjson_line
+from .graph_version import VersionedBuild
+
+# focus 视图取度数最高的前 N 个节点
+TOP_N = 1000
+
+VIEW_MODES = ("focus", "full")
+
+
+class Snapshot:
+    """
+    某个图版本下某个视图的物化结果：payload（节点带预计算的 x / y）、
+    序列化好的 JSON 以及 ETag；列式二进制编码在第一次被请求时生成并缓存
+    """
+
+    def __init__(self, version, view_mode, payload):
+        self.version = version
+        self.view_mode = view_mode
+        self.payload = payload
+        self.body = json.dumps(
+            payload, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        self.etag = f"g{version}-{view_mode}"
+        self._compact = None
+
+    @property
+    def compact_body(self):
+        if self._compact is None:
+            self._compact = encode_compact(self.payload)
+        return self._compact
+
+    @property
+    def compact_etag(self):
+        return f"{self.etag}-c"
+
+
+def normalize_view_mode(view_mode):
+    return "full" if view_mode == "full" else "focus"
+
+
+def _node_query(view_mode, precomputed=True):
+    if view_mode == "full":
+        # 全量模式不需要按度数排序，直接扫一遍节点
+        return f"""
+            MATCH (n:{ENTITY_LABEL})
+            RETURN id(n) AS id, n.name AS name,
+                   [l IN labels(n) WHERE l <> $entity_label][0] AS label,
+                   properties(n) AS props
+            """
+    if precomputed:
+        # 分析步骤写回的 degree 有索引，直接按索引取前 N
+        return f"""
+            MATCH (n:{ENTITY_LABEL})
+            WHERE n.degree IS NOT NULL
+            RETURN id(n) AS id, n.name AS name,
+                   [l IN labels(n) WHERE l <> $entity_label][0] AS label,
+                   properties(n) AS props
+            ORDER BY n.degree DESC
+            LIMIT $top_n
+            """
+    # 还没跑过分析步骤时，退回实时计算度数
+    return f"""
+        MATCH (n:{ENTITY_LABEL})
+        OPTIONAL MATCH (n)-[r]-()
+        WITH n, count(r) AS degree
+        WITH n, degree, [l IN labels(n) WHERE l <> $entity_label][0] AS label
+        RETURN id(n) AS id, n.name AS name, label AS label, properties(n) AS props
+        ORDER BY degree DESC
+        LIMIT $top_n
+        """
+
+
+def _run_node_query(session, view_mode, top_n):
+    params = {"top_n": top_n, "entity_label": ENTITY_LABEL}
+    if view_mode == "full":
+        return session.run(_node_query(view_mode), **params)
+    records = list(session.run(_node_query(view_mode), **params))
+    if records:
+        return records
+    return session.run(_node_query(view_mode, precomputed=False), **params)
+
+
+def _edge_query(view_mode):
+    if view_mode == "full":
+        return """
+            MATCH (a)-[r]->(b)
+            RETURN id(a) AS source, id(b) AS target, type(r) AS type, properties(r) AS props
+            """
+    return """
+        MATCH (a)-[r]->(b)
+        WHERE id(a) IN $ids AND id(b) IN $ids
+        RETURN id(a) AS source, id(b) AS target, type(r) AS type, properties(r) AS props
+        """
+
+
+def query_graph_snapshot(driver, view_mode, top_n=TOP_N):
+    """
+    从 Neo4j 查出某个视图的完整图数据（不带缓存）
+    """
+    with driver.driver.session() as session:
+        node_result = _run_node_query(session, view_mode, top_n)
+        node_records = [
+            (r["id"], r["name"], r["label"], r["props"]) for r in node_result
+        ]
+
+        edge_records = []
+        if node_records:
+            edge_result = session.run(
+                _edge_query(view_mode), ids=[rec[0] for rec in node_records]
+            )
+            edge_records = [
+                (r["source"], r["target"], r["type"], r["props"]) for r in edge_result
+            ]
+
+    return build_graph_payload(node_records, edge_records)
+
+
+def stream_graph_ndjson(driver, view_mode, top_n=TOP_N):
+    """
+    流式版本：直接从 Neo4j 结果游标逐行产出 NDJSON，先节点后边。
+    全量模式下不在内存里攒节点/边；属性边以 property 行的形式补到已发出的节点上
+    """
+    with driver.driver.session() as session:
+        ids = []
+        node_result = _run_node_query(session, view_mode, top_n)
+        for r in node_result:
+            if view_mode != "full":
+                ids.append(r["id"])
+            yield ndjson_line(
+                {
+                    "kind": "node",
+                    **node_to_json(r["id"], r["name"], r["label"], r["props"]),
+                }
+            )
+
+        if view_mode == "full" or ids:
+            for r in session.run(_edge_query(view_mode), ids=ids):
+                yield ndjson_line(
+                    edge_to_event(r["source"], r["target"], r["type"], r["props"])
+                )
+
+    yield ndjson_line({"kind": "end"})
+
+
+class SnapshotCache:
+    """
+    每个图版本、每个视图只物化一次快照（payload + 布局坐标 + 序列化好的 JSON + ETag），
+    之后的请求直接返回。版本号变化后在后台线程查询 + 布局（以上一版本的坐标热启动），
+    完成前继续返回旧快照。第一次构建同样在后台进行（全图布局可能要几十秒），
+    就绪前 get 返回 None，由调用方回 503 + Retry-After；进程启动时会先预热 focus 视图
+    """
+
+    def __init__(self, driver):
+        self._driver = driver
+        self._builds = {
+            m: VersionedBuild(
+                f"{m} snapshot",
+                lambda version, m=m: self._build(m, version),
+                background=True,
+            )
+            for m in VIEW_MODES
+        }
+
+    def _build(self, view_mode, version):
+        previous = self._builds[view_mode].peek()
+        payload = apply_layout(
+            query_graph_snapshot(self._driver, view_mode),
+            previous=previous.payload if previous is not None else None,
+        )
+        return Snapshot(version, view_mode, payload)
+
+    def get(self, view_mode, version):
+        """
+        返回当前可用的快照（可能是上一版本的）；还没有构建好时返回 None，并在后台开始构建
+        """
+        return self._builds[view_mode].get(version)
+
+    def warm(self, version):
+        """
+        启动时和导入后由管理接口调用（只在后台开始构建，不阻塞）：
+        focus 视图总是预热，full 视图只在已经被请求过时才重建
+        """
+        for view_mode, build in self._builds.items():
+            if view_mode == "focus" or build.peek() is not None:
+                build.get(version)
@@ -0,0 +1,137 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 多久去 Neo4j 确认一次图版本（秒）；期间所有请求直接用缓存的版本号
+VERSION_TTL = 30
+
+# 某个版本构建失败后，至少隔多久（秒）才对同一版本重试；版本号变化时立即重试
+RETRY_COOLDOWN = 60
+
+
+class GraphVersion:
+    """
+    进程内的图版本号：导入脚本每次导入后在 Neo4j 中把版本 +1，
+    这里按 TTL 懒刷新，稳态下绝大多数请求不访问数据库。
+    各类进程内缓存（快照、实体详情、索引……）都以版本号为失效依据
+    """
+
+    def __init__(self, driver, ttl=VERSION_TTL):
+        self._driver = driver
+        self._ttl = ttl
+        self._value = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        if self._value is not None and time.monotonic() - self._checked_at < self._ttl:
+            return self._value
+
+        with self._lock:
+            if (
+                self._value is not None
+                and time.monotonic() - self._checked_at < self._ttl
+            ):
+                return self._value
+            return self._fetch()
+
+    def refresh(self):
+        """
+        强制立即重新读取（导入完成后由管理接口触发）
+        """
+        with self._lock:
+            return self._fetch()
+
+    def _fetch(self):
+        try:
+            value = self._driver.get_graph_version()
+        except Exception as e:
+            # 数据库暂时不可用时继续使用旧版本，而不是让所有缓存失效
+            if self._value is None:
+                raise
+            logger.warning("graph version check failed, keep %s: %s", self._value, e)
+            value = self._value
+
+        if value != self._value:
+            logger.info("graph version %s -> %s", self._value, value)
+        self._value = value
+        self._checked_at = time.monotonic()
+        return value
+
+
+class VersionedBuild:
+    """
+    按图版本构建的进程内只读结构（路径副本、搜索索引……）：
+    第一次请求时同步构建；版本变化后在后台线程重建，完成前继续用旧的服务。
+    构建耗时长、不能卡住请求线程的（如带布局的全图快照）传 background=True，
+    第一次也放到后台构建，就绪前 get 返回 None。
+    build(version) 返回的对象需带 version 属性；构建失败时 get 返回旧对象或 None，
+    同一版本在 retry_cooldown 秒内不再重试，避免故障期间每个请求都触发一次完整构建
+    """
+
+    def __init__(self, name, build, retry_cooldown=RETRY_COOLDOWN, background=False):
+        self._name = name
+        self._build = build
+        self._retry_cooldown = retry_cooldown
+        self._background = background
+        self._value = None
+        self._building = None
+        # (版本, 失败时刻)：最近一次失败的构建
+        self._failed = None
+        self._lock = threading.Lock()
+
+    def peek(self):
+        """
+        当前在服务的对象（可能是旧版本的），不触发构建
+        """
+        return self._value
+
+    def _backing_off(self, version):
+        failed = self._failed
+        return (
+            failed is not None
+            and failed[0] == version
+            and time.monotonic() - failed[1] < self._retry_cooldown
+        )
+
+    def get(self, version):
+        value = self._value
+        if value is not None and value.version == version:
+            return value
+        if self._backing_off(version):
+            return value
+
+        if value is None and not self._background:
+            with self._lock:
+                if self._value is None and not self._backing_off(version):
+                    try:
+                        self._value = self._build(version)
+                        self._failed = None
+                    except Exception as e:
+                        logger.warning("%s build failed: %s", self._name, e)
+                        self._failed = (version, time.monotonic())
+                return self._value
+
+        with self._lock:
+            if self._building != version and not self._backing_off(version):
+                self._building = version
+                threading.Thread(
+                    target=self._rebuild, args=(version,), daemon=True
+                ).start()
+        return value
+
+    def _rebuild(self, version):
+        try:
+            value = self._build(version)
+        except Exception as e:
+            logger.warning("%s rebuild v%s failed: %s", self._name, version, e)
+            self._failed = (version, time.monotonic())
+        else:
+            self._value = value
+            self._failed = None
+        finally:
+            with self._lock:
+                if self._building == version:
+                    self._building = None
@@ -0,0 +1,117 @@
+import os
+import json
+import hashlib
+from collections import Counter
+
+DEFAULT_LEDGER_PATH = "app/artifacts/ingest_ledger.json"
+
+
+def triple_key(triple: dict):
+    """
+    三元组的身份：(head_type, head, relation, tail_type, tail)
+    source / raw 等溯源字段不参与比较
+    """
+    return (
+        triple["head_type"],
+        triple["head"],
+        triple["relation"],
+        triple["tail_type"],
+        triple["tail"],
+    )
+
+
+def key_to_triple(key):
+    head_type, head, relation, tail_type, tail = key
+    return {
+        "head_type": head_type,
+        "head": head,
+        "relation": relation,
+        "tail_type": tail_type,
+        "tail": tail,
+    }
+
+
+def content_hash(keys):
+    payload = json.dumps(sorted(keys), ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class IngestLedger:
+    """
+    增量导入的本地台账：
+    按 (source 文件, work) 记录上次导入的三元组集合及其内容哈希，
+    并对全部三元组做引用计数——同一条三元组可能来自多个作品/文件，
+    只有最后一个引用消失时才真正从图里删除
+    """
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH):
+        self.path = path
+        # source -> work -> {"hash": str, "triples": [[...], ...]}
+        self.sources = {}
+        self.refcount = Counter()
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.sources = json.load(f).get("sources", {})
+
+        for works in self.sources.values():
+            for entry in works.values():
+                self.refcount.update(tuple(k) for k in entry["triples"])
+
+    def works(self, source):
+        return list(self.sources.get(source, {}).keys())
+
+    def diff(self, source, work, triples):
+        """
+        和台账比较，返回 (added_keys, removed_keys, digest)；内容未变返回 None
+        """
+        keys = {triple_key(t) for t in triples}
+        digest = content_hash(keys)
+
+        entry = self.sources.get(source, {}).get(work)
+        if entry and entry["hash"] == digest:
+            return None
+
+        old = {tuple(k) for k in entry["triples"]} if entry else set()
+        return keys - old, old - keys, digest
+
+    def update(self, source, work, added, removed, digest):
+        """
+        记录一个作品的新状态；返回引用计数归零、需要从图中删除的三元组
+        """
+        works = self.sources.setdefault(source, {})
+        old = {tuple(k) for k in works[work]["triples"]} if work in works else set()
+        keys = (old - removed) | added
+
+        self.refcount.update(added)
+        dropped = []
+        for k in removed:
+            self.refcount[k] -= 1
+            if self.refcount[k] <= 0:
+                del self.refcount[k]
+                dropped.append(k)
+
+        works[work] = {"hash": digest, "triples": sorted(list(k) for k in keys)}
+        return dropped
+
+    def forget(self, source, work):
+        """
+        作品从源文件中整体消失
+        """
+        entry = self.sources.get(source, {}).get(work)
+        if not entry:
+            return []
+        removed = {tuple(k) for k in entry["triples"]}
+        dropped = self.update(source, work, set(), removed, content_hash([]))
+        del self.sources[source][work]
+        return dropped
+
+    def save(self):
+        """
+        先写临时文件再替换，避免中途失败留下半个台账
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"sources": self.sources}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
@@ -1,8 +1,29 @@
 import os, json
+import time
+import random
+import zlib
+import queue
+import logging
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from tqdm.auto import tqdm
 from dotenv import load_dotenv
 from neo4j import GraphDatabase
-from .constants import ATTRIBUTE_RELATIONS
+from neo4j.exceptions import TransientError
+from .constants import (
+    ATTRIBUTE_RELATIONS,
+    RELATION_RELATIONS,
+    ENTITY_LABEL,
+    GRAPH_META_LABEL,
+    DERIVED_PROPERTIES,
+)
+from .graph_payload import node_to_json
+from .ingest_ledger import IngestLedger, DEFAULT_LEDGER_PATH, key_to_triple
+from .triple_reader import iter_triples, iter_works
+from .graph_analytics import run_analytics
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 # NEO4J_URI = os.getenv("NEO4J_URI")
@@ -12,6 +33,14 @@ NEO4J_URI = "bolt://10.176.40.144:7688"
 NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = "anime123"
 
+# UNWIND 批量写入时，每个事务提交的行数
+DEFAULT_BATCH_SIZE = 1000
+
+# 并行导入的线程数，以及死锁等瞬时错误的重试参数
+DEFAULT_WORKERS = 4
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 0.2
+
 
 class Neo4jDriver:
     def __init__(self, uri=NEO4J_URI, user=NEO4J_USER, password=NEO4J_PASSWORD):
@@ -20,6 +49,29 @@ class Neo4jDriver:
     def close(self):
         self.driver.close()
 
+    # ===============================
+    # 图版本：每次导入后 +1，后端各类缓存据此失效
+    # ===============================
+
+    def get_graph_version(self):
+        with self.driver.session() as session:
+            record = session.run(
+                f"MATCH (m:{GRAPH_META_LABEL} {{key: 'graph'}}) RETURN m.version AS version"
+            ).single()
+            return record["version"] if record else 0
+
+    def bump_graph_version(self):
+        with self.driver.session() as session:
+            record = session.run(
+                f"""
+                MERGE (m:{GRAPH_META_LABEL} {{key: 'graph'}})
+                SET m.version = coalesce(m.version, 0) + 1, m.updated_at = timestamp()
+                RETURN m.version AS version
+                """
+            ).single()
+        logger.info("graph version -> %s", record["version"])
+        return record["version"]
+
     def get_character(self, name):
         with self.driver.session() as session:
             result = session.run(
@@ -32,12 +84,51 @@ class Neo4jDriver:
                 return {"name": record["name"], "description": record["description"]}
             return None
 
+    def get_entities(self, label, names):
+        """
+        按 (label, name) 批量取实体详情，一次查询；返回 {name: node_json}，查不到的不出现。
+        label 会拼进 Cypher，调用方需保证它是 RELATION_RELATIONS 之一
+        """
+        with self.driver.session() as session:
+            return {
+                r["name"]: node_to_json(r["id"], r["name"], label, r["props"])
+                for r in session.run(
+                    f"""
+                    MATCH (n:{label}) WHERE n.name IN $names
+                    RETURN id(n) AS id, n.name AS name, properties(n) AS props
+                    """,
+                    names=list(names),
+                )
+            }
+
+    def get_node(self, node_id):
+        """
+        按 Neo4j 节点 id 取详情（name / label / 全部属性）
+        """
+        with self.driver.session() as session:
+            record = session.run(
+                f"""
+                MATCH (n:{ENTITY_LABEL}) WHERE id(n) = $id
+                RETURN id(n) AS id, n.name AS name,
+                       [l IN labels(n) WHERE l <> $entity_label][0] AS label,
+                       properties(n) AS props
+                """,
+                id=node_id,
+                entity_label=ENTITY_LABEL,
+            ).single()
+            if record:
+                return node_to_json(
+                    record["id"], record["name"], record["label"], record["props"]
+                )
+            return None
+
     def search_characters(self, keyword, limit=10):
         with self.driver.session() as session:
             result = session.run(
                 "MATCH (c:Character) "
                 "WHERE c.name CONTAINS $keyword "
                 "RETURN c.name AS name, c.description AS description "
+                "ORDER BY coalesce(c.pagerank, 0) DESC "
                 "LIMIT $limit",
                 keyword=keyword,
                 limit=limit,
@@ -46,81 +137,520 @@ class Neo4jDriver:
                 {"name": r["name"], "description": r["description"]} for r in result
             ]
 
-    def _insert_triple_tx(self, tx, triple: dict):
+    def ensure_schema(self, backfill=True):
         """
-        在同一个 transaction 中插入单条三元组
+        幂等地创建 schema（可重复执行）：
+        - 六类实体 label 的 name 唯一约束（自带索引，MERGE / 锚点查找走 index seek）
+        - 共享 :Entity label 上的 name 索引，服务无 label 的 {name:$name} 查找
+        - backfill=True 时给存量实体节点补打 :Entity label 并等待索引建好
+          （要扫全图，由导入脚本 / --schema-only 执行；后端启动时只建约束索引）
+        返回创建结果的报告
         """
-        head = triple["head"]
-        tail = triple["tail"]
-        relation = triple["relation"]
-        head_label = triple["head_type"]
-        tail_label = triple["tail_type"]
+        report = {"constraints": {}, "indexes": {}, "entity_labeled": 0}
 
-        # 先保证 head 节点存在
-        tx.run(
-            f"MERGE (h:{head_label} {{name: $head}})",
-            head=head,
-        )
+        with self.driver.session() as session:
+            for label in sorted(RELATION_RELATIONS):
+                name = f"{label.lower()}_name_unique"
+                summary = session.run(
+                    f"CREATE CONSTRAINT {name} IF NOT EXISTS "
+                    f"FOR (n:{label}) REQUIRE n.name IS UNIQUE"
+                ).consume()
+                report["constraints"][name] = (
+                    "created" if summary.counters.constraints_added else "exists"
+                )
+
+            summary = session.run(
+                f"CREATE INDEX entity_name IF NOT EXISTS "
+                f"FOR (n:{ENTITY_LABEL}) ON (n.name)"
+            ).consume()
+            report["indexes"]["entity_name"] = (
+                "created" if summary.counters.indexes_added else "exists"
+            )
+
+            # 导入后分析步骤写回的中心性 / 聚类属性，focus 视图、搜索、分层浏览按它们查询
+            for prop in ["degree", "pagerank", "cluster"]:
+                name = f"entity_{prop}"
+                summary = session.run(
+                    f"CREATE INDEX {name} IF NOT EXISTS "
+                    f"FOR (n:{ENTITY_LABEL}) ON (n.{prop})"
+                ).consume()
+                report["indexes"][name] = (
+                    "created" if summary.counters.indexes_added else "exists"
+                )
+
+            if not backfill:
+                logger.info("schema bootstrap: %s", report)
+                return report
 
-        # ===== 情况 1：tail 是属性 =====
-        relation_safe = f"`{relation}`"
-        if tail_label in ATTRIBUTE_RELATIONS:
-            tx.run(
+            # 存量数据补 label，分批提交避免一个巨型事务
+            summary = session.run(
                 f"""
-                MATCH (h:{head_label} {{name: $head}})
-                SET h.{relation_safe} = coalesce(h.{relation_safe}, []) + $value
+                MATCH (n)
+                WHERE NOT n:{ENTITY_LABEL} AND any(l IN labels(n) WHERE l IN $labels)
+                CALL {{ WITH n SET n:{ENTITY_LABEL} }} IN TRANSACTIONS OF 10000 ROWS
                 """,
-                head=head,
-                value=tail,
+                labels=sorted(RELATION_RELATIONS),
+            ).consume()
+            report["entity_labeled"] = summary.counters.labels_added
+
+            session.run("CALL db.awaitIndexes(300)").consume()
+
+        logger.info("schema bootstrap: %s", report)
+        return report
+
+    def _write_batch(self, session, key, rows):
+        """
+        把同一分组的一批行作为一个事务提交
+        """
+        cypher = _build_batch_cypher(key)
+        if key[3]:
+            rows = _merge_attribute_rows(rows)
+        session.execute_write(_run_unwind, cypher, rows)
+
+    def insert_triples(self, triples, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        批量插入三元组：
+        按 (head_label, relation, tail_label, 是否属性) 分组，
+        每组用一条参数化的 UNWIND $rows 语句写入，每 batch_size 行提交一次事务
+        """
+        with self.driver.session() as session:
+            for key, rows in _iter_group_batches(tqdm(triples), batch_size):
+                self._write_batch(session, key, rows)
+
+        self.bump_graph_version()
+
+    def _remove_triples(self, session, triples, batch_size):
+        """
+        按分组删除三元组：关系边直接 DELETE，属性值从数组中剔除；
+        删完后清理既无关系也无属性的孤立节点：
+        name 和分析步骤写回的派生属性不算，属性值被删空的数组也不算
+        """
+        orphans = defaultdict(set)
+        for key, rows in _iter_group_batches(triples, batch_size):
+            if key[3]:
+                rows = _merge_attribute_rows(rows)
+            else:
+                orphans[key[2]].update(r["tail"] for r in rows)
+            orphans[key[0]].update(r["head"] for r in rows)
+            session.execute_write(_run_unwind, _build_remove_cypher(key), rows)
+
+        for label, names in orphans.items():
+            session.execute_write(
+                _run_unwind,
+                f"""
+                UNWIND $rows AS name
+                MATCH (n:{label} {{name: name}})
+                WHERE NOT (n)--()
+                  AND all(k IN keys(n) WHERE k IN $derived OR n[k] = [])
+                DELETE n
+                """,
+                sorted(names),
+                derived=["name", *sorted(DERIVED_PROPERTIES)],
+            )
+
+    def insert_triples_incremental(
+        self,
+        work_triples,
+        ledger,
+        source,
+        batch_size=DEFAULT_BATCH_SIZE,
+        prune=False,
+    ):
+        """
+        幂等增量导入：
+        work_triples 为 (work, [triple, ...]) 的可迭代对象；
+        和台账里每个作品的内容哈希比较，只对有变化的作品应用新增 / 删除的三元组。
+        属性数组按集合语义维护，重复导入不会产生重复值。
+        prune=True 时，台账中有、本次输入里没有的作品视为整体删除
+        """
+        stats = {"works": 0, "changed": 0, "added": 0, "removed": 0}
+        seen = set()
+        pending_add, pending_remove = [], []
+
+        def _flush(session):
+            # 先删后加：同一批里被别的作品重新引入的三元组最终仍然存在
+            if pending_remove:
+                self._remove_triples(session, pending_remove, batch_size)
+            for key, rows in _iter_group_batches(pending_add, batch_size):
+                self._write_batch(session, key, rows)
+            pending_add.clear()
+            pending_remove.clear()
+
+        with self.driver.session() as session:
+            for work, triples in tqdm(work_triples):
+                seen.add(work)
+                stats["works"] += 1
+                change = ledger.diff(source, work, triples)
+                if change is None:
+                    continue
+
+                added, removed, digest = change
+                dropped = ledger.update(source, work, added, removed, digest)
+                pending_add.extend(key_to_triple(k) for k in added)
+                pending_remove.extend(key_to_triple(k) for k in dropped)
+                stats["changed"] += 1
+                stats["added"] += len(added)
+                stats["removed"] += len(dropped)
+
+                if len(pending_add) + len(pending_remove) >= batch_size:
+                    _flush(session)
+
+            if prune:
+                for work in ledger.works(source):
+                    if work not in seen:
+                        dropped = ledger.forget(source, work)
+                        pending_remove.extend(key_to_triple(k) for k in dropped)
+                        stats["changed"] += 1
+                        stats["removed"] += len(dropped)
+
+            _flush(session)
+
+        # 图写入全部成功后才落盘台账；中途失败重跑也是幂等的
+        ledger.save()
+        if stats["changed"]:
+            self.bump_graph_version()
+        logger.info("incremental ingest (%s): %s", source, stats)
+        return stats
+
+    def _write_with_retry(self, session, cypher, rows):
+        """
+        显式事务写入一批；遇到死锁等瞬时错误按指数退避 + 抖动重试
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                with session.begin_transaction() as tx:
+                    _run_unwind(tx, cypher, rows)
+                    tx.commit()
+                return
+            except TransientError as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = RETRY_BASE_DELAY * (2**attempt) * (1 + random.random())
+                logger.warning(
+                    "transient error (%s), retry %d/%d in %.2fs",
+                    e.code,
+                    attempt + 1,
+                    MAX_RETRIES,
+                    delay,
+                )
+                time.sleep(delay)
+
+    def _merge_label_nodes(self, label, names, batch_size):
+        cypher = f"""
+        UNWIND $rows AS name
+        MERGE (n:{label} {{name: name}})
+        ON CREATE SET n:{ENTITY_LABEL}
+        """
+        with self.driver.session() as session:
+            for i in range(0, len(names), batch_size):
+                self._write_with_retry(session, cypher, names[i : i + batch_size])
+
+    def _write_partition(self, triples, batch_size):
+        with self.driver.session() as session:
+            for key, rows in _iter_group_batches(triples, batch_size):
+                if key[3]:
+                    rows = _merge_attribute_rows(rows)
+                cypher = _build_batch_cypher(key, merge_nodes=False)
+                self._write_with_retry(session, cypher, rows)
+
+    def insert_triples_parallel(
+        self, triples, workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE
+    ):
+        """
+        并行分区导入：
+        ① 节点阶段：按 label 分区，每个 label 的节点 MERGE 交给线程池中的一个 worker
+        ② 关系阶段：按 head 节点哈希分区，同一 head 的关系/属性只由一个 worker 写，
+           并发事务之间很少争抢同一把锁；死锁等瞬时错误退避重试
+        返回每个阶段的耗时与吞吐 (triples/s)
+
+        triples 可以是列表，也可以是每次调用都返回新迭代器的函数
+        （如 lambda: iter_triples(path)），后者两个阶段各流式读一遍，内存不随语料增长
+        """
+        if callable(triples):
+            source = triples
+        else:
+            triples = list(triples)
+            source = lambda: iter(triples)
+        stats = {}
+
+        # ===== ① 节点阶段 =====
+        start = time.perf_counter()
+        n_triples = 0
+        label2names = defaultdict(dict)  # dict 当有序 set 用
+        for t in source():
+            n_triples += 1
+            label2names[t["head_type"]][t["head"]] = None
+            if t["tail_type"] not in ATTRIBUTE_RELATIONS:
+                label2names[t["tail_type"]][t["tail"]] = None
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(self._merge_label_nodes, label, list(names), batch_size)
+                for label, names in label2names.items()
+            ]
+            for fut in futures:
+                fut.result()
+        stats["nodes"] = _phase_stats(
+            n_triples,
+            time.perf_counter() - start,
+            nodes=sum(len(v) for v in label2names.values()),
+        )
+        label2names.clear()
+
+        # ===== ② 关系阶段 =====
+        # 主线程边读边按 head 分发到各 worker 的有界队列
+        start = time.perf_counter()
+        queues = [queue.Queue(maxsize=batch_size * 2) for _ in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(self._write_partition, _drain_queue(q), batch_size)
+                for q in queues
+            ]
+            try:
+                for t in source():
+                    pid = zlib.crc32(f"{t['head_type']}\t{t['head']}".encode("utf-8"))
+                    _put_or_raise(queues[pid % workers], t, futures[pid % workers])
+            finally:
+                # 无论成功与否都给仍在运行的 worker 发结束标记，避免线程池关闭时卡死
+                for q, fut in zip(queues, futures):
+                    if not fut.done():
+                        try:
+                            _put_or_raise(q, None, fut)
+                        except Exception:
+                            pass
+            for fut in futures:
+                fut.result()
+        stats["relationships"] = _phase_stats(n_triples, time.perf_counter() - start)
+
+        for phase, st in stats.items():
+            logger.info(
+                "ingest phase %s: %d triples in %.2fs (%.0f triples/s)",
+                phase,
+                st["triples"],
+                st["seconds"],
+                st["triples_per_s"],
             )
+
+        self.bump_graph_version()
+        return stats
+
+
+def _drain_queue(q):
+    # None 作为结束标记
+    while True:
+        item = q.get()
+        if item is None:
+            return
+        yield item
+
+
+def _put_or_raise(q, item, future):
+    """
+    worker 异常退出后队列不会再被消费，这里及时把异常抛给主线程而不是一直阻塞
+    """
+    while True:
+        try:
+            q.put(item, timeout=1)
             return
+        except queue.Full:
+            if future.done():
+                future.result()
+                raise RuntimeError("ingest worker exited early")
+
 
-        # ===== 情况 2：tail 是实体 =====
-        tx.run(
-            f"""
-            MATCH (h:{head_label} {{name: $head}})
-            MERGE (t:{tail_label} {{name: $tail}})
+def _phase_stats(n_triples, seconds, **extra):
+    return {
+        "triples": n_triples,
+        "seconds": round(seconds, 3),
+        "triples_per_s": n_triples / seconds if seconds > 0 else 0.0,
+        **extra,
+    }
+
+
+def _triple_group_key(triple: dict):
+    """
+    分组键：(head_label, relation, tail_label, tail 是否为属性)
+    label 和关系类型不能参数化，同一组才能共用一条 Cypher
+    """
+    tail_label = triple["tail_type"]
+    return (
+        triple["head_type"],
+        triple["relation"],
+        tail_label,
+        tail_label in ATTRIBUTE_RELATIONS,
+    )
+
+
+def _triple_row(triple: dict, is_attr: bool):
+    if is_attr:
+        return {"head": triple["head"], "value": triple["tail"]}
+    return {"head": triple["head"], "tail": triple["tail"]}
+
+
+def _iter_group_batches(triples, batch_size):
+    """
+    按分组键缓冲三元组，每组攒满 batch_size 行产出一批 (key, rows)，
+    最后产出各组剩余的尾巴；内存只和分组数 × batch_size 有关
+    """
+    buffers = defaultdict(list)
+    for triple in triples:
+        key = _triple_group_key(triple)
+        buf = buffers[key]
+        buf.append(_triple_row(triple, key[3]))
+        if len(buf) >= batch_size:
+            yield key, buf
+            buffers[key] = []
+
+    for key, buf in buffers.items():
+        if buf:
+            yield key, buf
+
+
+def _merge_attribute_rows(rows):
+    """
+    同一个 head 的多个属性值合并成一行（去重、保持顺序），减少重复 SET
+    """
+    head2values = {}
+    for row in rows:
+        head2values.setdefault(row["head"], {})[row["value"]] = None
+    return [{"head": h, "values": list(v)} for h, v in head2values.items()]
+
+
+def _build_batch_cypher(key, merge_nodes=True):
+    """
+    merge_nodes=False 用于并行导入的关系阶段：节点已在节点阶段建好，只需 MATCH
+    """
+    head_label, relation, tail_label, is_attr = key
+    relation_safe = f"`{relation}`"
+
+    if not merge_nodes:
+        if is_attr:
+            return f"""
+            UNWIND $rows AS row
+            MATCH (h:{head_label} {{name: row.head}})
+            SET h.{relation_safe} = coalesce(h.{relation_safe}, []) + [
+                v IN row.values WHERE NOT v IN coalesce(h.{relation_safe}, [])
+            ]
+            """
+        return f"""
+            UNWIND $rows AS row
+            MATCH (h:{head_label} {{name: row.head}})
+            MATCH (t:{tail_label} {{name: row.tail}})
             MERGE (h)-[r:{relation_safe}]->(t)
-            """,
-            head=head,
-            tail=tail,
-        )
+            """
 
-    def insert_triples(self, triples: list[dict]):
+    # ===== 情况 1：tail 是属性 =====
+    if is_attr:
+        return f"""
+        UNWIND $rows AS row
+        MERGE (h:{head_label} {{name: row.head}})
+        ON CREATE SET h:{ENTITY_LABEL}
+        SET h.{relation_safe} = coalesce(h.{relation_safe}, []) + [
+            v IN row.values WHERE NOT v IN coalesce(h.{relation_safe}, [])
+        ]
         """
-        批量插入三元组（单事务）
+
+    # ===== 情况 2：tail 是实体 =====
+    return f"""
+        UNWIND $rows AS row
+        MERGE (h:{head_label} {{name: row.head}})
+        ON CREATE SET h:{ENTITY_LABEL}
+        MERGE (t:{tail_label} {{name: row.tail}})
+        ON CREATE SET t:{ENTITY_LABEL}
+        MERGE (h)-[r:{relation_safe}]->(t)
         """
 
-        def _tx_func(tx):
-            for triple in tqdm(triples):
-                self._insert_triple_tx(tx, triple)
 
-        with self.driver.session() as session:
-            session.execute_write(_tx_func)
+def _build_remove_cypher(key):
+    head_label, relation, tail_label, is_attr = key
+    relation_safe = f"`{relation}`"
+
+    if is_attr:
+        return f"""
+        UNWIND $rows AS row
+        MATCH (h:{head_label} {{name: row.head}})
+        SET h.{relation_safe} = [
+            v IN coalesce(h.{relation_safe}, []) WHERE NOT v IN row.values
+        ]
+        """
+
+    return f"""
+        UNWIND $rows AS row
+        MATCH (h:{head_label} {{name: row.head}})-[r:{relation_safe}]->(t:{tail_label} {{name: row.tail}})
+        DELETE r
+        """
+
+
+def _run_unwind(tx, cypher, rows, **params):
+    tx.run(cypher, rows=rows, **params).consume()
 
 
 if __name__ == "__main__":
-    driver = Neo4jDriver()
+    parser = argparse.ArgumentParser(description="导入三元组到 Neo4j")
+    parser.add_argument(
+        "--anime", default="/home/zhengxiang/Anime-Character-KG/data/triples_anime.json"
+    )
+    parser.add_argument(
+        "--role", default="/home/zhengxiang/Anime-Character-KG/data/triples_role.json"
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--parallel", action="store_true", help="并行分区导入")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument(
+        "--incremental", action="store_true", help="按台账只导入有变化的作品"
+    )
+    parser.add_argument("--ledger", default=DEFAULT_LEDGER_PATH)
+    parser.add_argument(
+        "--prune", action="store_true", help="增量模式下删除源文件中已消失的作品"
+    )
+    parser.add_argument(
+        "--skip-analytics", action="store_true", help="导入后不计算中心性"
+    )
+    parser.add_argument(
+        "--schema-only",
+        action="store_true",
+        help="只建约束索引并给存量节点补 :Entity label，不导入",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
 
-    anime_path = "/home/zhengxiang/Anime-Character-KG/data/triples_anime.json"
-    role_path = "/home/zhengxiang/Anime-Character-KG/data/triples_role.json"
+    driver = Neo4jDriver()
+    report = driver.ensure_schema()
 
-    with open(anime_path, "r", encoding="utf-8") as f:
-        anime_data = json.load(f)
+    if args.schema_only:
+        if report["entity_labeled"]:
+            # 补了 label，让在运行的后端丢掉按旧数据缓存的快照和索引
+            driver.bump_graph_version()
+        driver.close()
+        raise SystemExit(0)
 
-    anime_triplets = []
-    for triples in anime_data.values():
-        anime_triplets.extend(triples)
+    ledger = IngestLedger(args.ledger) if args.incremental else None
 
-    with open(role_path, "r", encoding="utf-8") as f:
-        role_data = json.load(f)
+    for path in [args.anime, args.role]:
+        # 三元组文件流式读取（.json / .jsonl），不整体载入内存
+        if ledger is not None:
+            driver.insert_triples_incremental(
+                iter_works(path),
+                ledger,
+                source=os.path.basename(path),
+                batch_size=args.batch_size,
+                prune=args.prune,
+            )
+        elif args.parallel:
+            driver.insert_triples_parallel(
+                lambda: iter_triples(path),
+                workers=args.workers,
+                batch_size=args.batch_size,
+            )
+        else:
+            driver.insert_triples(iter_triples(path), batch_size=args.batch_size)
 
-    role_triplets = []
-    for triples in role_data.values():
-        role_triplets.extend(triples)
+    if not args.skip_analytics:
+        run_analytics(driver)
+        driver.bump_graph_version()
 
-    driver.insert_triples(anime_triplets)
-    driver.insert_triples(role_triplets)
+    driver.close()
 
     # # 清空数据库
     # with driver.driver.session() as session:
@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import pickle
+import shutil
+import hashlib
+import logging
+import argparse
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+
+from .ner_model import RuleNER, TFIDFAligner
+from .graph_version import VersionedBuild
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENT_DIR = "app/ent_aug"
+DEFAULT_NER_ARTIFACT_DIR = "app/artifacts/ner"
+
+# 产物格式变化时 +1，旧产物的版本号随之失配，自动改为现场构建
+ARTIFACT_FORMAT = 1
+
+# 只保留最近几个版本的产物
+KEEP_ARTIFACTS = 2
+
+# 多久检查一次词典文件是否变化（秒）；最近一次写入后至少静置多久才认为写完了
+DICTIONARY_TTL = 10
+DICTIONARY_SETTLE = 2
+
+_ARRAYS = ("matrix_data", "matrix_indices", "matrix_indptr", "idf", "offsets")
+
+
+def dictionary_version(ent_dir):
+    """
+    词典版本 = 产物格式 + ent_dir 下全部 txt（文件名和内容）的哈希
+    """
+    h = hashlib.sha1(f"format={ARTIFACT_FORMAT}".encode())
+    for file in sorted(os.listdir(ent_dir)):
+        if file.endswith(".txt"):
+            h.update(file.encode("utf-8"))
+            with open(os.path.join(ent_dir, file), "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+class DictionaryVersion:
+    """
+    ent_dir 下词典文件的版本号，按 TTL 懒检查（与 GraphVersion 同一模式）。
+    build_ent_txt.py 逐个文件重写词典，最近一次修改还不到 settle 秒时视为仍在写，继续报告旧版本。
+    TTL 到期时先比对各文件的 (mtime_ns, size)，都没变就不重新读文件算哈希
+    """
+
+    def __init__(self, ent_dir, ttl=DICTIONARY_TTL, settle=DICTIONARY_SETTLE):
+        self._ent_dir = ent_dir
+        self._ttl = ttl
+        self._settle = settle
+        self._value = None
+        # 算出 _value 时各词典文件的 (文件名, mtime_ns, size)
+        self._stamp = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        if self._value is not None and time.monotonic() - self._checked_at < self._ttl:
+            return self._value
+
+        with self._lock:
+            if (
+                self._value is not None
+                and time.monotonic() - self._checked_at < self._ttl
+            ):
+                return self._value
+            return self._fetch(settle=self._settle)
+
+    def refresh(self):
+        """
+        强制立即重新计算哈希（管理接口触发，调用方确认词典已经写完）
+        """
+        with self._lock:
+            return self._fetch(settle=0, force=True)
+
+    def _stat(self):
+        stamp = []
+        for file in sorted(os.listdir(self._ent_dir)):
+            if file.endswith(".txt"):
+                st = os.stat(os.path.join(self._ent_dir, file))
+                stamp.append((file, st.st_mtime_ns, st.st_size))
+        return tuple(stamp)
+
+    def _fetch(self, settle, force=False):
+        stamp = self._stat()
+        if self._value is not None and not force:
+            if stamp == self._stamp:
+                self._checked_at = time.monotonic()
+                return self._value
+            newest = max((mtime for _, mtime, _ in stamp), default=0)
+            if time.time_ns() - newest < settle * 1e9:
+                return self._value
+
+        value = dictionary_version(self._ent_dir)
+        if value != self._value:
+            logger.info("NER dictionary version %s -> %s", self._value, value)
+        self._value = value
+        self._stamp = stamp
+        self._checked_at = time.monotonic()
+        return value
+
+
+class NERBundle:
+    """
+    同一个词典版本的规则 NER + TF-IDF 对齐器，构建好之后只读
+    """
+
+    def __init__(self, version, rule_ner, aligner):
+        self.version = version
+        self.rule_ner = rule_ner
+        self.aligner = aligner
+
+
+def build_ner_bundle(ent_dir, version=None):
+    return NERBundle(
+        version or dictionary_version(ent_dir),
+        RuleNER(ent_dir=ent_dir),
+        TFIDFAligner(ent_dir=ent_dir),
+    )
+
+
+def write_ner_artifact(bundle, artifact_dir):
+    """
+    写到 artifact_dir/<version>/，先写临时目录再改名，读方不会看到写了一半的产物：
+        automaton.pkl     规则 NER 的自动机（pickle）
+        matrix_*.npy      对齐器的 CSR 三个数组，idf.npy / offsets.npy（均可 mmap）
+        meta.json         版本、各类型实体列表、字符词表
+    """
+    target = os.path.join(artifact_dir, bundle.version)
+    if os.path.isdir(target):
+        return target
+
+    os.makedirs(artifact_dir, exist_ok=True)
+    tmp = f"{target}.tmp-{os.getpid()}-{threading.get_ident()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    aligner = bundle.aligner
+    with open(os.path.join(tmp, "automaton.pkl"), "wb") as f:
+        pickle.dump(bundle.rule_ner.automaton, f, protocol=pickle.HIGHEST_PROTOCOL)
+    arrays = {
+        "matrix_data": aligner.matrix.data,
+        "matrix_indices": aligner.matrix.indices,
+        "matrix_indptr": aligner.matrix.indptr,
+        "idf": aligner.idf,
+        "offsets": aligner.offsets,
+    }
+    for name in _ARRAYS:
+        np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(arrays[name]))
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "format": ARTIFACT_FORMAT,
+                "version": bundle.version,
+                "shape": list(aligner.matrix.shape),
+                "type2ents": aligner.type2ents,
+                "chars": aligner.vectorizer.chars,
+            },
+            f,
+            ensure_ascii=False,
+        )
+
+    try:
+        os.replace(tmp, target)
+    except OSError:
+        # 另一个进程抢先写好了同一版本
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    versions = sorted(
+        (e for e in os.listdir(artifact_dir) if ".tmp-" not in e),
+        key=lambda e: os.path.getmtime(os.path.join(artifact_dir, e)),
+        reverse=True,
+    )
+    for old in versions[KEEP_ARTIFACTS:]:
+        shutil.rmtree(os.path.join(artifact_dir, old), ignore_errors=True)
+    return target
+
+
+def load_ner_artifact(path):
+    """
+    读取产物：数组以 mmap 只读方式打开，fork 出来的多个 worker 共享同一份页缓存
+    """
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["format"] != ARTIFACT_FORMAT:
+        raise ValueError(f"NER 产物格式 {meta['format']} 与当前 {ARTIFACT_FORMAT} 不符")
+
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in _ARRAYS
+    }
+    matrix = sp.csr_matrix(
+        (arrays["matrix_data"], arrays["matrix_indices"], arrays["matrix_indptr"]),
+        shape=tuple(meta["shape"]),
+        copy=False,
+    )
+    with open(os.path.join(path, "automaton.pkl"), "rb") as f:
+        automaton = pickle.load(f)
+
+    return NERBundle(
+        meta["version"],
+        RuleNER.from_automaton(automaton),
+        TFIDFAligner.from_arrays(
+            meta["type2ents"],
+            meta["chars"],
+            matrix,
+            arrays["idf"],
+            arrays["offsets"],
+        ),
+    )
+
+
+def load_ner(
+    ent_dir=DEFAULT_ENT_DIR, artifact_dir=DEFAULT_NER_ARTIFACT_DIR, version=None
+):
+    """
+    与 ent_dir 当前内容同版本的产物存在就直接加载；否则现场构建，并顺手写出产物供下次启动使用。
+    指定 version 时 ent_dir 必须仍是这个版本，否则报错（由调用方按新版本重来），
+    保证返回的 bundle.version 就是请求的版本
+    """
+    start = time.perf_counter()
+    current = dictionary_version(ent_dir)
+    if version is not None and current != version:
+        raise RuntimeError(f"NER dictionary is {current}, not the requested {version}")
+    version = current
+    path = os.path.join(artifact_dir, version)
+    if os.path.isdir(path):
+        try:
+            bundle = load_ner_artifact(path)
+            logger.info(
+                "NER artifact %s loaded in %.3fs", version, time.perf_counter() - start
+            )
+            return bundle
+        except Exception as e:
+            logger.warning("NER artifact %s unusable, rebuilding: %s", version, e)
+
+    bundle = build_ner_bundle(ent_dir, version)
+    if dictionary_version(ent_dir) != version:
+        # 构建期间词典又被改写，读到的可能是新旧混合的内容，不能当作 version 发布
+        raise RuntimeError(f"NER dictionary changed while building {version}")
+    try:
+        write_ner_artifact(bundle, artifact_dir)
+    except OSError as e:
+        logger.warning("NER artifact %s not written: %s", version, e)
+    logger.info("NER %s built in %.3fs", version, time.perf_counter() - start)
+    return bundle
+
+
+class NERCache(VersionedBuild):
+    """
+    进程内的 NER：import 时不做任何事，第一次用到时才加载。
+    词典版本变化后在后台线程加载 / 构建新版本，完成前继续用旧的服务，完成后整体替换；
+    调用方每次请求只取一次 get() 的返回值，同一请求内用的始终是同一个完整版本
+    """
+
+    def __init__(self, ent_dir=DEFAULT_ENT_DIR, artifact_dir=DEFAULT_NER_ARTIFACT_DIR):
+        super().__init__(
+            "NER", lambda version: load_ner(ent_dir, artifact_dir, version)
+        )
+        self.dictionary = DictionaryVersion(ent_dir)
+
+    def get(self):
+        return super().get(self.dictionary.current())
+
+    def reload(self):
+        """
+        立即重新检查词典版本；有新版本时在后台开始构建，返回 (目标版本, 当前服务中的 bundle)
+        """
+        version = self.dictionary.refresh()
+        return version, super().get(version)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="预编译 NER 词典（自动机 + TF-IDF 矩阵）"
+    )
+    parser.add_argument("--ent-dir", default=DEFAULT_ENT_DIR)
+    parser.add_argument("--out", default=DEFAULT_NER_ARTIFACT_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    bundle = build_ner_bundle(args.ent_dir)
+    print(write_ner_artifact(bundle, args.out))
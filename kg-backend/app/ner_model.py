@@ -1,7 +1,8 @@
 import os
+import re
 import ahocorasick
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import numpy as np
+import scipy.sparse as sp
 
 
 # ===============================
@@ -12,28 +13,31 @@ from sklearn.metrics.pairwise import cosine_similarity
 class RuleNER:
     """
     只负责识别【可指称实体节点】
+
+    所有实体类型共用一个 Aho-Corasick 自动机，文本只扫描一遍：
+    每个表面形式的 payload 是 (长度, ((entity_type, canonical), ...))，
+    同一个词属于多个类型时一次命中全部带出；
+    重叠的命中按区间做 leftmost-longest 消解（起点最靠左，其次最长）
     """
 
-    def __init__(self, ent_dir="data/ent_aug", min_len=2):
-        self.entity_types = [
-            "Work",
-            "Character",
-            "Person",
-            "Organization",
-            "Group",
-            "Location",
-        ]
+    entity_types = [
+        "Work",
+        "Character",
+        "Person",
+        "Organization",
+        "Group",
+        "Location",
+    ]
 
-        self.type2idx = {t: i for i, t in enumerate(self.entity_types)}
-        self.automata = [ahocorasick.Automaton() for _ in self.entity_types]
+    def __init__(self, ent_dir="data/ent_aug", min_len=2):
 
+        # surface → {entity_type: canonical}；完整实体名优先于点分割出的短名
+        surfaces = {}
         for ent_type in self.entity_types:
             path = os.path.join(ent_dir, f"{ent_type}.txt")
             if not os.path.exists(path):
                 continue
 
-            idx = self.type2idx[ent_type]
-
             with open(path, encoding="utf-8") as f:
                 for line in f:
                     ent = line.strip()
@@ -41,36 +45,54 @@ class RuleNER:
                         continue
 
                     # 1️⃣ 完整实体
-                    self.automata[idx].add_word(ent, (ent, ent))
+                    surfaces.setdefault(ent, {})[ent_type] = ent
 
                     # 2️⃣ 点分割名：蒙奇·D·路飞 → 路飞
                     if "·" in ent:
                         key = ent.split("·")[-1]
                         if len(key) >= min_len:
-                            self.automata[idx].add_word(key, (key, ent))
+                            surfaces.setdefault(key, {}).setdefault(ent_type, ent)
+
+        self.automaton = ahocorasick.Automaton()
+        for surface, by_type in surfaces.items():
+            pairs = tuple((t, by_type[t]) for t in self.entity_types if t in by_type)
+            self.automaton.add_word(surface, (len(surface), pairs))
+        if surfaces:
+            self.automaton.make_automaton()
 
-        for a in self.automata:
-            a.make_automaton()
+    @classmethod
+    def from_automaton(cls, automaton):
+        """
+        直接用预编译（反序列化）好的自动机，跳过读词典和建树
+        """
+        ner = cls.__new__(cls)
+        ner.automaton = automaton
+        return ner
 
     def find(self, text):
         """
         返回：
         [(start, end, entity_type, canonical_entity), ...]
+        按 start 升序；同一区间属于多个类型时每个类型一条
         """
-        results = []
-        used = set()
-
-        for idx, automaton in enumerate(self.automata):
-            etype = self.entity_types[idx]
-            for end, (alias, canonical) in automaton.iter(text):
-                start = end - len(alias) + 1
+        if not len(self.automaton):
+            return []
 
-                if any(i in used for i in range(start, end + 1)):
-                    continue
+        spans = [
+            (end - length + 1, end, pairs)
+            for end, (length, pairs) in self.automaton.iter(text)
+        ]
+        # leftmost-longest：按 (起点, -终点) 排序后贪心取不重叠的区间
+        spans.sort(key=lambda s: (s[0], -s[1]))
 
+        results = []
+        last_end = -1
+        for start, end, pairs in spans:
+            if start <= last_end:
+                continue
+            last_end = end
+            for etype, canonical in pairs:
                 results.append((start, end, etype, canonical))
-                for i in range(start, end + 1):
-                    used.add(i)
 
         return results
 
@@ -79,6 +101,42 @@ class RuleNER:
 # 2. TF-IDF 实体规范化 / 兜底
 # ===============================
 
+# 批量对齐 / 兜底检索时每块的条数，限制稠密相似度矩阵的大小
+ALIGN_CHUNK = 1024
+
+_WHITE_SPACES = re.compile(r"\s\s+")
+
+
+class CharVocabulary:
+    """
+    单字符计数向量化，与 CountVectorizer(analyzer="char") 逐位一致
+    （小写、连续空白压成一个空格、词表按字符排序），省掉导入 sklearn 的开销
+    """
+
+    def __init__(self, chars):
+        self.chars = list(chars)
+        self.vocabulary = {c: i for i, c in enumerate(self.chars)}
+
+    @staticmethod
+    def _analyze(doc):
+        return _WHITE_SPACES.sub(" ", doc.lower())
+
+    @classmethod
+    def fit(cls, docs):
+        return cls(sorted({c for doc in docs for c in cls._analyze(doc)}))
+
+    def transform(self, docs):
+        rows, cols = [], []
+        for i, doc in enumerate(docs):
+            for c in self._analyze(doc):
+                j = self.vocabulary.get(c)
+                if j is not None:
+                    rows.append(i)
+                    cols.append(j)
+        return sp.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(len(docs), len(self.chars))
+        )
+
 
 class TFIDFAligner:
     """
@@ -86,14 +144,19 @@ class TFIDFAligner:
     - 别名对齐
     - 模糊匹配
     - 全量兜底搜索
+
+    所有类型的实体堆叠成一个 CSR 矩阵，共享一套字符词表：
+        matrix    (实体总数 x 词表)，每行是该实体 L2 归一化的 TF-IDF 向量，再逐列乘上本类型的 IDF
+        idf       (类型数 x 词表)，各类型自己的 IDF，本类型没出现过的字符为 0
+        offsets   各类型在 matrix 中的行区间
+    查询只做一次计数向量化和一次稀疏矩阵-向量乘，再除以查询在各类型 IDF 下的模长，
+    得到的就是逐类型 TF-IDF 的余弦相似度
     """
 
     def __init__(self, ent_dir="data/ent_aug"):
-        self.type2ents = {}
-        self.type2vecs = {}
-        self.type2tfidf = {}
+        type2ents = {}
 
-        for file in os.listdir(ent_dir):
+        for file in sorted(os.listdir(ent_dir)):
             if not file.endswith(".txt"):
                 continue
 
@@ -106,67 +169,161 @@ class TFIDFAligner:
             if not ents:
                 continue
 
-            tfidf = TfidfVectorizer(analyzer="char")
-            vecs = tfidf.fit_transform(ents).toarray()
+            type2ents[ent_type] = ents
+
+        all_ents = [e for ents in type2ents.values() for e in ents]
+        vectorizer = CharVocabulary.fit(all_ents)
+        counts = vectorizer.transform(all_ents)
+        vocab = counts.shape[1]
+
+        sizes = [len(ents) for ents in type2ents.values()]
+        offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        blocks, idfs = [], []
+        for lo, hi in zip(offsets[:-1], offsets[1:]):
+            block = counts[lo:hi]
+            # 与 TfidfVectorizer 默认一致：smooth_idf，idf = ln((1 + n) / (1 + df)) + 1
+            df = np.bincount(block.indices, minlength=vocab)
+            idf = np.where(df > 0, np.log((1 + (hi - lo)) / (1 + df)) + 1.0, 0.0)
+            tfidf = block @ sp.diags(idf)
+            norm = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel())
+            tfidf = sp.diags(1.0 / np.where(norm > 0, norm, 1.0)) @ tfidf
+            blocks.append(tfidf @ sp.diags(idf))
+            idfs.append(idf)
+
+        matrix = sp.vstack(blocks).tocsr() if blocks else sp.csr_matrix((0, vocab))
+        idf = np.vstack(idfs) if idfs else np.zeros((0, vocab))
+        self._setup(type2ents, vectorizer, matrix, idf, offsets)
+
+    @classmethod
+    def from_arrays(cls, type2ents, chars, matrix, idf, offsets):
+        """
+        由预编译产物还原（matrix / idf / offsets 可以是 mmap 的只读数组）
+        """
+        aligner = cls.__new__(cls)
+        aligner._setup(type2ents, CharVocabulary(chars), matrix, idf, offsets)
+        return aligner
+
+    def _setup(self, type2ents, vectorizer, matrix, idf, offsets):
+        self.types = list(type2ents)
+        self.type2ents = type2ents
+        self.type2idx = {t: i for i, t in enumerate(self.types)}
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.idf = idf
+        self.idf_sq = np.asarray(idf) ** 2
+        self.offsets = offsets
+
+    def _inv_norms(self, q):
+        """
+        q: (m x 词表) 计数矩阵 → (m x 类型数)，查询在各类型 IDF 下模长的倒数（模长为 0 记 0）
+        """
+        norms = np.sqrt(q.multiply(q) @ self.idf_sq.T)
+        return np.where(norms > 0, 1.0 / np.where(norms > 0, norms, 1.0), 0.0)
+
+    def _similarity_matrix(self, queries):
+        """
+        (实体总数 x len(queries)) 的余弦相似度，各类型用自己的 IDF
+        """
+        q = self.vectorizer.transform(queries)
+        raw = (self.matrix @ q.T).toarray()
+        scale = np.repeat(self._inv_norms(q).T, np.diff(self.offsets), axis=0)
+        # 舍去末位浮点误差，满分并列时按类型顺序取第一个
+        return np.round(raw * scale, 12)
 
-            self.type2ents[ent_type] = ents
-            self.type2vecs[ent_type] = vecs
-            self.type2tfidf[ent_type] = tfidf
+    def _best_per_type(self, words, ent_type):
+        """
+        words 在 ent_type 内各自最相似的实体：一次向量化 + 一次稀疏矩阵乘，
+        返回 (类型内下标数组, 分数数组)
+        """
+        i = self.type2idx[ent_type]
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        q = self.vectorizer.transform(words)
+        raw = (self.matrix[lo:hi] @ q.T).toarray()
+        sims = np.round(raw * self._inv_norms(q)[:, i], 12)
+        idx = sims.argmax(axis=0)
+        return idx, sims[idx, np.arange(len(words))]
 
     def align(self, ner_results, threshold=0.5):
         """
         对规则 NER 的结果做规范化
         """
-        result = {}
-
-        for _, _, ent_type, word in ner_results:
-            if ent_type not in self.type2tfidf:
-                continue
-
-            qv = self.type2tfidf[ent_type].transform([word])
-            sims = cosine_similarity(qv, self.type2vecs[ent_type])[0]
-            idx = sims.argmax()
+        return self.align_batch([ner_results], threshold)[0]
 
-            if sims[idx] >= threshold:
-                result.setdefault(ent_type, []).append(self.type2ents[ent_type][idx])
+    def align_batch(self, batch, threshold=0.5):
+        """
+        多条查询的规则 NER 结果一起规范化：batch 为 [ner_results, ...]，
+        返回等长的 [{entity_type: [entity, ...]}, ...]。
+        所有提及按类型分组，每组（每 ALIGN_CHUNK 个）只做一次向量化和一次稀疏矩阵乘
+        """
+        by_type = {}
+        for qi, ner_results in enumerate(batch):
+            for pos, (_, _, ent_type, word) in enumerate(ner_results):
+                if ent_type in self.type2idx:
+                    by_type.setdefault(ent_type, []).append((qi, pos, word))
+
+        aligned = {}
+        for ent_type, mentions in by_type.items():
+            ents = self.type2ents[ent_type]
+            for start in range(0, len(mentions), ALIGN_CHUNK):
+                chunk = mentions[start : start + ALIGN_CHUNK]
+                idx, scores = self._best_per_type([w for _, _, w in chunk], ent_type)
+                for (qi, pos, _), j, score in zip(chunk, idx.tolist(), scores.tolist()):
+                    if score >= threshold:
+                        aligned[qi, pos] = ents[j]
 
-        return result
+        results = []
+        for qi, ner_results in enumerate(batch):
+            result = {}
+            for pos, (_, _, ent_type, _) in enumerate(ner_results):
+                if (qi, pos) in aligned:
+                    result.setdefault(ent_type, []).append(aligned[qi, pos])
+            results.append(result)
+        return results
 
     def search_best(self, query, ent_types=None, threshold=0.3):
         """
         🔥 当 NER 完全失败时的兜底：
-        在多个实体类型全集中找【全局最相似】的实体
+        在多个实体类型全集中找【全局最相似】的实体；
+        所有类型一次算完，再在各类型的行区间里取 argmax
         """
-        best_ent = None
-        best_type = None
-        best_score = 0.0
+        return self.search_best_batch([query], ent_types, threshold)[0]
 
+    def search_best_batch(self, queries, ent_types=None, threshold=0.3):
+        """
+        search_best 的批量版：每 ALIGN_CHUNK 条查询一次稀疏矩阵乘，
+        返回等长的 [(entity_type, entity) 或 (None, None), ...]
+        """
         if ent_types is None:
-            ent_types = self.type2tfidf.keys()
-
-        for ent_type in ent_types:
-            if ent_type not in self.type2tfidf:
-                continue
+            ent_types = self.types
+        ent_types = [t for t in ent_types if t in self.type2idx]
 
-            tfidf = self.type2tfidf[ent_type]
-            ents = self.type2ents[ent_type]
-            vecs = self.type2vecs[ent_type]
-
-            qv = tfidf.transform([query])
-            sims = cosine_similarity(qv, vecs)[0]
-
-            idx = sims.argmax()
-            score = sims[idx]
-
-            if score > best_score:
-                best_score = score
-                best_ent = ents[idx]
-                best_type = ent_type
-
-        if best_score >= threshold:
-            return best_type, best_ent
-
-        return None, None
+        results = []
+        for start in range(0, len(queries), ALIGN_CHUNK):
+            chunk = queries[start : start + ALIGN_CHUNK]
+            m = len(chunk)
+            best_score = np.zeros(m)
+            best_type = np.full(m, -1)
+            best_idx = np.zeros(m, dtype=np.int64)
+
+            if ent_types:
+                sims = self._similarity_matrix(chunk)
+                for k, ent_type in enumerate(ent_types):
+                    i = self.type2idx[ent_type]
+                    block = sims[self.offsets[i] : self.offsets[i + 1]]
+                    idx = block.argmax(axis=0)
+                    score = block[idx, np.arange(m)]
+                    better = score > best_score
+                    best_score[better] = score[better]
+                    best_type[better] = k
+                    best_idx[better] = idx[better]
+
+            for k, j, score in zip(best_type, best_idx, best_score):
+                if k >= 0 and score >= threshold:
+                    ent_type = ent_types[k]
+                    results.append((ent_type, self.type2ents[ent_type][j]))
+                else:
+                    results.append((None, None))
+        return results
 
 
 # ===============================
@@ -197,3 +354,25 @@ def get_ner_result(model, tokenizer, text, rule_ner, tfidf_aligner, device, idx2
         return {fallback_type: [fallback_ent]}
 
     return {}
+
+
+def get_ner_results(texts, rule_ner, tfidf_aligner):
+    """
+    get_ner_result 的批量版（离线评测、批量问答）：
+    规则 NER 逐条扫描，对齐和兜底检索各自批量完成，返回与 texts 等长的列表
+    """
+    ner_raws = [rule_ner.find(text) for text in texts]
+
+    hit = [i for i, raw in enumerate(ner_raws) if raw]
+    miss = [i for i, raw in enumerate(ner_raws) if not raw]
+
+    results = [{} for _ in texts]
+    for i, aligned in zip(hit, tfidf_aligner.align_batch([ner_raws[i] for i in hit])):
+        results[i] = aligned
+    fallbacks = tfidf_aligner.search_best_batch(
+        [texts[i] for i in miss], ent_types=rule_ner.entity_types, threshold=0.3
+    )
+    for i, (fallback_type, fallback_ent) in zip(miss, fallbacks):
+        if fallback_ent:
+            results[i] = {fallback_type: [fallback_ent]}
+    return results
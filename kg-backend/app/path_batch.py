@@ -0,0 +1,173 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .constants import ENTITY_LABEL
+
+logger = logging.getLogger(__name__)
+
+# 单次批量请求最多多少对实体
+MAX_BATCH_PAIRS = 5000
+
+# 全进程共享的路径计算线程池：内存图上算路径，或回退时同时占用的 Neo4j 会话数上限
+PATH_WORKERS = min(8, os.cpu_count() or 4)
+
+# 同名实体按 PageRank 取最重要的那个；所有名字一次查完
+RESOLVE_NAMES_CYPHER = f"""
+    UNWIND $names AS name
+    MATCH (n:{ENTITY_LABEL} {{name: name}})
+    WITH name, n
+    ORDER BY coalesce(n.pagerank, 0) DESC
+    WITH name, collect(id(n))[0] AS id
+    RETURN name, id
+"""
+
+# 内存图不可用时逐对回退的查询：Cypher 给不出 k 条最短路径（allShortestPaths 只有等长的那些），
+# 回退时只取一条最短路径，k > 1 的请求在结果里标记 approximate
+FALLBACK_PATH_CYPHER = """
+    MATCH (a), (b)
+    WHERE id(a) = $idA AND id(b) = $idB
+    MATCH p = shortestPath((a)-[*..5]-(b))
+    RETURN [n IN nodes(p) | id(n)] AS node_ids,
+           [n IN nodes(p) | n.name] AS node_names,
+           [r IN relationships(p) | id(r)] AS rel_ids
+"""
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=PATH_WORKERS, thread_name_prefix="path")
+
+
+def parse_pairs(raw):
+    """
+    接受 [{"entityA": .., "entityB": ..}, ..] 或 [[a, b], ..]，返回 [(a, b)]；格式不对抛 ValueError
+    """
+    if not isinstance(raw, list) or not raw:
+        raise ValueError("pairs 必须是非空列表")
+    if len(raw) > MAX_BATCH_PAIRS:
+        raise ValueError(f"pairs 最多 {MAX_BATCH_PAIRS} 对")
+
+    pairs = []
+    for item in raw:
+        if isinstance(item, dict):
+            a, b = item.get("entityA"), item.get("entityB")
+        elif isinstance(item, (list, tuple)) and len(item) == 2:
+            a, b = item
+        else:
+            raise ValueError("pairs 中的元素格式不正确")
+        if not a or not b:
+            raise ValueError("每一对都必须提供实体 A 和实体 B")
+        pairs.append((str(a), str(b)))
+    return pairs
+
+
+def resolve_entity_ids(driver, names):
+    with driver.driver.session() as session:
+        return {
+            r["name"]: r["id"]
+            for r in session.run(RESOLVE_NAMES_CYPHER, names=sorted(set(names)))
+        }
+
+
+def _engine_paths(engine, idA, idB, k, mode, options):
+    if mode == "informative":
+        scored, truncated = engine.informative_paths(idA, idB, k=k, **options)
+        paths = [(n, r) for n, r, _ in scored]
+        extra = {"costs": [c for _, _, c in scored], "truncated": truncated}
+    elif k > 1:
+        paths, extra = engine.k_shortest_paths(idA, idB, k), {}
+    else:
+        paths, extra = engine.shortest_paths(idA, idB, limit=1), {}
+    return [
+        {
+            "length": len(rels),
+            "node_ids": nodes,
+            "node_names": engine.names_of(nodes),
+            "rel_ids": rels,
+        }
+        for nodes, rels in paths
+    ], extra
+
+
+def _fallback_paths(driver, idA, idB, k):
+    with driver.driver.session() as session:
+        paths = [
+            {
+                "length": len(r["rel_ids"]),
+                "node_ids": r["node_ids"],
+                "node_names": r["node_names"],
+                "rel_ids": r["rel_ids"],
+            }
+            for r in session.run(FALLBACK_PATH_CYPHER, idA=idA, idB=idB)
+        ]
+    return paths, ({"approximate": True} if k > 1 else {})
+
+
+def _compute_pair(driver, engine, index, a, b, idA, idB, k, mode, options):
+    result = {"kind": "pair", "index": index, "entityA": a, "entityB": b}
+    if idA is None or idB is None:
+        result["error"] = "找不到对应节点"
+        return result
+    if idA == idB:
+        result["error"] = "实体 A 和实体 B 不能相同"
+        return result
+
+    try:
+        if engine is not None:
+            paths, extra = _engine_paths(engine, idA, idB, k, mode, options)
+        else:
+            paths, extra = _fallback_paths(driver, idA, idB, k)
+    except Exception as e:
+        logger.warning("batch path %s -> %s failed: %s", a, b, e)
+        result["error"] = str(e)
+        return result
+
+    result["paths"] = paths
+    result["length"] = paths[0]["length"] if paths else None
+    result.update(extra)
+    return result
+
+
+def iter_batch_paths(driver, engine, pairs, k=1, mode="shortest", options=None):
+    """
+    批量路径：所有名字一次解析，各对在共享线程池里并发计算，谁先算完先产出谁
+    （结果里带 index 对应请求中的位置），最后产出一条汇总
+    """
+    start = time.perf_counter()
+    ids = resolve_entity_ids(driver, [name for pair in pairs for name in pair])
+    options = options or {}
+
+    futures = [
+        _EXECUTOR.submit(
+            _compute_pair,
+            driver,
+            engine,
+            i,
+            a,
+            b,
+            ids.get(a),
+            ids.get(b),
+            k,
+            mode,
+            options,
+        )
+        for i, (a, b) in enumerate(pairs)
+    ]
+    found = 0
+    try:
+        for future in as_completed(futures):
+            result = future.result()
+            if result.get("paths"):
+                found += 1
+            yield result
+    finally:
+        # 客户端中途断开时，还没开始的任务直接取消
+        for future in futures:
+            future.cancel()
+
+    yield {
+        "kind": "end",
+        "pairs": len(pairs),
+        "found": found,
+        "engine": engine is not None,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
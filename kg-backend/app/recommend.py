@@ -0,0 +1,320 @@
+import time
+import logging
+
+import numpy as np
+import scipy.sparse as sp
+
+from .graph_version import VersionedBuild
+
+logger = logging.getLogger(__name__)
+
+CHARACTER_LABEL = "Character"
+
+# 角色 → 其它实体的特征关系，以及各类特征在相似度里的权重
+FEATURE_RELATIONS = {
+    "work": ("AppearsIn", 1.0),
+    "voice": ("VoiceBy", 0.5),
+    "group": ("MemberOf", 1.0),
+}
+# 萌点是角色节点上的属性数组
+TAG_PROPERTY = "CharacterTag"
+TAG_WEIGHT = 0.5
+# 人物关系邻域：与同一批角色有关系（或彼此直接有关系）的角色相似
+RELATION_WEIGHT = 1.5
+
+# 推荐理由（取贡献最大的一类特征）
+REASON_TEXT = {
+    "work": "出自同一作品",
+    "voice": "同一位声优配音",
+    "group": "同属一个团体",
+    "tag": "萌点相似",
+    "relation": "人物关系相近",
+}
+
+# 出现在太多角色上的特征区分度低，两两乘积却是平方级的，直接丢弃
+MAX_FEATURE_DF = 2000
+
+# 每个角色保留的相似角色数；按行分块做稀疏乘积，控制峰值内存
+SIMILAR_TOP_K = 20
+SIMILARITY_CHUNK = 2000
+
+# 写回节点属性时每个事务的行数
+WRITE_BATCH_SIZE = 5000
+
+
+def fetch_character_features(driver):
+    """
+    拉取全部角色及其特征：
+    返回 (char_ids, names, {特征类别: (角色下标数组, 特征键列表)})
+    """
+    types = [rel for rel, _ in FEATURE_RELATIONS.values()]
+    type2group = {rel: group for group, (rel, _) in FEATURE_RELATIONS.items()}
+    features = {group: ([], []) for group in [*FEATURE_RELATIONS, "tag", "relation"]}
+
+    with driver.driver.session() as session:
+        char_ids, names = [], []
+        for r in session.run(
+            f"""
+            MATCH (c:{CHARACTER_LABEL})
+            RETURN id(c) AS id, c.name AS name, c.{TAG_PROPERTY} AS tags
+            """
+        ):
+            tags = r["tags"]
+            if isinstance(tags, str):
+                tags = [tags]
+            for tag in tags or []:
+                features["tag"][0].append(len(char_ids))
+                features["tag"][1].append(tag)
+            char_ids.append(r["id"])
+            names.append(r["name"])
+        id2row = {cid: i for i, cid in enumerate(char_ids)}
+
+        for r in session.run(
+            f"""
+            MATCH (c:{CHARACTER_LABEL})-[r]->(m)
+            WHERE type(r) IN $types
+            RETURN id(c) AS source, type(r) AS type, id(m) AS target
+            """,
+            types=types,
+        ):
+            rows, keys = features[type2group[r["type"]]]
+            rows.append(id2row[r["source"]])
+            keys.append(r["target"])
+
+        for r in session.run(
+            f"""
+            MATCH (a:{CHARACTER_LABEL})-[]-(b:{CHARACTER_LABEL})
+            WHERE id(a) <> id(b)
+            RETURN id(a) AS source, id(b) AS target
+            """
+        ):
+            rows, keys = features["relation"]
+            rows.append(id2row[r["source"]])
+            keys.append(id2row[r["target"]])
+
+    return (
+        np.asarray(char_ids, dtype=np.int64),
+        names,
+        {
+            group: (np.asarray(rows, dtype=np.int64), keys)
+            for group, (rows, keys) in features.items()
+        },
+    )
+
+
+def feature_matrix(n, rows, keys, self_loops=False):
+    """
+    (角色下标, 特征键) 关联 → n x 特征数 的稀疏矩阵：
+    特征按 IDF 加权（越少见越有区分度），每行 L2 归一化，行与行的点积即余弦相似度。
+    self_loops=True 时有特征的角色再带上“自己”这一列，即邻居们用来指向它的那一列
+    （关系邻域用：特征键就是角色下标，直接相连的两个角色也算相似）
+    """
+    if self_loops:
+        has = np.unique(rows)
+        rows = np.concatenate([rows, has])
+        keys = list(keys) + has.tolist()
+    if len(rows):
+        _, cols = np.unique(np.asarray(keys, dtype=str), return_inverse=True)
+        n_cols = int(cols.max()) + 1
+    else:
+        cols, n_cols = np.zeros(0, dtype=np.int64), 0
+
+    x = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n_cols))
+    x.data[:] = 1.0  # 重复的 (角色, 特征) 只算一次
+
+    df = np.bincount(x.indices, minlength=n_cols)
+    idf = np.where(
+        (df > 0) & (df <= MAX_FEATURE_DF), np.log1p(n / np.maximum(df, 1)), 0.0
+    )
+    x = (x @ sp.diags(idf)).tocsr()
+    x.eliminate_zeros()
+
+    norm = np.sqrt(np.asarray(x.multiply(x).sum(axis=1)).ravel())
+    return (sp.diags(1.0 / np.where(norm > 0, norm, 1.0)) @ x).tocsr()
+
+
+def build_feature_blocks(n, features):
+    """
+    各类特征矩阵乘上 sqrt(权重) 后横向拼接：X X^T = sum_g w_g * 余弦_g
+    """
+    weights = {group: w for group, (_, w) in FEATURE_RELATIONS.items()}
+    weights["tag"] = TAG_WEIGHT
+    weights["relation"] = RELATION_WEIGHT
+
+    blocks = {}
+    for group, (rows, keys) in features.items():
+        m = feature_matrix(n, rows, keys, self_loops=group == "relation")
+        blocks[group] = (m * np.sqrt(weights[group])).tocsr()
+    return blocks
+
+
+def top_k_similar(x, k=SIMILAR_TOP_K, chunk=SIMILARITY_CHUNK):
+    """
+    按行分块算 X X^T，每行取分数最高的 k 个（不含自己）；
+    返回 (rows, cols, scores)，同一行内按分数降序
+    """
+    n = x.shape[0]
+    xt = x.T.tocsr()
+    out_rows, out_cols, out_scores = [], [], []
+    for start in range(0, n, chunk):
+        s = (x[start : start + chunk] @ xt).tocsr()
+        for i in range(s.shape[0]):
+            lo, hi = s.indptr[i], s.indptr[i + 1]
+            cols = s.indices[lo:hi]
+            vals = s.data[lo:hi]
+            keep = (cols != start + i) & (vals > 0)
+            cols, vals = cols[keep], vals[keep]
+            if len(vals) > k:
+                part = np.argpartition(-vals, k)[:k]
+                cols, vals = cols[part], vals[part]
+            order = np.lexsort((cols, -vals))
+            out_rows.append(np.full(len(order), start + i, dtype=np.int64))
+            out_cols.append(cols[order].astype(np.int64))
+            out_scores.append(vals[order])
+
+    if not out_rows:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0)
+    return (
+        np.concatenate(out_rows),
+        np.concatenate(out_cols),
+        np.concatenate(out_scores),
+    )
+
+
+def dominant_reasons(blocks, rows, cols):
+    """
+    每对 (row, col) 相似度里贡献最大的特征类别
+    """
+    groups = list(blocks)
+    if len(rows) == 0:
+        return []
+    contrib = np.stack(
+        [
+            np.asarray(m[rows].multiply(m[cols]).sum(axis=1)).ravel()
+            for m in blocks.values()
+        ],
+        axis=1,
+    )
+    return [groups[g] for g in contrib.argmax(axis=1)]
+
+
+def write_similar(
+    driver, char_ids, rows, cols, scores, reasons, batch_size=WRITE_BATCH_SIZE
+):
+    """
+    每个角色的 top-k 写到 c.similar_ids / similar_scores / similar_reasons；
+    没有相似角色的写空列表，覆盖上一次的结果
+    """
+    bounds = np.searchsorted(rows, np.arange(len(char_ids) + 1))
+    records = []
+    for i, cid in enumerate(char_ids.tolist()):
+        lo, hi = bounds[i], bounds[i + 1]
+        records.append(
+            {
+                "id": cid,
+                "ids": char_ids[cols[lo:hi]].tolist(),
+                "scores": np.round(scores[lo:hi], 4).tolist(),
+                "reasons": reasons[lo:hi],
+            }
+        )
+
+    cypher = """
+    UNWIND $rows AS row
+    MATCH (c) WHERE id(c) = row.id
+    SET c.similar_ids = row.ids, c.similar_scores = row.scores,
+        c.similar_reasons = row.reasons
+    """
+    with driver.driver.session() as session:
+        for i in range(0, len(records), batch_size):
+            session.execute_write(
+                lambda tx, chunk: tx.run(cypher, rows=chunk).consume(),
+                records[i : i + batch_size],
+            )
+
+
+def run_recommend(driver):
+    """
+    离线计算角色之间的相似度（同作品、同声优、同团体、萌点、人物关系邻域），
+    每个角色的 top-k 写回节点属性，线上推荐只做字典查找
+    """
+    start = time.perf_counter()
+    char_ids, _, features = fetch_character_features(driver)
+    blocks = build_feature_blocks(len(char_ids), features)
+    x = sp.hstack(list(blocks.values())).tocsr()
+
+    rows, cols, scores = top_k_similar(x)
+    reasons = dominant_reasons(blocks, rows, cols)
+    write_similar(driver, char_ids, rows, cols, scores, reasons)
+
+    report = {
+        "characters": len(char_ids),
+        "features": int(x.shape[1]),
+        "pairs": len(rows),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    logger.info("recommend: %s", report)
+    return report
+
+
+class Recommendations:
+    """
+    某个图版本下预计算好的推荐表：角色名 → 按分数降序的相似角色
+    """
+
+    def __init__(self, version, anchors, table):
+        self.version = version
+        # anchors: {name: id}；table: {name: [{"id", "name", "score", "reason"}]}
+        self.anchors = anchors
+        self.table = table
+
+    def top(self, name, limit):
+        items = self.table.get(name)
+        return None if items is None else items[:limit]
+
+
+def load_recommendations(driver, version):
+    start = time.perf_counter()
+    with driver.driver.session() as session:
+        records = list(
+            session.run(
+                f"""
+                MATCH (c:{CHARACTER_LABEL})
+                WHERE c.similar_ids IS NOT NULL
+                RETURN id(c) AS id, c.name AS name, c.similar_ids AS ids,
+                       c.similar_scores AS scores, c.similar_reasons AS reasons
+                """
+            )
+        )
+
+    id2name = {r["id"]: r["name"] for r in records}
+    anchors = {r["name"]: r["id"] for r in records}
+    table = {}
+    for r in records:
+        table[r["name"]] = [
+            {
+                "id": sid,
+                "name": id2name[sid],
+                "score": score,
+                "reason": REASON_TEXT.get(reason, reason),
+            }
+            for sid, score, reason in zip(r["ids"], r["scores"], r["reasons"])
+            if sid in id2name
+        ]
+    logger.info(
+        "recommendations v%s: %d characters, %.2fs",
+        version,
+        len(table),
+        time.perf_counter() - start,
+    )
+    return Recommendations(version, anchors, table)
+
+
+class RecommendationCache(VersionedBuild):
+    """
+    按图版本从 Neo4j 读一次推荐表；读取失败时 get 返回 None
+    """
+
+    def __init__(self, driver):
+        super().__init__(
+            "recommendations", lambda version: load_recommendations(driver, version)
+        )
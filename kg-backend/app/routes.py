@@ -1,20 +1,63 @@
-from flask import Blueprint, jsonify, request
+from itertools import islice
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from .neo4j_driver import Neo4jDriver
-from .constants import ATTRIBUTE_RELATIONS, RELATION_RELATIONS
+from .constants import ATTRIBUTE_RELATIONS, RELATION_RELATIONS, ENTITY_LABEL
+from .graph_version import GraphVersion
+from .graph_snapshot import SnapshotCache, normalize_view_mode, stream_graph_ndjson
+from .graph_compact import COMPACT_MIMETYPE
+from .graph_payload import (
+    NDJSON_MIMETYPE,
+    build_graph_payload,
+    node_to_json,
+    ndjson_line,
+)
+from .graph_clusters import ClusterOverviewCache, query_cluster_members
+from .graph_engine import GraphEngineCache, hydrate_paths
+from .path_batch import iter_batch_paths, parse_pairs
+from .search_index import SearchIndexCache
+from .entity_cache import EntityDetailCache, MAX_MULTI_GET
+from .recommend import RecommendationCache
+from .graph_embedding import EmbeddingIndexCache
 
 bp = Blueprint("api", __name__, url_prefix="/api")
 
 driver = Neo4jDriver()
 
+# 图版本号 + 按版本物化的 /graph/init 快照
+GRAPH_VERSION = GraphVersion(driver)
+SNAPSHOTS = SnapshotCache(driver)
+CLUSTERS = ClusterOverviewCache(driver)
+# 路径查询用的进程内拓扑副本（CSR），同样按图版本重建
+GRAPH_ENGINE = GraphEngineCache(driver)
+# 实体名 + Alias 的进程内检索索引
+SEARCH_INDEX = SearchIndexCache(driver)
+# 实体详情（悬浮卡片、角色详情）的 LRU / TTL 缓存
+ENTITY_DETAILS = EntityDetailCache(driver)
+# 离线算好的角色相似度 top-k
+RECOMMENDATIONS = RecommendationCache(driver)
+# 离线训练的图结构嵌入（mmap），由 python -m app.graph_embedding 生成
+EMBEDDINGS = EmbeddingIndexCache()
+
+# 分层浏览的默认 / 最大页大小
+CLUSTER_PAGE_SIZE = 200
+CLUSTER_MAX_PAGE_SIZE = 1000
+
+# 检索结果条数上限
+MAX_SEARCH_LIMIT = 100
+
+# 快照还在后台构建时，建议客户端多久后重试（秒）
+SNAPSHOT_RETRY_AFTER = 5
+
 # ============ 引入 kg-chat 里的 NER ============
 import json
 import re
 from openai import OpenAI
-from .ner_model import RuleNER, TFIDFAligner, get_ner_result
+from .ner_model import get_ner_result
+from .ner_artifact import NERCache
 
-# 规则 NER + TFIDF 对齐（全局单例，避免每次请求都加载）
-RULE_NER = RuleNER(ent_dir="app/ent_aug")
-TFIDF_ALIGNER = TFIDFAligner(ent_dir="app/ent_aug")
+# 规则 NER + TFIDF 对齐（全局单例，第一次用到时从预编译产物 app/artifacts/ner 加载；
+# 词典文件更新后后台构建新版本并整体替换，不用重启）
+NER = NERCache(ent_dir="app/ent_aug")
 
 # ============ LLM 客户端（OpenAI 兼容）============
 LLM_CLIENT = OpenAI(
@@ -233,7 +276,7 @@ def build_cypher_plan(
         # label 不可参数化，只能拼接；使用白名单避免注入
         if anchor_type in ALLOWED_TYPES:
             return f"(a:{anchor_type} {{name:$a}})"
-        return "(a {name:$a})"
+        return f"(a:{ENTITY_LABEL} {{name:$a}})"
 
     def label_filter_clause(result_labels: list, var_name: str = "b"):
         # 过滤返回端 b 的 label，减少 get_entity 噪声
@@ -267,7 +310,7 @@ def build_cypher_plan(
                 {
                     "plan_name": "between_any_1hop",
                     "cypher": """
-                        MATCH (a {name:$a})-[r]-(b {name:$b})
+                        MATCH (a:Entity {name:$a})-[r]-(b:Entity {name:$b})
                         RETURN a, b, r
                         LIMIT 50
                     """,
@@ -278,10 +321,12 @@ def build_cypher_plan(
             plans.append(
                 {
                     "plan_name": "between_shortest_path",
+                    # 有内存图副本时由 _run_plan 在副本上搜索，这里是回退查询；
+                    # 按边展开成 a / b / r 行，和其它 plan 的结果形状一致
                     "cypher": """
-                        MATCH p = allShortestPaths((a {name:$a})-[*..5]-(b {name:$b}))
-                        RETURN nodes(p) AS shortest_nodes, relationships(p) AS shortest_rels, length(p) AS shortest_length
-                        LIMIT 1
+                        MATCH p = shortestPath((src:Entity {name:$a})-[*..5]-(dst:Entity {name:$b}))
+                        UNWIND relationships(p) AS r
+                        RETURN startNode(r) AS a, endNode(r) AS b, r
                     """,
                     "params": {"a": anchor, "b": second},
                 }
@@ -292,7 +337,7 @@ def build_cypher_plan(
             {
                 "plan_name": "fallback_neighbors",
                 "cypher": """
-                    MATCH (a {name:$a})-[r]-(b)
+                    MATCH (a:Entity {name:$a})-[r]-(b)
                     RETURN a, b, r
                     LIMIT 50
                 """,
@@ -313,7 +358,7 @@ def build_cypher_plan(
                 {
                     "plan_name": "fallback_neighbors",
                     "cypher": """
-                        MATCH (a {name:$a})-[r]-(b)
+                        MATCH (a:Entity {name:$a})-[r]-(b)
                         RETURN a, b, r
                         LIMIT 50
                     """,
@@ -370,7 +415,7 @@ def build_cypher_plan(
             {
                 "plan_name": "fallback_neighbors",
                 "cypher": """
-                    MATCH (a {name:$a})-[r]-(b)
+                    MATCH (a:Entity {name:$a})-[r]-(b)
                     RETURN a, b, r
                     LIMIT 50
                 """,
@@ -388,7 +433,7 @@ def build_cypher_plan(
                 {
                     "plan_name": "fallback_neighbors",
                     "cypher": """
-                        MATCH (a {name:$a})-[r]-(b)
+                        MATCH (a:Entity {name:$a})-[r]-(b)
                         RETURN a, b, r
                         LIMIT 50
                     """,
@@ -429,7 +474,7 @@ def build_cypher_plan(
             {
                 "plan_name": "fallback_neighbors",
                 "cypher": """
-                    MATCH (a {name:$a})-[r]-(b)
+                    MATCH (a:Entity {name:$a})-[r]-(b)
                     RETURN a, b, r
                     LIMIT 50
                 """,
@@ -443,7 +488,7 @@ def build_cypher_plan(
         {
             "plan_name": "fallback_neighbors",
             "cypher": """
-                MATCH (a {name:$a})-[r]-(b)
+                MATCH (a:Entity {name:$a})-[r]-(b)
                 RETURN a, b, r
                 LIMIT 50
             """,
@@ -454,8 +499,9 @@ def build_cypher_plan(
 
 
 def _node_label(n):
+    # 跳过共享的 :Entity label，取实体类型 label
     try:
-        return next(iter(n.labels), "default")
+        return next((l for l in n.labels if l != ENTITY_LABEL), "default")
     except Exception:
         return "default"
 
@@ -500,101 +546,467 @@ def ping():
 
 @bp.route("/character/<name>", methods=["GET"])
 def get_character(name):
-    char = driver.get_character(name)
+    char = ENTITY_DETAILS.get(GRAPH_VERSION.current(), "Character", name)
     if char:
-        return jsonify(char)
+        return jsonify(
+            {"name": char["name"], "description": char["properties"].get("description")}
+        )
     else:
         return jsonify({"error": "Character not found"}), 404
 
 
+@bp.route("/entities/batch", methods=["POST"])
+def get_entities_batch():
+    """
+    悬浮卡片批量取详情：{"label": "Character", "names": [..]}，
+    返回 {"entities": {name: 详情或 null}}，未命中缓存的名字合并成一次查询
+    """
+    data = request.get_json(silent=True) or {}
+    label = data.get("label", "Character")
+    names = data.get("names")
+    if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+        return jsonify({"error": "names 必须是字符串列表"}), 400
+    if len(names) > MAX_MULTI_GET:
+        return jsonify({"error": f"names 最多 {MAX_MULTI_GET} 个"}), 400
+
+    version = GRAPH_VERSION.current()
+    try:
+        entities = ENTITY_DETAILS.get_many(version, label, names)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"version": version, "entities": entities})
+
+
 @bp.route("/characters", methods=["GET"])
 def search_characters():
     keyword = request.args.get("keyword", "")
     limit = int(request.args.get("limit", 10))
-    results = driver.search_characters(keyword, limit)
-    return jsonify(results)
+    index = SEARCH_INDEX.get(GRAPH_VERSION.current())
+    if index is None or not keyword.strip():
+        # 索引不可用，或空关键字（按 PageRank 列出角色），走 Neo4j
+        return jsonify(driver.search_characters(keyword, limit))
+    results = index.search(keyword, limit, labels={"Character"})
+    return jsonify(
+        [{"name": r["name"], "description": r["description"]} for r in results]
+    )
 
 
-@bp.route("/graph/init", methods=["POST"])
-def init_graph():
-    data = request.get_json() or {}
-    view_mode = data.get("viewMode", "focus")
+def _label_args():
+    # ?label= 可重复或逗号分隔，没给返回 None（不过滤）
+    return {
+        l for value in request.args.getlist("label") for l in value.split(",") if l
+    } or None
 
-    if view_mode == "full":
-        append_cypher = ""
+
+@bp.route("/search", methods=["GET"])
+def search_entities():
+    """
+    全部实体（名字 + Alias）的前缀 / 子串检索，按匹配质量和 PageRank 排序；
+    ?label= 限定实体类型，可重复或逗号分隔
+    """
+    query = request.args.get("q", "")
+    limit = _int_arg("limit", 10, lo=1, hi=MAX_SEARCH_LIMIT)
+    labels = _label_args()
+    index = SEARCH_INDEX.get(GRAPH_VERSION.current())
+    if index is None:
+        return jsonify({"error": "检索索引尚未就绪"}), 503
+    return jsonify(
+        {
+            "version": index.version,
+            "results": index.search(query, limit, labels=labels),
+        }
+    )
+
+
+def _negotiate_format():
+    """
+    按 Accept 头选响应格式：
+    默认 JSON；application/x-ndjson 走流式；COMPACT_MIMETYPE 走列式二进制
+    """
+    return request.accept_mimetypes.best_match(
+        ["application/json", NDJSON_MIMETYPE, COMPACT_MIMETYPE]
+    )
+
+
+def _wants_ndjson():
+    return _negotiate_format() == NDJSON_MIMETYPE
+
+
+def _conditional_response(body, etag, mimetype="application/json"):
+    """
+    带 ETag 的响应；客户端 If-None-Match 命中时直接 304
+    """
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
     else:
-        append_cypher = "LIMIT $top_n"
-    nodes = []
-    links = []
-    TOP_N = 1000
+        resp = Response(body, mimetype=mimetype)
+    resp.set_etag(etag)
+    # 允许缓存，但每次都要带 ETag 回来验证；同一 URL 按 Accept 返回不同格式
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.vary.add("Accept")
+    return resp
 
-    with driver.driver.session() as session:
-        result = session.run(
-            """
-            MATCH (n)
-            OPTIONAL MATCH (n)-[r]-()
-            WITH n, count(r) AS degree
-            WITH n, degree, labels(n)[0] AS label
-            RETURN id(n) AS id, n.name AS name, label AS label, properties(n) AS props
-            ORDER BY degree DESC
-            """
-            + append_cypher,
-            top_n=TOP_N,
+
+@bp.route("/graph/init", methods=["GET", "POST"])
+def init_graph():
+    if request.method == "GET":
+        view_mode = request.args.get("viewMode", "focus")
+    else:
+        data = request.get_json(silent=True) or {}
+        view_mode = data.get("viewMode", "focus")
+    view_mode = normalize_view_mode(view_mode)
+
+    fmt = _negotiate_format()
+
+    # 流式模式直接读 Neo4j 游标，边查边发，不经过快照缓存
+    if fmt == NDJSON_MIMETYPE:
+        return Response(
+            stream_with_context(stream_graph_ndjson(driver, view_mode)),
+            mimetype=NDJSON_MIMETYPE,
         )
 
-        node_ids = set()
-        label_seen = set()
-        for record in result:
-            nid = record["id"]
-            label = record["label"]
-            if nid not in node_ids or label not in label_seen:
-                node_ids.add(nid)
-                label_seen.add(label)
-
-                # 过滤掉 name，保留其它属性（包括 ATTRIBUTE_RELATIONS）
-                props = {k: v for k, v in record["props"].items() if k != "name"}
-                nodes.append(
-                    {
-                        "id": nid,
-                        "name": record["name"],
-                        "group": label,
-                        "properties": props,
-                    }
+    snapshot = SNAPSHOTS.get(view_mode, GRAPH_VERSION.current())
+    if snapshot is None:
+        return (
+            jsonify({"error": "图快照尚未就绪"}),
+            503,
+            {"Retry-After": str(SNAPSHOT_RETRY_AFTER)},
+        )
+    if fmt == COMPACT_MIMETYPE:
+        return _conditional_response(
+            snapshot.compact_body, snapshot.compact_etag, mimetype=COMPACT_MIMETYPE
+        )
+    return _conditional_response(snapshot.body, snapshot.etag)
+
+
+@bp.route("/similar", methods=["GET"])
+def similar_entities():
+    """
+    图结构嵌入上的近邻：“和 X 相似的角色 / 作品”，可跨作品；
+    ?name= 或 ?id= 指定实体，?label= 限定结果类型（可重复或逗号分隔）
+    """
+    index = EMBEDDINGS.get()
+    if index is None:
+        return jsonify({"error": "嵌入索引尚未生成"}), 503
+
+    limit = _int_arg("limit", 10, lo=1, hi=MAX_SEARCH_LIMIT)
+    node_id = request.args.get("id", type=int)
+    if node_id is None:
+        name = request.args.get("name", "")
+        if not name:
+            return jsonify({"error": "缺少 name 或 id"}), 400
+        with driver.driver.session() as session:
+            node_id = _resolve_entity_id(session, name)
+        if node_id is None:
+            return jsonify({"error": "找不到对应节点"}), 404
+
+    neighbors = index.similar(node_id, limit, labels=_label_args())
+    if neighbors is None:
+        return jsonify({"error": "该实体不在嵌入索引中"}), 404
+    return jsonify(
+        {
+            "version": index.version,
+            "anchor": index.describe(index.row_of(node_id)),
+            "results": [
+                {**index.describe(row), "score": round(score, 4)}
+                for row, score in neighbors
+            ],
+        }
+    )
+
+
+@bp.route("/node/<int:node_id>", methods=["GET"])
+def get_node(node_id):
+    # 列式格式不带属性，前端按需拉单个节点详情
+    node = driver.get_node(node_id)
+    if node:
+        return jsonify(node)
+    return jsonify({"error": "Node not found"}), 404
+
+
+def _int_arg(name, default, lo=0, hi=None):
+    try:
+        value = int(request.args.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    value = max(lo, value)
+    return min(value, hi) if hi is not None else value
+
+
+@bp.route("/graph/clusters", methods=["GET"])
+def graph_clusters():
+    """
+    最粗一层：每个作品是一个聚类，返回成员数和作品之间的边权
+    """
+    limit = _int_arg("limit", CLUSTER_PAGE_SIZE, lo=1, hi=CLUSTER_MAX_PAGE_SIZE)
+    min_weight = _int_arg("minWeight", 1, lo=1)
+
+    overview = CLUSTERS.get(GRAPH_VERSION.current())
+    body = json.dumps(
+        overview.top(limit, min_weight), ensure_ascii=False, separators=(",", ":")
+    )
+    return _conditional_response(body, f"{overview.etag}-{limit}-{min_weight}")
+
+
+@bp.route("/graph/clusters/<int:cluster_id>", methods=["GET"])
+def graph_cluster_members(cluster_id):
+    """
+    展开某个作品聚类：按 PageRank 分页返回其中的角色、人物、团体等
+    """
+    offset = _int_arg("offset", 0)
+    limit = _int_arg("limit", CLUSTER_PAGE_SIZE, lo=1, hi=CLUSTER_MAX_PAGE_SIZE)
+    label = request.args.get("label") or None
+
+    overview = CLUSTERS.get(GRAPH_VERSION.current())
+    cluster = overview.by_id.get(cluster_id)
+    if cluster is None:
+        return jsonify({"error": "Cluster not found"}), 404
+
+    etag = f"{overview.etag}-{cluster_id}-{label or ''}-{offset}-{limit}"
+    if request.if_none_match.contains(etag):
+        return _conditional_response(b"", etag)
+
+    node_records, edge_records = query_cluster_members(
+        driver, cluster_id, offset, limit, label=label
+    )
+    total = cluster["counts"].get(label, 0) if label else cluster["size"]
+    next_offset = offset + len(node_records)
+
+    payload = build_graph_payload(node_records, edge_records)
+    payload.update(
+        {
+            "cluster": cluster,
+            "offset": offset,
+            "limit": limit,
+            "total": total,
+            "next_offset": next_offset if next_offset < total else None,
+        }
+    )
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return _conditional_response(body, etag)
+
+
+@bp.route("/admin/graph/refresh", methods=["POST"])
+def refresh_graph_version():
+    # 导入完成后调用，立即感知新版本，不必等 TTL；
+    # 顺带在后台重建快照和布局、路径副本、检索索引和推荐表，完成前请求继续用旧版本
+    version = GRAPH_VERSION.refresh()
+    SNAPSHOTS.warm(version)
+    GRAPH_ENGINE.get(version)
+    SEARCH_INDEX.get(version)
+    RECOMMENDATIONS.get(version)
+    return jsonify({"version": version})
+
+
+@bp.route("/admin/ner/reload", methods=["POST"])
+def reload_ner():
+    # build_ent_txt.py 重新生成 ent_aug/*.txt 后调用，不必等文件检查的 TTL；
+    # 新词典在后台构建，期间请求继续用旧版本，building 为 true 表示尚未切换
+    version, ner = NER.reload()
+    serving = ner.version if ner is not None else None
+    return jsonify(
+        {"version": version, "serving": serving, "building": serving != version}
+    )
+
+
+@bp.route("/admin/entity-cache", methods=["GET"])
+def entity_cache_stats():
+    # 实体详情缓存的命中 / 未命中 / 淘汰计数
+    return jsonify(ENTITY_DETAILS.stats())
+
+
+# 内存图副本不可用时的回退查询
+SHORTEST_PATH_CYPHER = """
+    MATCH p = allShortestPaths((a)-[*..5]-(b))
+    WHERE id(a) = $idA AND id(b) = $idB
+    RETURN nodes(p) AS shortest_nodes, relationships(p) AS shortest_rels, length(p) AS shortest_length
+"""
+
+# 同名实体按 PageRank 取最重要的那个
+RESOLVE_ENTITY_CYPHER = f"""
+    MATCH (n:{ENTITY_LABEL} {{name: $name}})
+    RETURN id(n) AS id
+    ORDER BY coalesce(n.pagerank, 0) DESC
+    LIMIT 1
+"""
+
+# 最大 k（k 条最短路径）
+MAX_PATH_K = 20
+
+# mode=informative 时各参数的上限，避免单个请求拖垮进程
+MAX_PATH_HOPS = 8
+MAX_PATH_BUDGET_MS = 2000
+
+
+def _graph_engine():
+    return GRAPH_ENGINE.get(GRAPH_VERSION.current())
+
+
+def _resolve_entity_id(session, name):
+    rec = session.run(RESOLVE_ENTITY_CYPHER, name=name).single()
+    return rec["id"] if rec else None
+
+
+def _iter_paths(idA, idB, k=1, stream=False):
+    """
+    逐条产出 (节点序列, 关系序列)，元素是带属性的 Neo4j Node / Relationship。
+    优先在内存图副本上搜索（k > 1 时为 k 条最短无环路径），只用 Neo4j 补属性；
+    副本不可用时回退到 allShortestPaths。
+    stream=True 时 k 条路径逐条搜索、逐条补属性，第一条路径不必等其余路径算完
+    """
+    engine = _graph_engine()
+    if engine is not None:
+        if k > 1 and stream:
+            yield from _hydrated_each(engine.iter_k_shortest_paths(idA, idB, k))
+            return
+        if k > 1:
+            id_paths = engine.k_shortest_paths(idA, idB, k)
+        else:
+            id_paths = engine.shortest_paths(idA, idB)
+        yield from _hydrated(id_paths)
+        return
+
+    with driver.driver.session() as session:
+        for record in session.run(SHORTEST_PATH_CYPHER, idA=idA, idB=idB):
+            yield record["shortest_nodes"], record["shortest_rels"]
+
+
+def _hydrated(id_paths):
+    node_map, rel_map = hydrate_paths(driver, id_paths)
+    for node_ids, rel_ids in id_paths:
+        # 副本比数据库旧时，已被删除的节点 / 关系所在路径直接跳过
+        if all(n in node_map for n in node_ids) and all(r in rel_map for r in rel_ids):
+            yield [node_map[n] for n in node_ids], [rel_map[r] for r in rel_ids]
+
+
+def _hydrated_each(id_paths):
+    """
+    每拿到一条 id 路径就补一次属性，只查之前的路径里没有取过的节点 / 关系
+    """
+    node_map, rel_map = {}, {}
+    for node_ids, rel_ids in id_paths:
+        new_nodes = [n for n in node_ids if n not in node_map]
+        new_rels = [r for r in rel_ids if r not in rel_map]
+        if new_nodes or new_rels:
+            nodes, rels = hydrate_paths(driver, [(new_nodes, new_rels)])
+            node_map.update(nodes)
+            rel_map.update(rels)
+        if all(n in node_map for n in node_ids) and all(r in rel_map for r in rel_ids):
+            yield [node_map[n] for n in node_ids], [rel_map[r] for r in rel_ids]
+
+
+def _informative_options(data):
+    """
+    mode=informative 的搜索参数（均可选），非法值抛 ValueError
+    """
+    opts = {}
+    for key, arg in [("allowTypes", "allow_types"), ("denyTypes", "deny_types")]:
+        value = data.get(key)
+        if value:
+            if isinstance(value, str):
+                value = [value]
+            opts[arg] = [str(v) for v in value]
+    if data.get("hubPenalty") is not None:
+        opts["hub_penalty"] = max(float(data["hubPenalty"]), 0.0)
+    if data.get("maxDegree") is not None:
+        opts["max_degree"] = max(int(data["maxDegree"]), 1)
+    if data.get("maxFrontier") is not None:
+        opts["max_frontier"] = max(int(data["maxFrontier"]), 1)
+    if data.get("maxHops") is not None:
+        opts["max_hops"] = min(max(int(data["maxHops"]), 1), MAX_PATH_HOPS)
+    if data.get("budgetMs") is not None:
+        opts["budget"] = min(max(int(data["budgetMs"]), 1), MAX_PATH_BUDGET_MS) / 1000
+    return opts
+
+
+def _path_summary(path_nodes, path_rels):
+    return {
+        "length": len(path_rels),
+        "node_ids": [n.id for n in path_nodes],
+        "node_names": [n.get("name") for n in path_nodes],
+        "rel_ids": [r.id for r in path_rels],
+    }
+
+
+def _iter_path_graph(paths):
+    """
+    逐条路径产出新出现的图元素（去重），JSON / NDJSON 两种输出共用：
+    ("node", 节点) / ("property", 对源节点 properties 的补丁) / ("link", 关系，标记 is_shortest)，
+    每条路径的元素之后再产出 ("path", (path_nodes, path_rels))
+    """
+    seen_nodes, seen_links = set(), set()
+    for path_nodes, path_rels in paths:
+        for n in path_nodes:
+            if n.id not in seen_nodes:
+                seen_nodes.add(n.id)
+                yield "node", node_to_json(
+                    n.id, n.get("name"), _node_label(n), dict(n.items())
                 )
 
-        if node_ids:
-            result = session.run(
-                """
-                MATCH (a)-[r]->(b)
-                WHERE id(a) IN $ids AND id(b) IN $ids
-                RETURN id(a) AS source, id(b) AS target, type(r) AS type, properties(r) AS props
-                """,
-                ids=list(node_ids),
-            )
-            for record in result:
-                rel_type = record["type"]
-                source_id = record["source"]
-                target_id = record["target"]
-                rel_props = record["props"]
-
-                if rel_type in ATTRIBUTE_RELATIONS:
-                    for node in nodes:
-                        if node["id"] == source_id:
-                            node["properties"][rel_type] = rel_props.get(
-                                "value", target_id
-                            )
-                    continue
-                else:
-                    links.append(
-                        {
-                            "source": source_id,
-                            "target": target_id,
-                            "type": rel_type,
-                            "properties": rel_props,
-                        }
-                    )
+        for r in path_rels:
+            source_id = r.start_node.id
+            rel_props = dict(r.items())
+            if r.type in ATTRIBUTE_RELATIONS:
+                if source_id in seen_nodes:
+                    yield "property", {
+                        "id": source_id,
+                        "key": r.type,
+                        "value": rel_props.get("value", r.end_node.id),
+                    }
+            elif r.id not in seen_links:
+                seen_links.add(r.id)
+                yield "link", {
+                    "source": source_id,
+                    "target": r.end_node.id,
+                    "type": r.type,
+                    "properties": rel_props,
+                    "is_shortest": True,
+                }
+
+        yield "path", (path_nodes, path_rels)
+
+
+def _path_graph(paths):
+    """
+    路径上的节点和关系组装成 (nodes, links, paths)：属性关系写回源节点的 properties
+    """
+    node_map, links, taken = {}, [], []
+    for kind, item in _iter_path_graph(paths):
+        if kind == "node":
+            node_map[item["id"]] = item
+        elif kind == "property":
+            node_map[item["id"]]["properties"][item["key"]] = item["value"]
+        elif kind == "link":
+            links.append(item)
+        else:
+            taken.append(item)
+    return list(node_map.values()), links, taken
+
 
-    return jsonify({"nodes": nodes, "links": links})
+def _stream_path_ndjson(paths_iter, k, idA, idB, extra=None):
+    """
+    /query-path 的流式版本，内容与 JSON 版一致（同样最多 k 条路径），每算出一条路径就输出：
+    该路径上新出现的节点、属性补丁和边，然后是这条路径的摘要（第一条同时作为 shortest）；
+    最后是全部路径摘要和 focus
+    """
+    summaries = []
+    for kind, item in _iter_path_graph(islice(paths_iter, k)):
+        if kind != "path":
+            yield ndjson_line({"kind": kind, **item})
+            continue
+        summary = _path_summary(*item)
+        if not summaries:
+            yield ndjson_line({"kind": "shortest", **summary})
+        summaries.append(summary)
+        yield ndjson_line({"kind": "path", "index": len(summaries) - 1, **summary})
+
+    if not summaries:
+        yield ndjson_line({"kind": "shortest", **_path_summary([], [])})
+    yield ndjson_line({"kind": "paths", "paths": summaries})
+    if extra:
+        yield ndjson_line({"kind": "meta", **extra})
+    yield ndjson_line({"kind": "focus", "focusNodeIds": [str(idA), str(idB)]})
+    yield ndjson_line({"kind": "end"})
 
 
 @bp.route("/query-path", methods=["POST"])
@@ -609,93 +1021,131 @@ def query_path():
     if entityA == entityB:
         return jsonify({"error": "实体 A 和实体 B 不能相同"}), 400
 
-    nodes = []
-    links = []
-
+    try:
+        k = min(max(int(data.get("k", 1)), 1), MAX_PATH_K)
+    except (TypeError, ValueError):
+        return jsonify({"error": "k 必须是正整数"}), 400
+
+    # shortest：按跳数的最短路径；informative：避开枢纽节点、按信息量排序的 top-k
+    mode = data.get("mode", "shortest")
+    if mode not in ("shortest", "informative"):
+        return jsonify({"error": "mode 只能是 shortest 或 informative"}), 400
+    if mode == "informative":
+        try:
+            options = _informative_options(data)
+        except (TypeError, ValueError):
+            return jsonify({"error": "路径搜索参数不合法"}), 400
+
+    # 找出起点和终点节点
     with driver.driver.session() as session:
-        # 找出起点和终点节点
-        result = session.run(
-            "MATCH (a {name: $entityA}), (b {name: $entityB}) RETURN id(a) AS idA, id(b) AS idB",
-            entityA=entityA,
-            entityB=entityB,
-        )
-        record = result.single()
-        if not record:
-            return jsonify({"error": "找不到对应节点"}), 404
-
-        idA, idB = record["idA"], record["idB"]
-
-        # 获取最短路径
-        result_shortest = session.run(
-            """
-            MATCH p = allShortestPaths((a)-[*..5]-(b))
-            WHERE id(a) = $idA AND id(b) = $idB
-            RETURN nodes(p) AS shortest_nodes, relationships(p) AS shortest_rels, length(p) AS shortest_length
-            """,
-            idA=idA,
-            idB=idB,
-        )
+        idA = _resolve_entity_id(session, entityA)
+        idB = _resolve_entity_id(session, entityB)
+    if idA is None or idB is None:
+        return jsonify({"error": "找不到对应节点"}), 404
+
+    extra = {}
+    if mode == "informative":
+        engine = _graph_engine()
+        if engine is None:
+            return jsonify({"error": "路径索引尚未就绪"}), 503
+        scored, truncated = engine.informative_paths(idA, idB, k=k, **options)
+        paths_iter = _hydrated([(n, r) for n, r, _ in scored])
+        extra = {
+            "mode": mode,
+            "costs": [cost for _, _, cost in scored],
+            "truncated": truncated,
+        }
+    else:
+        paths_iter = _iter_paths(idA, idB, k, stream=_wants_ndjson())
 
-        record_shortest = result_shortest.single()
-        shortest_nodes_seq = (
-            record_shortest["shortest_nodes"] if record_shortest else []
+    if _wants_ndjson():
+        return Response(
+            stream_with_context(_stream_path_ndjson(paths_iter, k, idA, idB, extra)),
+            mimetype=NDJSON_MIMETYPE,
         )
-        shortest_rels_seq = record_shortest["shortest_rels"] if record_shortest else []
-        shortest_length = record_shortest["shortest_length"] if record_shortest else 0
-
-        # 把所有最短路径的节点和关系加入图，同时标记 is_shortest
-        node_map = {}
-        link_map = {}
-
-        for n in shortest_nodes_seq:
-            nid = n.id
-            if nid not in node_map:
-                props = {k: v for k, v in n.items() if k != "name"}
-                node_map[nid] = {
-                    "id": nid,
-                    "name": n.get("name"),
-                    "group": next(iter(n.labels), "default"),
-                    "properties": props,
-                }
-
-        for r in shortest_rels_seq:
-            rid = r.id
-            rel_type = r.type
-            source_id = r.start_node.id
-            target_id = r.end_node.id
-            rel_props = dict(r.items())
-            if rel_type in ATTRIBUTE_RELATIONS:
-                if source_id in node_map:
-                    node_map[source_id]["properties"][rel_type] = rel_props.get(
-                        "value", target_id
-                    )
-            else:
-                link_map[rid] = {
-                    "source": source_id,
-                    "target": target_id,
-                    "type": rel_type,
-                    "properties": rel_props,
-                    "is_shortest": True,
-                }
 
-        nodes = list(node_map.values())
-        links = list(link_map.values())
+    # k = 1 时只取第一条路径
+    nodes, links, paths = _path_graph(islice(paths_iter, k))
+    shortest_nodes_seq, shortest_rels_seq = paths[0] if paths else ([], [])
 
     return jsonify(
         {
             "path": {"nodes": nodes, "links": links},
             "subgraph": {"nodes": nodes, "links": links},
-            "shortest": {
-                "length": shortest_length,
-                "node_ids": [n.id for n in shortest_nodes_seq],
-                "node_names": [n.get("name") for n in shortest_nodes_seq],
-                "rel_ids": [r.id for r in shortest_rels_seq],
-            },
+            "shortest": _path_summary(shortest_nodes_seq, shortest_rels_seq),
+            "paths": [_path_summary(n, r) for n, r in paths],
             "focusNodeIds": [str(idA), str(idB)],
+            **extra,
         }
     )
 
 
+@bp.route("/query-path/batch", methods=["POST"])
+def query_path_batch():
+    """
+    批量路径查询：pairs 为实体名对列表，参数同 /query-path（k / mode / 搜索参数）。
+    始终以 NDJSON 流式返回，每对算完立即输出一行（带 index），最后一行为汇总
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        pairs = parse_pairs(data.get("pairs"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        k = min(max(int(data.get("k", 1)), 1), MAX_PATH_K)
+    except (TypeError, ValueError):
+        return jsonify({"error": "k 必须是正整数"}), 400
+
+    mode = data.get("mode", "shortest")
+    if mode not in ("shortest", "informative"):
+        return jsonify({"error": "mode 只能是 shortest 或 informative"}), 400
+    try:
+        options = _informative_options(data) if mode == "informative" else {}
+    except (TypeError, ValueError):
+        return jsonify({"error": "路径搜索参数不合法"}), 400
+
+    engine = _graph_engine()
+    if mode == "informative" and engine is None:
+        return jsonify({"error": "路径索引尚未就绪"}), 503
+
+    def _generate():
+        for result in iter_batch_paths(driver, engine, pairs, k, mode, options):
+            yield ndjson_line(result)
+
+    return Response(stream_with_context(_generate()), mimetype=NDJSON_MIMETYPE)
+
+
+# 按关系 id 取回路径上的边（保持路径顺序），形状同其它 QA plan 的 a / b / r 行
+PATH_ROWS_CYPHER = """
+    UNWIND $ids AS rid
+    MATCH (a)-[r]->(b) WHERE id(r) = rid
+    RETURN a, b, r
+"""
+
+
+def _run_plan(session, plan):
+    if plan["plan_name"] == "between_shortest_path":
+        engine = _graph_engine()
+        if engine is not None:
+            idA = _resolve_entity_id(session, plan["params"]["a"])
+            idB = _resolve_entity_id(session, plan["params"]["b"])
+            if idA is None or idB is None:
+                return []
+            # 问答里问的多是角色之间的关系，走避开枢纽节点的路径搜索；
+            # 超出时间预算 / 搜索范围没找到时退回按跳数的最短路径，不因此答不上来
+            paths, _ = engine.informative_paths(idA, idB, k=1)
+            if paths:
+                rel_ids = paths[0][1]
+            else:
+                path = engine.shortest_path(idA, idB)
+                if path is None:
+                    return []
+                rel_ids = path[1]
+            return list(session.run(PATH_ROWS_CYPHER, ids=rel_ids))
+    return list(session.run(plan["cypher"], **plan["params"]))
+
+
 @bp.route("/qa", methods=["POST"])
 def qa_route():
     data = request.get_json()
@@ -705,12 +1155,15 @@ def qa_route():
 
     # ========= ① NER：从自然语言里抽实体 =========
     # zwk.get_ner_result 接口需要 model/tokenizer/device/idx2tag，但在规则NER实现里是兼容占位
+    ner = NER.get()
+    if ner is None:
+        return jsonify({"error": "NER 词典尚未就绪"}), 503
     entities_by_type = get_ner_result(
         model=None,
         tokenizer=None,
         text=query,
-        rule_ner=RULE_NER,
-        tfidf_aligner=TFIDF_ALIGNER,
+        rule_ner=ner.rule_ner,
+        tfidf_aligner=ner.aligner,
         device=None,
         idx2tag=None,
     )
@@ -761,8 +1214,10 @@ def qa_route():
                 name=ent_a,
             ).single()
         else:
+            # 同名实体按 PageRank 取最重要的那个
             rec = session.run(
-                "MATCH (n {name:$name}) RETURN id(n) AS id",
+                f"MATCH (n:{ENTITY_LABEL} {{name:$name}}) RETURN id(n) AS id "
+                "ORDER BY coalesce(n.pagerank, 0) DESC LIMIT 1",
                 name=ent_a,
             ).single()
         if rec:
@@ -781,7 +1236,7 @@ def qa_route():
         result_rows = []
         used_plan = None
         for p in plans:
-            rows = list(session.run(p["cypher"], **p["params"]))
+            rows = _run_plan(session, p)
             if rows:
                 result_rows = rows
                 used_plan = p["plan_name"]
@@ -798,11 +1253,7 @@ def qa_route():
         nid = n.id
         if nid in node_ids:
             return
-        label = next(iter(n.labels), "default")
-        props = dict(n.items())
-        name = props.get("name")
-        props = {k: v for k, v in props.items() if k != "name"}
-        node_obj = {"id": nid, "name": name, "group": label, "properties": props}
+        node_obj = node_to_json(nid, n.get("name"), _node_label(n), dict(n.items()))
         node_ids[nid] = node_obj
         nodes.append(node_obj)
 
@@ -900,33 +1351,58 @@ def qa_route():
     )
 
 
+# 单次推荐最多返回的条数（预计算时每个角色保留 SIMILAR_TOP_K 个）
+MAX_RECOMMEND = 20
+
+
+def _recommend_anchor(recs, query):
+    """
+    推荐的目标角色：query 本身就是角色名时直接用，否则从自然语言里用规则 NER 抽第一个角色
+    """
+    query = (query or "").strip()
+    if not query:
+        return None
+    if query in recs.anchors:
+        return query
+    ner = NER.get()
+    if ner is None:
+        return None
+    for _, _, etype, canonical in sorted(ner.rule_ner.find(query)):
+        if etype == "Character" and canonical in recs.anchors:
+            return canonical
+    return None
+
+
 @bp.route("/recommend", methods=["POST"])
 def recommend_route():
-    data = request.get_json()
-    name = data.get("name")
-    limit = data.get("limit", 5)
+    data = request.get_json() or {}
+    try:
+        limit = int(data.get("limit") or data.get("topK") or 5)
+    except (TypeError, ValueError):
+        return jsonify({"error": "topK 必须是整数"}), 400
+    limit = min(max(limit, 1), MAX_RECOMMEND)
 
+    recs = RECOMMENDATIONS.get(GRAPH_VERSION.current())
+    if recs is None:
+        return jsonify({"error": "推荐数据尚未就绪"}), 503
+
+    name = data.get("name") or _recommend_anchor(recs, data.get("query"))
     if not name:
         return jsonify({"error": "缺少实体"}), 400
 
-    query = """
-        MATCH (c:Character {name:$name})-[:FRIEND_OF]->(f)-[:FRIEND_OF]->(rec)
-        WHERE NOT (c)-[:FRIEND_OF]->(rec) AND c <> rec
-        RETURN rec.name AS name, COUNT(*) AS score
-        ORDER BY score DESC
-        LIMIT $limit
-    """
-
-    result = driver.run(query, name=name, limit=limit)
-    items = [{"name": r["name"], "score": r["score"]} for r in result]
+    items = recs.top(name, limit)
+    if items is None:
+        return jsonify({"error": f"没有角色“{name}”的推荐结果"}), 404
 
+    anchor_id = recs.anchors[name]
     subgraph = {
-        "nodes": [{"id": name, "name": name}]
-        + [{"id": r["name"], "name": r["name"]} for r in result],
+        "nodes": [{"id": anchor_id, "name": name, "group": "Character"}]
+        + [{"id": it["id"], "name": it["name"], "group": "Character"} for it in items],
         "links": [
-            {"source": name, "target": r["name"], "type": "recommend"} for r in result
+            {"source": anchor_id, "target": it["id"], "type": "recommend"}
+            for it in items
         ],
     }
-    focusNodeIds = [name]
+    focusNodeIds = [anchor_id]
 
     return jsonify({"items": items, "subgraph": subgraph, "focusNodeIds": focusNodeIds})
@@ -0,0 +1,273 @@
+import re
+import time
+import heapq
+import bisect
+import logging
+import unicodedata
+
+import numpy as np
+
+from .constants import ENTITY_LABEL
+from .graph_version import VersionedBuild
+
+logger = logging.getLogger(__name__)
+
+# 每一档最多检查多少个候选词条（按中心性从高到低），保证最坏情况下的耗时
+MAX_SCAN = 2000
+
+# 匹配质量分档，越小越靠前
+EXACT, PREFIX, CONTAINS = 0, 1, 2
+MATCH_NAMES = {EXACT: "exact", PREFIX: "prefix", CONTAINS: "contains"}
+
+_STRIP = re.compile(r"[\s·・•\-_]+")
+
+
+def normalize(text):
+    """
+    检索用的归一化：NFKC（全角转半角等）+ casefold + 去掉空白和常见分隔符
+    """
+    return _STRIP.sub("", unicodedata.normalize("NFKC", str(text)).casefold())
+
+
+def _bigrams(term):
+    return {term[i : i + 2] for i in range(len(term) - 1)}
+
+
+def _grams(term):
+    """
+    倒排表的键：全部 bigram + 单字（单字查询没有 bigram，只能查单字的倒排表）
+    """
+    return _bigrams(term) | set(term)
+
+
+class SearchIndex:
+    """
+    全部实体名 + Alias 的进程内检索索引：
+
+        terms[T]        归一化后的词条，按字典序排列（前缀查询 = 一段连续区间）
+        term_entity[T]  词条所属实体下标
+        term_alias[T]   是否来自 Alias
+        sparse table    区间内中心性最大的词条（RMQ），前缀区间取 top-k 为 O(k log k)
+        单字 / bigram → 词条   按中心性降序的倒排表，用于子串匹配
+        term_label[T]   词条所属实体的类型编号，限定类型时先按它过滤候选再截断
+
+    排序：精确 > 前缀 > 子串；同档内按 PageRank，同一实体的名字先于别名命中
+
+    实体属性按列存（字符串列表 + numpy 数组），不保留逐实体的 dict，
+    省内存，也不会给分代 GC 留下几十万个要反复扫描的对象
+    """
+
+    def __init__(self, version, entities):
+        self.version = version
+        # entities: [{"id", "name", "label", "aliases", "pagerank", "description"}]
+        self.ids = np.asarray([e["id"] for e in entities], dtype=np.int64)
+        self.names = [e["name"] for e in entities]
+        self.labels = [e["label"] for e in entities]
+        self.descriptions = [e["description"] for e in entities]
+        self.score = np.asarray(
+            [e["pagerank"] or 0.0 for e in entities], dtype=np.float64
+        )
+
+        rows = []
+        for i, e in enumerate(entities):
+            seen = set()
+            for text, is_alias in [(e["name"], False)] + [
+                (a, True) for a in e["aliases"]
+            ]:
+                term = normalize(text) if text else ""
+                if term and term not in seen:
+                    seen.add(term)
+                    rows.append((term, i, is_alias))
+        rows.sort(key=lambda r: r[0])
+
+        self.terms = [r[0] for r in rows]
+        self.term_entity = np.asarray([r[1] for r in rows], dtype=np.int64)
+        self.term_alias = np.asarray([r[2] for r in rows], dtype=bool)
+        self._label_code = {l: c for c, l in enumerate(dict.fromkeys(self.labels))}
+        entity_label = np.asarray(
+            [self._label_code[l] for l in self.labels], dtype=np.int32
+        )
+        self.term_label = entity_label[self.term_entity]
+        # 名字略高于同一实体的别名，保证 RMQ 先取到名字
+        self.term_score = self.score[self.term_entity] - self.term_alias * 1e-12
+
+        self._build_sparse_table()
+
+        postings = {}
+        for t, term in enumerate(self.terms):
+            for gram in _grams(term):
+                postings.setdefault(gram, []).append(t)
+        order = np.argsort(-self.term_score, kind="stable")
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        self.postings = {
+            gram: np.asarray(sorted(ts, key=rank.__getitem__), dtype=np.int64)
+            for gram, ts in postings.items()
+        }
+
+    def _build_sparse_table(self):
+        n = len(self.terms)
+        table = [np.arange(n, dtype=np.int32)]
+        span = 1
+        while span * 2 <= n:
+            prev = table[-1]
+            left, right = prev[: n - span * 2 + 1], prev[span : n - span + 1]
+            table.append(
+                np.where(self.term_score[left] >= self.term_score[right], left, right)
+            )
+            span *= 2
+        self._table = table
+
+    def _range_best(self, lo, hi):
+        j = (hi - lo).bit_length() - 1
+        a = int(self._table[j][lo])
+        b = int(self._table[j][hi - (1 << j)])
+        return a if self.term_score[a] >= self.term_score[b] else b
+
+    def _of_labels(self, ts, codes):
+        """
+        只保留类型编号在 codes 中的词条（codes 为 None 时不过滤），保持原有顺序
+        """
+        if codes is None:
+            return ts
+        return ts[np.isin(self.term_label[ts], codes)]
+
+    def _range_terms(self, first, stop, codes=None):
+        """
+        字典序落在 [first, stop) 的词条，按中心性从高到低逐个产出；
+        限定类型时先过滤整段区间再排序，避免候选被其它类型的高中心性词条占满
+        """
+        lo = bisect.bisect_left(self.terms, first)
+        hi = bisect.bisect_left(self.terms, stop)
+        if lo >= hi:
+            return
+        if codes is not None:
+            ts = self._of_labels(np.arange(lo, hi), codes)
+            ts = ts[np.argsort(-self.term_score[ts], kind="stable")]
+            yield from ts[:MAX_SCAN].tolist()
+            return
+        best = self._range_best(lo, hi)
+        heap = [(-self.term_score[best], best, lo, hi)]
+        while heap:
+            _, t, lo, hi = heapq.heappop(heap)
+            yield t
+            for a, b in ((lo, t), (t + 1, hi)):
+                if a < b:
+                    best = self._range_best(a, b)
+                    heapq.heappush(heap, (-self.term_score[best], best, a, b))
+
+    def _contains_terms(self, q, codes=None):
+        """
+        包含 q 的词条：取 q 的 bigram（单字查询取单字本身）里最短的倒排表，
+        先按类型过滤、再截取前 MAX_SCAN 个，按中心性顺序逐个核对
+        """
+        grams = _bigrams(q) if len(q) > 1 else {q}
+        lists = [self.postings.get(g) for g in grams]
+        if any(l is None for l in lists):
+            return
+        candidates = self._of_labels(min(lists, key=len), codes)
+        for t in candidates[:MAX_SCAN].tolist():
+            if q in self.terms[t]:
+                yield t
+
+    def search(self, query, limit=10, labels=None):
+        """
+        返回按匹配质量和中心性排好序的实体列表
+        """
+        q = normalize(query)
+        if not q or limit <= 0:
+            return []
+        codes = None
+        if labels:
+            codes = [self._label_code[l] for l in labels if l in self._label_code]
+            if not codes:
+                return []
+
+        results, seen = [], set()
+
+        def _take(terms, tier):
+            matched = []
+            for n, t in enumerate(terms):
+                if n >= MAX_SCAN:
+                    break
+                i = int(self.term_entity[t])
+                if i in seen:
+                    continue
+                seen.add(i)
+                matched.append((i, t))
+                if len(results) + len(matched) >= limit:
+                    break
+            for i, t in matched:
+                results.append(
+                    {
+                        "id": int(self.ids[i]),
+                        "name": self.names[i],
+                        "label": self.labels[i],
+                        "description": self.descriptions[i],
+                        "match": MATCH_NAMES[tier],
+                        "alias": bool(self.term_alias[t]),
+                        "matched": self.terms[t],
+                        "pagerank": float(self.score[i]),
+                    }
+                )
+            return len(results) >= limit
+
+        if _take(self._range_terms(q, q + "\x00", codes), EXACT):
+            return results
+        if _take(self._range_terms(q, q + "\U0010ffff", codes), PREFIX):
+            return results
+        _take(self._contains_terms(q, codes), CONTAINS)
+        return results
+
+
+def _aliases(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value if v]
+    return [str(value)]
+
+
+def load_search_index(driver, version):
+    start = time.perf_counter()
+    with driver.driver.session() as session:
+        entities = [
+            {
+                "id": r["id"],
+                "name": r["name"],
+                "label": r["label"],
+                "aliases": _aliases(r["aliases"]),
+                "pagerank": r["pagerank"],
+                "description": r["description"],
+            }
+            for r in session.run(
+                f"""
+                MATCH (n:{ENTITY_LABEL})
+                RETURN id(n) AS id, n.name AS name,
+                       [l IN labels(n) WHERE l <> $entity_label][0] AS label,
+                       n.Alias AS aliases, n.pagerank AS pagerank,
+                       n.description AS description
+                """,
+                entity_label=ENTITY_LABEL,
+            )
+        ]
+    index = SearchIndex(version, entities)
+    logger.info(
+        "search index v%s: %d entities, %d terms, %.2fs",
+        version,
+        len(entities),
+        len(index.terms),
+        time.perf_counter() - start,
+    )
+    return index
+
+
+class SearchIndexCache(VersionedBuild):
+    """
+    按图版本维护 SearchIndex；构建失败时 get 返回 None，调用方回退到 CONTAINS 查询
+    """
+
+    def __init__(self, driver):
+        super().__init__(
+            "search index", lambda version: load_search_index(driver, version)
+        )
@@ -0,0 +1,185 @@
+import json
+
+# 每次从文件读入的字符数
+READ_CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = " \t\n\r"
+
+
+class _JSONStream:
+    """
+    在文件上做增量 JSON 解析：缓冲区只保留尚未消费的部分
+    """
+
+    def __init__(self, f, chunk_size=READ_CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        # 丢弃已消费部分，避免缓冲区无限增长
+        if self.pos:
+            self.buf = self.buf[self.pos :]
+            self.pos = 0
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def peek(self):
+        """
+        跳过空白，返回下一个字符（不消费）；文件结束返回 ""
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def next(self):
+        c = self.peek()
+        self.pos += 1
+        return c
+
+    def expect(self, token):
+        c = self.next()
+        if c != token:
+            raise ValueError(f"JSON 格式错误：期望 {token!r}，实际 {c!r}")
+
+    def decode(self):
+        """
+        解码下一个完整的 JSON 值（对象 / 字符串 / 数组）
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self._fill():
+                    raise
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JSONStream(f)
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+
+        while True:
+            work = stream.decode()
+            stream.expect(":")
+
+            if stream.peek() == "[":
+                stream.next()
+                if stream.peek() == "]":
+                    stream.next()
+                    # 空列表也要让增量导入看到：作品被清空 = 删除它的全部三元组
+                    yield work, None
+                else:
+                    while True:
+                        triple = stream.decode()
+                        if isinstance(triple, dict):
+                            yield work, triple
+                        c = stream.next()
+                        if c == "]":
+                            break
+                        if c != ",":
+                            raise ValueError(
+                                f"JSON 格式错误：期望 ',' 或 ']'，实际 {c!r}"
+                            )
+            else:
+                # 非列表的值直接跳过
+                stream.decode()
+
+            c = stream.next()
+            if c == "}":
+                return
+            if c != ",":
+                raise ValueError(f"JSON 格式错误：期望 ',' 或 '}}'，实际 {c!r}")
+
+
+def _iter_jsonl(path):
+    """
+    JSONL：每行要么是 {"work": ..., "triples": [...]}，要么是带 "work" 字段的单条三元组；
+    triples 为空列表时产出 (work, None)
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            if not isinstance(obj, dict):
+                continue
+
+            if isinstance(obj.get("triples"), list):
+                work = obj.get("work")
+                if not obj["triples"]:
+                    yield work, None
+                for triple in obj["triples"]:
+                    if isinstance(triple, dict):
+                        yield work, triple
+            else:
+                yield obj.pop("work", None), obj
+
+
+def _iter_raw(path):
+    if path.endswith(".jsonl"):
+        return _iter_jsonl(path)
+    return _iter_json(path)
+
+
+def iter_work_triples(path):
+    """
+    流式读取三元组文件，逐个产出 (work, triple)：
+    - .json：现有的 {work: [triple, ...]} 格式
+    - .jsonl：每行一个作品或一条三元组
+    内存占用只和单个三元组大小有关，与文件大小无关
+    """
+    for work, triple in _iter_raw(path):
+        if triple is not None:
+            yield work, triple
+
+
+def iter_works(path):
+    """
+    把同一作品的三元组聚成 (work, [triple, ...])，供增量导入按作品比对；
+    三元组列表为空的作品产出 (work, [])。
+    同一作品的三元组必须连续出现（JSON 的键不重复，JSONL 的行相邻），
+    否则后出现的那段会被当成作品的全部内容、把前一段删掉，这里直接报错
+    """
+    done = set()
+    current, triples, started = None, [], False
+    for work, triple in _iter_raw(path):
+        if started and work != current:
+            yield current, triples
+            done.add(current)
+            triples = []
+        if work in done:
+            raise ValueError(
+                f"{path}: 作品 {work!r} 的三元组不连续，请先按作品排序后再增量导入"
+            )
+        current, started = work, True
+        if triple is not None:
+            triples.append(triple)
+    if started:
+        yield current, triples
+
+
+def iter_triples(path):
+    """
+    只要三元组、不关心所属作品时使用
+    """
+    for _, triple in iter_work_triples(path):
+        yield triple
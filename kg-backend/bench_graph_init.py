@@ -0,0 +1,74 @@
+"""
+/graph/init 全量模式（viewMode=full）的序列化回归基准：
+在合成图上跑 build_graph_payload，不依赖 Neo4j
+
+python bench_graph_init.py --nodes 100000 --max-seconds 5
+"""
+
+import sys
+import time
+import random
+import argparse
+
+from app.graph_payload import build_graph_payload
+
+LABELS = ["Work", "Character", "Person", "Organization", "Group", "Location"]
+REL_TYPES = ["AppearsIn", "VoiceBy", "MemberOf", "HasFriend", "ChiefDirector"]
+ATTR_TYPES = ["Tag", "Time"]
+
+
+def synthetic_graph(n_nodes, avg_degree, attr_ratio, seed=0):
+    rng = random.Random(seed)
+    nodes = [
+        (
+            i,
+            f"node-{i}",
+            LABELS[i % len(LABELS)],
+            {"name": f"node-{i}", "Alias": [f"alias-{i}"]},
+        )
+        for i in range(n_nodes)
+    ]
+
+    edges = []
+    for _ in range(n_nodes * avg_degree // 2):
+        a = rng.randrange(n_nodes)
+        b = rng.randrange(n_nodes)
+        if rng.random() < attr_ratio:
+            edges.append((a, b, rng.choice(ATTR_TYPES), {"value": f"v-{b}"}))
+        else:
+            edges.append((a, b, rng.choice(REL_TYPES), {}))
+    return nodes, edges
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=100_000)
+    parser.add_argument("--avg-degree", type=int, default=6)
+    parser.add_argument("--attr-ratio", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--max-seconds", type=float, default=None, help="超过该耗时视为性能回退"
+    )
+    args = parser.parse_args()
+
+    nodes, edges = synthetic_graph(args.nodes, args.avg_degree, args.attr_ratio)
+    print(f"synthetic graph: {len(nodes)} nodes, {len(edges)} edges")
+
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        payload = build_graph_payload(nodes, edges)
+        best = min(best, time.perf_counter() - start)
+
+    print(
+        f"build_graph_payload: best {best * 1000:.1f} ms, "
+        f"{len(payload['nodes'])} nodes / {len(payload['links'])} links"
+    )
+
+    if args.max_seconds is not None and best > args.max_seconds:
+        print(f"REGRESSION: {best:.3f}s > {args.max_seconds}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
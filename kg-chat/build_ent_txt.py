@@ -1,7 +1,15 @@
-import json
 import os
+import sys
 from collections import defaultdict
 
+# 三元组读取与后端导入共用 kg-backend/app/triple_reader.py（只依赖标准库，按文件路径导入，
+# 不经过 app 包的 __init__，不会拉起 Flask / Neo4j）
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "kg-backend", "app"),
+)
+from triple_reader import iter_work_triples
+
 
 JSON_PATH = r"C:\Users\19642\Desktop\kg\total.json"  # 你的完整 JSON 文件
 OUT_DIR = r"C:\Users\19642\Desktop\kg\ent_aug"  # 输出目录
@@ -17,45 +25,38 @@ def main():
     os.makedirs(OUT_DIR, exist_ok=True)
     type2ents = defaultdict(set)
 
-    with open(JSON_PATH, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    print("DEBUG JSON top-level type:", type(data))
-    print("DEBUG number of works:", len(data))
-
-    # 🔑 关键：两层遍历
-    for work_name, triples in data.items():
-        if not isinstance(triples, list):
-            continue
-
-        for item in triples:
-            if not isinstance(item, dict):
-                continue
-
-            # -------- head --------
-            head = item.get("head")
-            head_type = item.get("head_type")
-            if head and head_type:
-                head = clean_entity(head)
-                if head:
-                    type2ents[head_type].add(head)
-
-            # -------- tail --------
-            tail = item.get("tail")
-            tail_type = item.get("tail_type")
-            if tail and tail_type:
-                tail = clean_entity(tail)
-                if tail:
-                    type2ents[tail_type].add(tail)
-
+    # 流式读取 (work, triple)，不整体载入内存（支持 .json / .jsonl）
+    works = set()
+    for work_name, item in iter_work_triples(JSON_PATH):
+        works.add(work_name)
+
+        # -------- head --------
+        head = item.get("head")
+        head_type = item.get("head_type")
+        if head and head_type:
+            head = clean_entity(head)
+            if head:
+                type2ents[head_type].add(head)
+
+        # -------- tail --------
+        tail = item.get("tail")
+        tail_type = item.get("tail_type")
+        if tail and tail_type:
+            tail = clean_entity(tail)
+            if tail:
+                type2ents[tail_type].add(tail)
+
+    print("DEBUG number of works:", len(works))
     print("DEBUG collected types:", list(type2ents.keys()))
 
-    # 写入文件
+    # 写入文件：先写临时文件再改名，后端热加载词典时不会读到写了一半的文件
     for t, ents in type2ents.items():
         out_path = os.path.join(OUT_DIR, f"{t}.txt")
-        with open(out_path, "w", encoding="utf-8") as f:
+        tmp_path = out_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             for e in sorted(ents):
                 f.write(e + "\n")
+        os.replace(tmp_path, out_path)
 
         print(f"✔ 写入 {out_path}，共 {len(ents)} 个实体")
 
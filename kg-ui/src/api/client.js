@@ -23,6 +23,29 @@ async function postApi(endpoint, body, base_url = BASE_URL) {
   return data;
 }
 
+async function getApi(endpoint, params = {}, base_url = BASE_URL) {
+  const qs = new URLSearchParams(
+    Object.entries(params).filter(([, v]) => v !== undefined && v !== null)
+  ).toString();
+  // GET 请求由浏览器按 ETag 自动做条件请求（If-None-Match → 304）
+  const res = await fetch(`${base_url}/${endpoint}${qs ? `?${qs}` : ""}`, {
+    cache: "no-cache",
+  });
+
+  let data;
+  try {
+    data = await res.json();
+  } catch {
+    data = null;
+  }
+
+  if (!res.ok) {
+    throw new Error(data?.error || `HTTP ${res.status}`);
+  }
+
+  return data;
+}
+
 // 期望返回 { answer, evidence, subgraph, focusNodeIds }
 export async function qa(query) {
   if (!query?.trim()) throw new Error("Query 不能为空");
@@ -34,10 +57,176 @@ export async function recommend({ query, userId, topK = 5, filters } = {}) {
   return postApi("recommend", { query, userId, topK: Number(topK), filters });
 }
 
-export async function queryPath({ entityA, entityB }) {
-  return postApi("query-path", { entityA, entityB });
+// k > 1 时返回 k 条最短路径（paths 字段）；
+// mode: "informative" 时可带 allowTypes / denyTypes / hubPenalty / maxDegree / budgetMs 等参数
+export async function queryPath({ entityA, entityB, k, ...options }) {
+  return postApi("query-path", { entityA, entityB, k, ...options });
+}
+
+export async function fetchGraph(viewMode = "focus") {
+  return getApi("graph/init", { viewMode });
+}
+
+// 流式读取 NDJSON（Accept: application/x-ndjson），每解析出一行就回调一次，
+// 事件形如 { kind: "node" | "link" | "property" | "shortest" | "path" | "paths" | "focus" | "end", ... }
+// 路径查询的流与 JSON 版内容一致（最多 k 条路径），每算出一条路径就发出其上新出现的
+// node / property（对已发出节点的属性补丁）/ link，随后是这条路径的 path 摘要（第一条同时发 shortest）
+async function streamApi(endpoint, { method = "GET", body, onEvent }, base_url = BASE_URL) {
+  const res = await fetch(`${base_url}/${endpoint}`, {
+    method,
+    headers: {
+      Accept: "application/x-ndjson",
+      ...(body ? { "Content-Type": "application/json" } : {}),
+    },
+    body: body ? JSON.stringify(body) : undefined,
+  });
+  if (!res.ok) throw new Error(`HTTP ${res.status}`);
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+    let nl;
+    while ((nl = buf.indexOf("\n")) >= 0) {
+      const line = buf.slice(0, nl).trim();
+      buf = buf.slice(nl + 1);
+      if (line) onEvent(JSON.parse(line));
+    }
+  }
+  if (buf.trim()) onEvent(JSON.parse(buf));
+}
+
+export async function streamGraph(viewMode, onEvent) {
+  return streamApi(`graph/init?viewMode=${encodeURIComponent(viewMode)}`, { onEvent });
+}
+
+export async function streamQueryPath({ entityA, entityB, k, ...options }, onEvent) {
+  return streamApi("query-path", {
+    method: "POST",
+    body: { entityA, entityB, k, ...options },
+    onEvent,
+  });
+}
+
+// ===== 列式二进制图格式（Accept: application/vnd.kg.graph+columnar）=====
+// 布局见后端 app/graph_compact.py：header JSON 之后是若干小端 typed array
+const COMPACT_MIMETYPE = "application/vnd.kg.graph+columnar";
+
+// 批量路径：pairs 为 [[a, b], ...]，每对算完回调一次 { kind: "pair", index, paths | error }
+export async function streamQueryPathBatch({ pairs, k, ...options }, onEvent) {
+  return streamApi("query-path/batch", {
+    method: "POST",
+    body: { pairs, k, ...options },
+    onEvent,
+  });
+}
+
+function decodeCompactGraph(buffer) {
+  const view = new DataView(buffer);
+  const magic = new TextDecoder().decode(new Uint8Array(buffer, 0, 4));
+  if (magic !== "KGC1") throw new Error("无法识别的图数据格式");
+
+  const headerLen = view.getUint32(4, true);
+  const header = JSON.parse(
+    new TextDecoder().decode(new Uint8Array(buffer, 8, headerLen))
+  );
+  const n = header.n_nodes;
+  const m = header.n_edges;
+
+  let offset = 8 + headerLen;
+  offset += (8 - (offset % 8)) % 8;
+  const take = (Type, count) => {
+    const arr = new Type(buffer, offset, count);
+    offset += arr.byteLength;
+    return arr;
+  };
+
+  const nodeIds = take(BigInt64Array, n);
+  const nodeLabel = take(Int32Array, n);
+  const edgeSource = take(Int32Array, m);
+  const edgeTarget = take(Int32Array, m);
+  const edgeType = take(Int32Array, m);
+  // 后端预计算的布局坐标（header.layout 为 true 时存在）
+  const nodeX = header.layout ? take(Float32Array, n) : null;
+  const nodeY = header.layout ? take(Float32Array, n) : null;
+  const nameOffset = take(Uint32Array, n + 1);
+  const names = new Uint8Array(buffer, offset);
+  const utf8 = new TextDecoder();
+
+  const nodes = new Array(n);
+  for (let i = 0; i < n; i++) {
+    nodes[i] = {
+      id: String(nodeIds[i]),
+      name: utf8.decode(names.subarray(nameOffset[i], nameOffset[i + 1])),
+      group: header.labels[nodeLabel[i]],
+      // 属性按需通过 fetchNode(id) 获取（悬浮时由 GraphPanel 补上）
+      properties: {},
+      propertiesPending: true,
+    };
+    if (nodeX) {
+      nodes[i].x = nodeX[i];
+      nodes[i].y = nodeY[i];
+    }
+  }
+
+  const links = new Array(m);
+  for (let i = 0; i < m; i++) {
+    links[i] = {
+      source: nodes[edgeSource[i]].id,
+      target: nodes[edgeTarget[i]].id,
+      type: header.rel_types[edgeType[i]],
+    };
+  }
+
+  return { nodes, links };
+}
+
+// 初始图谱：列式二进制 + 后端预计算的坐标。快照还在后台构建时后端返回 503 + Retry-After，
+// 抛出的错误带 retryAfter（秒），由调用方决定是否重试
+export async function fetchGraphCompact(viewMode = "focus") {
+  const res = await fetch(
+    `${BASE_URL}/graph/init?viewMode=${encodeURIComponent(viewMode)}`,
+    { headers: { Accept: COMPACT_MIMETYPE }, cache: "no-cache" }
+  );
+  if (!res.ok) {
+    const err = new Error(res.status === 503 ? "图快照尚未就绪" : `HTTP ${res.status}`);
+    err.retryAfter = Number(res.headers.get("Retry-After")) || null;
+    throw err;
+  }
+  return decodeCompactGraph(await res.arrayBuffer());
+}
+
+// 图嵌入近邻：和某个实体结构相似的实体，labels 为可选的结果类型数组
+export async function fetchSimilar({ name, id, limit, labels } = {}) {
+  return getApi("similar", { name, id, limit, label: labels?.join(",") });
+}
+
+// 悬浮卡片：按名字批量取实体详情，返回 { entities: { name: 详情或 null } }
+export async function fetchEntities(names, label = "Character") {
+  return postApi("entities/batch", { label, names });
 }
 
-export async function fetchGraph(mode) {
-  return postApi("graph/init", { mode });
+export async function fetchNode(id) {
+  return getApi(`node/${encodeURIComponent(id)}`);
+}
+
+// 实体检索（名字 + 别名，前缀 / 子串），labels 为可选的实体类型数组
+export async function searchEntities(q, { limit, labels } = {}) {
+  return getApi("search", { q, limit, label: labels?.join(",") });
+}
+
+// 分层浏览：作品聚类总览 + 按页展开单个聚类
+export async function fetchClusters({ limit, minWeight } = {}) {
+  return getApi("graph/clusters", { limit, minWeight });
+}
+
+export async function fetchClusterMembers(clusterId, { offset = 0, limit, label } = {}) {
+  return getApi(`graph/clusters/${encodeURIComponent(clusterId)}`, {
+    offset,
+    limit,
+    label,
+  });
 }
@@ -9,6 +9,7 @@ import React, {
 import ForceGraph2D from "react-force-graph-2d";
 import { MODE_BG, MODE_COLORS } from "./Constant";
 import parse from "html-react-parser";
+import { fetchNode } from "../api/client";
 
 // 可选调色板
 const COLOR_PALETTE = [
@@ -50,6 +51,14 @@ function GraphPanel({ graph, store, focusNodeIds }) {
     return map;
   }, [graph.nodes]);
 
+  // 后端已算好坐标（每个节点都带 x/y）时不再跑力导模拟
+  const prelaidOut = useMemo(
+    () =>
+      (graph.nodes || []).length > 0 &&
+      graph.nodes.every((n) => typeof n.x === "number" && typeof n.y === "number"),
+    [graph.nodes]
+  );
+
   // 第一次加载时记录 originalGraph
   useEffect(() => {
     if (!originalGraph || originalGraph.nodes.length === 0) {
@@ -400,6 +409,7 @@ function GraphPanel({ graph, store, focusNodeIds }) {
         graphData={graph}
         enableNodeDrag
         cooldownTime={1000}
+        cooldownTicks={prelaidOut ? 0 : Infinity}
         linkWidth={(link) => (link.is_shortest ? 3 : 2)}
         linkColor={(link) => {
           if (link.is_shortest) return "red";
@@ -416,7 +426,21 @@ function GraphPanel({ graph, store, focusNodeIds }) {
         linkDirectionalArrowRelPos={1}
         linkCurvature={0.08}
         linkLabel={(l) => l.type || ""}
-        onNodeHover={(node) => setHoverNode(node || null)}
+        onNodeHover={(node) => {
+          setHoverNode(node || null);
+          // 列式格式的节点不带属性，第一次悬浮时按 id 取一次详情
+          if (node?.propertiesPending) {
+            node.propertiesPending = false;
+            fetchNode(node.id)
+              .then((detail) => {
+                node.properties = detail.properties ?? {};
+                setHoverNode((h) => (h?.id === node.id ? { ...node } : h));
+              })
+              .catch(() => {
+                node.propertiesPending = true;
+              });
+          }
+        }}
         onNodeClick={(n) => {
           if (!fgRef.current || !n) return;
           setSelectedNode(n);
@@ -1,6 +1,6 @@
 // src/state/useAppStore.js
 import { useMemo, useState, useEffect } from "react";
-import { fetchGraph } from "../api/client";
+import { fetchGraphCompact } from "../api/client";
 
 export const Modes = {
   QUERY: "query",
@@ -54,20 +54,35 @@ export function useAppStore() {
   }
 
   useEffect(() => {
+    let cancelled = false;
+
     async function loadGraph() {
       setIsLoading(true);
       setError(null);
       try {
-        const data = await fetchGraph(mode);
-        setGraph(normalizeGraph(data));
+        // 列式二进制格式（节点带预计算坐标，属性悬浮时再取）；快照还在构建时按 Retry-After 重试
+        for (;;) {
+          try {
+            const data = await fetchGraphCompact();
+            if (!cancelled) setGraph(normalizeGraph(data));
+            break;
+          } catch (err) {
+            if (cancelled || !err.retryAfter) throw err;
+            await new Promise((r) => setTimeout(r, err.retryAfter * 1000));
+            if (cancelled) return;
+          }
+        }
       } catch (err) {
-        setError(err?.message || String(err));
+        if (!cancelled) setError(err?.message || String(err));
       } finally {
-        setIsLoading(false);
+        if (!cancelled) setIsLoading(false);
       }
     }
 
     loadGraph();
+    return () => {
+      cancelled = true;
+    };
   }, [mode]);
 
   const api = useMemo(